@@ -1,5 +1,13 @@
 #?from .extract import extract
 #?res = extract("http://www.jesus-is-lord.com/thebible.htm")
+import sys
+
+# run in the daemon if there's one (see client.py) before the slow imports
+from .client import run_client
+code = run_client(sys.argv[1:])
+if code is not None:
+    sys.exit(code)
+
 from .cli import main
 
 main()
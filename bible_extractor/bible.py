@@ -1,7 +1,17 @@
+import bisect
 import enum
+import hashlib
+import itertools
+import threading
 import typing as T
+import zlib
 from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
 import logging
+
+from . import books as _books
+
 log = logging.getLogger(__name__)
 
 class Testament(enum.Enum):
@@ -56,31 +66,456 @@ def __BibleWarning_to_dict(self: BibleWarning) -> T.Dict[str, T.Any]:
             }
 BibleWarning.to_dict = __BibleWarning_to_dict
 
+
+# verse IDs are used to order locations inside a book.
+# Verses never reach _VERSE_ID_STRIDE so (chapter, verse) maps to a unique int.
+# Chapter level locations (verse 0 or -1) are at the start of their chapter
+_VERSE_ID_STRIDE = 1000
+def verse_id(chapter: int, verse: int) -> int:
+    return int(chapter) * _VERSE_ID_STRIDE + max(int(verse), 0)
+
+class WarningStore:
+    """
+    A set of BibleWarnings indexed by type and by location. Warnings are
+    iterated in the order they were added (so writing a Bible is
+    deterministic).
+
+    Each warning is indexed once per book it refers to, as the interval
+    between the smallest and largest verse ID of its locations in that book.
+    Chapter level warnings (verse -1) belong to their chapter:
     
+    >>> store = WarningStore([ BibleWarning((Verse.Loc("Daniel", 4, -1, Testament.old), ),
+    ...     "Cannot find verses", "") ])
+    >>> [ w.text for w in store.in_range("Daniel", (4, 0), (4, 999)) ]
+    ['Cannot find verses']
+    >>> store.in_range("Daniel", (3, 0), (3, 999))
+    []
+    >>> len(store.at(Verse.Loc("Daniel", 4, -1, Testament.old)))
+    1
+    """
+
+    def __init__(self, warnings: T.Iterable[BibleWarning] = ()) -> None:
+        # warning -> None (a dict keeps the order)
+        self._warnings: T.Dict[BibleWarning, None] = {}
+        self._by_type: T.Dict[str, T.Set[BibleWarning]] = {}
+        # book (lower case) -> list of (start id, end id, warning)
+        self._by_book: T.Dict[str, T.List[T.Tuple[int, int, BibleWarning]]] = {}
+        # book (lower case) -> sorted start ids (None when it needs sorting)
+        self._starts: T.Dict[str, T.Optional[T.List[int]]] = {}
+        # book (lower case) -> the largest (end - start) in the book
+        self._max_span: T.Dict[str, int] = {}
+        self.update(warnings)
+
+    def add(self, warning: BibleWarning):
+        if warning in self._warnings:
+            return
+        self._warnings[warning] = None
+        self._by_type.setdefault(warning.type, set()).add(warning)
+
+        spans: T.Dict[str, T.Tuple[int, int]] = {}
+        for loc in warning.locs:
+            book = str(loc.book).lower()
+            vid = verse_id(loc.chapter, loc.verse)
+            start, end = spans.get(book, (vid, vid))
+            spans[book] = (min(start, vid), max(end, vid))
+        for book, (start, end) in spans.items():
+            self._by_book.setdefault(book, []).append((start, end, warning))
+            self._starts[book] = None
+            self._max_span[book] = max(self._max_span.get(book, 0), end - start)
+
+    def update(self, warnings: T.Iterable[BibleWarning]):
+        for warning in warnings:
+            self.add(warning)
+
+    def discard(self, warning: BibleWarning):
+        if warning not in self._warnings:
+            return
+        del self._warnings[warning]
+        self._by_type[warning.type].discard(warning)
+        for book in { str(l.book).lower() for l in warning.locs }:
+            # the spans are only upper bounds, _max_span can stay
+            self._by_book[book] = [ e for e in self._by_book[book] if e[2] != warning ]
+            self._starts[book] = None
+
+    def union(self, other: T.Iterable[BibleWarning]) -> "WarningStore":
+        res = self.copy()
+        res.update(other)
+        return res
+
+    def copy(self) -> "WarningStore":
+        res = WarningStore()
+        res._warnings = dict(self._warnings)
+        res._by_type = { t: set(ws) for t, ws in self._by_type.items() }
+        res._by_book = { b: list(ws) for b, ws in self._by_book.items() }
+        res._starts = dict.fromkeys(self._by_book.keys())
+        res._max_span = dict(self._max_span)
+        return res
+
+    def __deepcopy__(self, memo) -> "WarningStore":
+        # warnings are immutable, only the containers need copying
+        return self.copy()
+
+    def of_type(self, type: str) -> T.Set[BibleWarning]:
+        """Return the warnings of a specific type (see warnings.py)."""
+        return set(self._by_type.get(type, ()))
+
+    def in_range(self, book: str,
+            start: T.Tuple[int, int] = (-1, -1),
+            end: T.Optional[T.Tuple[int, int]] = None,
+            type: T.Optional[str] = None) -> T.List[BibleWarning]:
+        """
+        Return the warnings that have at least one location in book between
+        start and end (both are (chapter, verse) and inclusive).
+        For example, in_range("Daniel", (3, 0), (3, 999)) returns the warnings
+        in Daniel 3.
+        """
+        book = str(book).lower()
+        entries = self._by_book.get(book)
+        if not entries:
+            return []
+        starts = self._sorted_starts(book)
+
+        lo = verse_id(*start)
+        hi = verse_id(*end) if end is not None else float("inf")
+        first = bisect.bisect_left(starts, lo - self._max_span[book])
+        last = bisect.bisect_right(starts, hi)
+        res = []
+        for w_start, w_end, warning in entries[first:last]:
+            if w_end < lo or (type is not None and warning.type != type):
+                continue
+            # the interval only bounds the locations, check them
+            if any(str(l.book).lower() == book
+                    and lo <= verse_id(l.chapter, l.verse) <= hi
+                    for l in warning.locs):
+                res.append(warning)
+        return res
+
+    def at(self, loc: Verse.Loc) -> T.List[BibleWarning]:
+        """Return the warnings that refer to loc."""
+        return self.in_range(loc.book, (loc.chapter, loc.verse),
+                (loc.chapter, loc.verse))
+
+    def _sorted_starts(self, book: str) -> T.List[int]:
+        starts = self._starts[book]
+        if starts is None:
+            self._by_book[book].sort(key=lambda e: e[0])
+            starts = [ e[0] for e in self._by_book[book] ]
+            self._starts[book] = starts
+        return starts
+
+    def __contains__(self, warning: BibleWarning) -> bool:
+        return warning in self._warnings
+
+    def __iter__(self) -> T.Iterator[BibleWarning]:
+        return iter(self._warnings)
+
+    def __len__(self) -> int:
+        return len(self._warnings)
+
+    def __repr__(self) -> str:
+        return f"<WarningStore {len(self)} warnings>"
+
+
+def _hash(parts: T.Iterable[str]) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def chapter_hash(chap: T.Dict[int, str]) -> str:
+    """The fingerprint of a chapter (verse number -> text)."""
+    return _hash(part for verse_num in sorted(chap.keys())
+            for part in (str(verse_num), chap[verse_num]))
+
+def book_hash(chapter_hashes: T.Dict[int, str]) -> str:
+    """The fingerprint of a book from the fingerprints of its chapters."""
+    return _hash(part for chap_num in sorted(chapter_hashes.keys())
+            for part in (str(chap_num), chapter_hashes[chap_num]))
+
+def root_hash(testaments: T.Iterable[T.Iterable[T.Tuple[str, str]]]) -> str:
+    """The fingerprint of a Bible from the (book, fingerprint) pairs of every testament."""
+    parts: T.List[str] = []
+    for test in testaments:
+        for book, book_fp in test:
+            parts += [ book.lower(), book_fp ]
+        # separate the testaments
+        parts.append("|")
+    return _hash(parts)
+
+def diff_fingerprints(a: T.Dict[str, T.Any], b: T.Dict[str, T.Any]
+        ) -> T.List[T.Tuple[str, T.Optional[int]]]:
+    """
+    Compare two fingerprint trees (see Bible.fingerprints) and return the
+    (book, chapter) pairs that differ. chapter is None for books that are
+    only in one of them. Identical books are skipped without looking at
+    their chapters.
+    """
+    if a["root"] == b["root"]:
+        return []
+    books_a = { k.lower(): (k, v) for k, v in a["books"].items() }
+    books_b = { k.lower(): (k, v) for k, v in b["books"].items() }
+    res: T.List[T.Tuple[str, T.Optional[int]]] = []
+    for key, (name, book_a) in books_a.items():
+        if key not in books_b:
+            res.append((name, None))
+            continue
+        book_b = books_b[key][1]
+        if book_a["hash"] == book_b["hash"]:
+            continue
+        chaps_a, chaps_b = book_a["chapters"], book_b["chapters"]
+        for chap_num in sorted(set(chaps_a) | set(chaps_b), key=int):
+            if chaps_a.get(chap_num) != chaps_b.get(chap_num):
+                res.append((name, int(chap_num)))
+    res += [ (name, None) for key, (name, _) in books_b.items() if key not in books_a ]
+    return res
+
+class TextPool:
+    """
+    A content addressed pool of verse texts. Bibles store the pooled string
+    of every verse, so identical verses (e.g. in a source and in a merge
+    loaded from another file) share one string.
+    
+    The pool keeps every text alive (strings can't be weakly referenced),
+    so it is opt-in: texts are only pooled inside a scope() (e.g. one
+    command of the CLI or of the daemon) and the pool is cleared after it.
+    Outside of a scope intern returns the text as it is.
+    """
+
+    def __init__(self) -> None:
+        self._texts: T.Dict[str, str] = {}
+        self.hits = 0
+        self._depth = 0
+
+    def intern(self, text: str) -> str:
+        text = str(text)
+        if self._depth == 0:
+            return text
+        pooled = self._texts.setdefault(text, text)
+        if pooled is not text:
+            self.hits += 1
+        return pooled
+
+    def clear(self):
+        self._texts.clear()
+        self.hits = 0
+
+    @contextmanager
+    def scope(self) -> T.Iterator["TextPool"]:
+        """
+        Pool the texts in the block and clear the pool at the end of the
+        outermost scope (the Bibles keep their texts).
+        """
+        self._depth += 1
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self.clear()
+
+    def stats(self) -> T.Dict[str, int]:
+        return { "texts": len(self._texts), "hits": self.hits,
+                "characters": sum(len(t) for t in self._texts) }
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+TEXT_POOL = TextPool()
+
+class ChapterCache:
+    """
+    A LRU cache of decoded chapters. It can be shared by threads (e.g. the
+    sources of the CLI): chapters are decoded outside of the lock.
+    """
+
+    def __init__(self, size: int = 256) -> None:
+        self.size = size
+        self.hits = 0
+        self.reads = 0
+        self._chapters: T.Dict[T.Any, T.Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: T.Any, decode: T.Callable[[], T.Any]) -> T.Any:
+        with self._lock:
+            chapter = self._chapters.get(key)
+            if chapter is not None:
+                self.hits += 1
+                self._chapters.move_to_end(key)
+                return chapter
+            self.reads += 1
+        chapter = decode()
+        with self._lock:
+            self._chapters[key] = chapter
+            self._chapters.move_to_end(key)
+            while len(self._chapters) > self.size:
+                self._chapters.popitem(last=False)
+        return chapter
+
+    def peek(self, key: T.Any) -> T.Any:
+        """The cached chapter (or None) without making it recently used."""
+        return self._chapters.get(key)
+
+    def discard(self, key: T.Any):
+        with self._lock:
+            self._chapters.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._chapters.clear()
+            self.hits = 0
+            self.reads = 0
+
+    def __len__(self) -> int:
+        return len(self._chapters)
+
+# the decoded chapters of every CompressedChapter
+CHAPTER_CACHE = ChapterCache(64)
+_CHAPTER_KEYS = itertools.count()
+
+class CompressedChapter(MutableMapping):
+    """
+    A chapter (verse number -> text, like the chapter dicts of Bible.verses)
+    that keeps its texts in one zlib compressed block. The verse numbers are
+    kept as they are, so len, in and the verse numbers don't decompress
+    anything. Reading a text decodes the block into the (LRU) CHAPTER_CACHE.
+    Changing a verse recompresses the chapter (use update to change many).
+    """
+    __slots__ = ("_nums", "_block", "_key", "_cache")
+
+    def __init__(self, verses: T.Iterable[T.Tuple[int, str]] = (),
+            cache: ChapterCache = CHAPTER_CACHE) -> None:
+        self._cache = cache
+        self._key = next(_CHAPTER_KEYS)
+        self._encode(verses)
+
+    def _encode(self, verses: T.Iterable[T.Tuple[int, str]]):
+        nums: T.List[int] = []
+        texts: T.List[str] = []
+        for num, text in verses:
+            nums.append(num)
+            texts.append(text)
+        self._nums = tuple(nums)
+        # verses don't have NULs
+        self._block = zlib.compress("\0".join(texts).encode("utf-8"))
+        self._cache.discard(self._key)
+
+    def _decode(self) -> T.Dict[int, str]:
+        if len(self._nums) == 0:
+            return {}
+        texts = zlib.decompress(self._block).decode("utf-8").split("\0")
+        return dict(zip(self._nums, texts))
+
+    def _verses(self) -> T.Dict[int, str]:
+        return self._cache.get(self._key, self._decode)
+
+    def __getitem__(self, verse: int) -> str:
+        if verse not in self._nums:
+            raise KeyError(verse)
+        return self._verses()[verse]
+
+    def __setitem__(self, verse: int, text: str):
+        verses = dict(self.items())
+        verses[verse] = text
+        self._encode(verses.items())
+
+    def __delitem__(self, verse: int):
+        verses = dict(self.items())
+        del verses[verse]
+        self._encode(verses.items())
+
+    def update(self, *args, **kwargs):
+        verses = dict(self.items())
+        verses.update(*args, **kwargs)
+        self._encode(verses.items())
+
+    def __contains__(self, verse: object) -> bool:
+        return verse in self._nums
+
+    def __iter__(self) -> T.Iterator[int]:
+        return iter(self._nums)
+
+    def __len__(self) -> int:
+        return len(self._nums)
+
+    def _scan(self) -> T.Dict[int, str]:
+        # a scan (e.g. iterating a Bible) doesn't push the chapters that are
+        # in use out of the cache
+        verses = self._cache.peek(self._key)
+        return verses if verses is not None else self._decode()
+
+    def items(self) -> T.ItemsView[int, str]:
+        return self._scan().items()
+
+    def values(self) -> T.ValuesView[str]:
+        return self._scan().values()
+
+    def copy(self) -> "CompressedChapter":
+        """A copy (sharing the compressed block)."""
+        res = CompressedChapter.__new__(CompressedChapter)
+        res._cache = self._cache
+        res._key = next(_CHAPTER_KEYS)
+        res._nums = self._nums
+        res._block = self._block
+        return res
+
+    def decoded(self) -> T.Dict[int, str]:
+        """The verses, decoded into the cache (unlike items, which only peeks)."""
+        return self._verses()
+
+    def __deepcopy__(self, memo) -> "CompressedChapter":
+        # the block is immutable and the cache is shared (not copied)
+        return self.copy()
+
+    def nbytes(self) -> int:
+        """The size of the compressed block."""
+        return len(self._block)
+
+    def __repr__(self) -> str:
+        return f"<CompressedChapter {len(self._nums)} verses, {len(self._block)} bytes>"
+
+class Lookup(T.NamedTuple):
+    """
+    The result of Bible.get_many: the verses of every reference (in the order
+    of the references, empty when missing) and the missing references as
+    (index, reason) pairs.
+    """
+    verses: T.List[T.List[Verse]]
+    missing: T.List[T.Tuple[int, str]]
+
+def _chapters_dict(chapters: T.Dict[int, T.Mapping[int, str]]) -> T.Dict[int, T.Dict[int, str]]:
+    """The chapters of a book as plain dicts (CompressedChapters aren't JSON serializable)."""
+    return { chap_num: chap if isinstance(chap, dict) else dict(chap.items())
+            for chap_num, chap in chapters.items() }
+
 class BibleInconsistentError(Exception):
     ...
     
 class Bible:
     
     @classmethod
-    def from_dict(cls, data) -> "Bible":
-        bible = Bible(name = data.get("name", ""))
+    def from_dict(cls, data, compressed: bool = False) -> "Bible":
+        """
+        The Bible of data (see to_dict). If compressed is True, the chapters
+        are CompressedChapters (less memory, slower access). Old book names
+        are renamed to the current ones (see books.current_name).
+        """
+        builder = BibleBuilder(name = data.get("name", ""), compressed=compressed)
         for test_name, test in zip(("old", "new"), (Testament.old, Testament.new)):
             # use order for iteraton to preserve order
             for book_name in data["order"][test_name]:
                 book = data["testaments"][test_name][book_name]
+                builder.book(_books.current_name(book_name), test)
                 for chap_num, chap in book.items():
-                    for verse_num, verse in chap.items():
-                        bible += Verse(Verse.Loc(book_name, 
-                            int(chap_num),
-                            int(verse_num), test), str(verse))
+                    builder.chapter(int(chap_num), 
+                            ((int(verse_num), str(verse)) for verse_num, verse in chap.items()))
         # get the warnings
         for warning in data.get("warnings", {}):
-            locs = tuple(Verse.Loc(l[0], l[1], l[2], Testament(l[3]))
+            locs = tuple(Verse.Loc(_books.current_name(l[0]), l[1], l[2], Testament(l[3]))
                     for l in warning["locs"])
-            bible.warnings.add(BibleWarning(locs, warning["text"], 
+            builder.warnings.add(BibleWarning(locs, warning["text"], 
                 warning.get("type", "")))
-        return bible
+        return builder.finish()
         
     
     def __init__(self, name="") -> None:
@@ -88,7 +523,11 @@ class Bible:
         self.verses: T.Dict[CaseInsensitiveStr,
                 T.Dict[int, T.Dict[int, str]]] = OrderedDict({})
         self.testaments: T.List[T.List[CaseInsensitiveStr]] = [[], []]
-        self.warnings: T.Set[BibleWarning] = set()
+        self.warnings: WarningStore = WarningStore()
+        # fingerprints (hashes of the text). Missing entries are out of date
+        self._chapter_hashes: T.Dict[str, T.Dict[int, str]] = {}
+        self._book_hashes: T.Dict[str, str] = {}
+        self._root_hash: T.Optional[str] = None
 
     def __getitem__(self, loc: Verse.Loc) -> Verse:
         is_old_t = loc.book in self.testaments[Testament.old.value]
@@ -98,13 +537,94 @@ class Bible:
                 Testament.old if is_old_t else Testament.new)
         return Verse(v_loc, self.verses[CaseInsensitiveStr(loc.book)][loc.chapter][loc.verse])
     
+    def get_many(self, refs: T.Iterable[T.Union[str, _books.Reference, Verse.Loc]],
+            registry: T.Optional[_books.BookRegistry] = None) -> Lookup:
+        """
+        Look up many references at once. A reference is a string (see
+        books.parse_reference), a books.Reference (a chapter or a verse
+        range) or a Verse.Loc. Book names are resolved with registry
+        (books.DEFAULT by default). The references are sorted by book and
+        verse ID and looked up in one pass over the chapters.
+        Missing references are reported in Lookup.missing instead of raising.
+        """
+        if registry is None:
+            registry = _books.DEFAULT
+        books: T.List[T.Tuple[CaseInsensitiveStr, Testament]] = []
+        keys: T.Dict[str, int] = {}
+        for test in (Testament.old, Testament.new):
+            for book in self.testaments[test.value]:
+                keys[book.lower()] = len(books)
+                books.append((book, test))
+        # book name as written -> index in books (None if unknown)
+        found: T.Dict[str, T.Optional[int]] = {}
+        
+        def find_book(name: str) -> T.Optional[int]:
+            key = " ".join(str(name).lower().split())
+            if key not in keys and name in registry:
+                key = registry.resolve(name).lower()
+            return keys.get(key)
+        
+        refs = list(refs)
+        results: T.List[T.List[Verse]] = [ [] for _ in refs ]
+        missing: T.List[T.Tuple[int, str]] = []
+        # (book index, verse id, index in refs, chapter, first, last)
+        todo = []
+        for i, ref in enumerate(refs):
+            try:
+                if not isinstance(ref, tuple):
+                    ref = _books.parse_reference(ref)
+            except ValueError as e:
+                missing.append((i, str(e)))
+                continue
+            name, chap_num, first, last = ref
+            if isinstance(ref, Verse.Loc):
+                last = first
+            try:
+                book_idx = found[name]
+            except KeyError:
+                book_idx = found[name] = find_book(name)
+            if book_idx is None:
+                missing.append((i, f"Unknown book '{name}'"))
+                continue
+            todo.append((book_idx, verse_id(chap_num, first or 0), i, chap_num, first, last))
+        todo.sort()
+        
+        make_loc = Verse.Loc._make
+        chapters: T.Dict[int, T.Dict[int, str]] = {}
+        current = -1
+        for book_idx, _, i, chap_num, first, last in todo:
+            if book_idx != current:
+                book, test = books[book_idx]
+                chapters = self.verses[book]
+                current = book_idx
+            chap = chapters.get(chap_num)
+            if chap is None:
+                missing.append((i, f"{book} has no chapter {chap_num}"))
+                continue
+            if first is not None and first == last:
+                text = chap.get(first)
+                if text is not None:
+                    results[i] = [ Verse(make_loc((book, chap_num, first, test)), text) ]
+                    continue
+                missing.append((i, f"{book} {chap_num} has no verse {first}"))
+                continue
+            low = first or 0
+            high = last if last is not None else float("inf")
+            if isinstance(chap, CompressedChapter):
+                # a lookup uses the cache (a scan with items doesn't)
+                chap = chap.decoded()
+            results[i] = [ Verse(make_loc((book, chap_num, num, test)), text)
+                    for num, text in chap.items() if low <= num <= high ]
+            if len(results[i]) == 0:
+                missing.append((i, f"{book} {chap_num} has no verses {first}-{last or ''}"))
+        missing.sort()
+        return Lookup(results, missing)
+    
     def __contains__(self, loc: Verse.Loc) -> bool:
         try:
-            _ = self.verses[loc.book][loc.chapter][loc.verse]
+            return loc.verse in self.verses[loc.book][loc.chapter]
         except KeyError:
             return False
-        else:
-            return True
     
     def __setitem__(self, loc: Verse.Loc, text: str):
         book_name = CaseInsensitiveStr(loc.book)
@@ -122,10 +642,11 @@ class Bible:
         
         book = self.verses.get(book_name, OrderedDict({}))
         chapter = book.get(loc.chapter, OrderedDict({}))
-        chapter[loc.verse] = text
+        chapter[loc.verse] = TEXT_POOL.intern(text)
         
         book[loc.chapter] = chapter
         self.verses[book_name] = book
+        self.invalidate(book_name, loc.chapter)
     
     def __iadd__(self, verse: Verse):
         self[verse.loc] = verse.content
@@ -153,13 +674,78 @@ class Bible:
         self.warnings.add(BibleWarning(locs, text, type))
     
     
+    def invalidate(self, book: T.Optional[str] = None,
+            chapter: T.Optional[int] = None):
+        """
+        Mark the fingerprints of a chapter (or a book, or everything if book is
+        None) as out of date. Needed after changing self.verses directly.
+        """
+        self._root_hash = None
+        if book is None:
+            self._chapter_hashes.clear()
+            self._book_hashes.clear()
+            return
+        key = str(book).lower()
+        self._book_hashes.pop(key, None)
+        if chapter is None:
+            self._chapter_hashes.pop(key, None)
+        else:
+            self._chapter_hashes.get(key, {}).pop(chapter, None)
+    
+    def chapter_fingerprint(self, book: str, chapter: int) -> str:
+        key = str(book).lower()
+        chap_hashes = self._chapter_hashes.setdefault(key, {})
+        try:
+            return chap_hashes[chapter]
+        except KeyError:
+            pass
+        res = chapter_hash(self.verses[CaseInsensitiveStr(book)][chapter])
+        chap_hashes[chapter] = res
+        return res
+    
+    def book_fingerprint(self, book: str) -> str:
+        key = str(book).lower()
+        try:
+            return self._book_hashes[key]
+        except KeyError:
+            pass
+        chapters = self.verses[CaseInsensitiveStr(book)]
+        res = book_hash({ chap_num: self.chapter_fingerprint(book, chap_num)
+            for chap_num in chapters.keys() })
+        self._book_hashes[key] = res
+        return res
+    
+    def fingerprint(self) -> str:
+        """
+        The root of the fingerprint tree: verses are hashed into chapter
+        fingerprints, chapters into book fingerprints and books (in order)
+        into the root. Only the parts changed since the last call are
+        recomputed.
+        """
+        if self._root_hash is None:
+            self._root_hash = root_hash(
+                    [ (book, self.book_fingerprint(book)) for book in test ]
+                    for test in self.testaments)
+        return self._root_hash
+    
+    def fingerprints(self) -> T.Dict[str, T.Any]:
+        """The fingerprint tree (see diff_fingerprints)."""
+        return {
+                "root": self.fingerprint(),
+                "books": { str(book): {
+                    "hash": self.book_fingerprint(book),
+                    "chapters": { str(c): self.chapter_fingerprint(book, c)
+                        for c in self.verses[book].keys() },
+                    } for test in self.testaments for book in test },
+                }
+    
     def to_dict(self) -> T.Dict[str, T.Any]:
         return {
                 "name": self.name,
                 "testaments": {
-                    "old": { b: dict(self.verses[b]) 
+                    "old": { b: _chapters_dict(self.verses[b]) 
                         for b in self.testaments[Testament.old.value] },
-                    "new": { b: dict(self.verses[b]) 
+                    "new": { b: _chapters_dict(self.verses[b]) 
                         for b in self.testaments[Testament.new.value] }
                     },
                 "order": {
@@ -167,14 +753,50 @@ class Bible:
                     "new": list(self.testaments[Testament.new.value]),
                     },
                 "warnings": [ w.to_dict() for w in self.warnings ],
+                "fingerprints": self.fingerprints(),
                 }
         
         
+    def copy(self) -> "Bible":
+        """
+        A copy that doesn't share any containers with self (the texts are
+        shared, they're immutable). Much faster than copy.deepcopy.
+        """
+        res = Bible(self.name)
+        res.testaments = [ list(test) for test in self.testaments ]
+        res.verses = OrderedDict((book, OrderedDict((chap_num, chap.copy())
+            for chap_num, chap in chapters.items()))
+            for book, chapters in self.verses.items())
+        res.warnings = self.warnings.copy()
+        res._chapter_hashes = { book: dict(hashes)
+                for book, hashes in self._chapter_hashes.items() }
+        res._book_hashes = dict(self._book_hashes)
+        res._root_hash = self._root_hash
+        return res
+    
+    def compress(self, cache: ChapterCache = CHAPTER_CACHE):
+        """
+        Replace the chapters by CompressedChapters. The texts are still in
+        TEXT_POOL (use Bible.from_dict(data, compressed=True) to load a Bible
+        that is compressed from the start).
+        """
+        for chapters in self.verses.values():
+            for chap_num, chap in chapters.items():
+                if not isinstance(chap, CompressedChapter):
+                    chapters[chap_num] = CompressedChapter(chap.items(), cache)
+    
+    @property
+    def compressed(self) -> bool:
+        """True if the chapters are CompressedChapters (e.g. to rebuild the Bible the same way)."""
+        return any(isinstance(chap, CompressedChapter)
+                for chapters in self.verses.values() for chap in chapters.values())
+    
     def merge(self, other: "Bible"):
         if self.name.strip() == "":
             self.name = other.name
         self.verses = other.verses
         self.testaments = other.testaments
+        self.invalidate()
         self.warnings = self.warnings.union(other.warnings)
     
     
@@ -185,3 +807,100 @@ class Bible:
     
     def __str__(self) -> str:
         return f"{self.name} bible"
+
+
+class BibleBuilder:
+    """
+    Builds a Bible without the per verse checks of Bible.__setitem__.
+    
+    Declare a book (and its testament) once, then append its chapters (or
+    verses). finish() checks that every book is in exactly one testament
+    and returns the Bible:
+    
+    >>> builder = BibleBuilder("example")
+    >>> builder.book("Genesis", Testament.old)
+    >>> builder.chapter(1, [ (1, "In the beginning..."), (2, "And the earth...") ])
+    >>> builder.verse(2, 1, "Thus the heavens...")
+    >>> builder.finish().verses["genesis"][2][1]
+    'Thus the heavens...'
+    
+    It is also the in memory sink of sinks.py (extractors take a sink and
+    build into a BibleBuilder by default).
+    """
+    
+    def __init__(self, name: str = "", compressed: bool = False) -> None:
+        self._bible = Bible(name)
+        self.warnings = self._bible.warnings
+        self._books: T.Dict[CaseInsensitiveStr, T.Dict[int, T.Dict[int, str]]] = OrderedDict()
+        self._tests: T.Dict[CaseInsensitiveStr, T.List[Testament]] = OrderedDict()
+        self._chapters: T.Dict[int, T.Dict[int, str]] = OrderedDict()
+        # compressed Bibles don't keep their texts in TEXT_POOL
+        self._intern = str if compressed else TEXT_POOL.intern
+        self._compressed = compressed
+    
+    def start(self, name: str):
+        """Set the name of the Bible."""
+        self._bible.name = name
+    
+    def book(self, name: str, test: Testament):
+        """Make name the current book (appending to it if it exists)."""
+        key = CaseInsensitiveStr(name)
+        chapters = self._books.get(key)
+        if self._compressed and chapters is not self._chapters:
+            # compress the previous book (and decompress this one to append to it)
+            self._compress_book(self._chapters)
+            for chap_num, chap in (chapters or {}).items():
+                chapters[chap_num] = OrderedDict(chap.items())
+        if chapters is None:
+            chapters = self._books[key] = OrderedDict()
+            self._tests[key] = [test]
+        elif test not in self._tests[key]:
+            self._tests[key].append(test)
+        self._chapters = chapters
+    
+    def chapter(self, num: int, verses: T.Iterable[T.Tuple[int, str]]):
+        """Append verses ((number, text) pairs) to chapter num of the current book."""
+        intern = self._intern
+        chap = self._chapters.get(num)
+        if chap is None:
+            chap = self._chapters[num] = OrderedDict()
+        for verse_num, text in verses:
+            chap[verse_num] = intern(text)
+    
+    def verse(self, chapter: int, verse: int, text: str):
+        """Append a verse to the current book."""
+        chap = self._chapters.get(chapter)
+        if chap is None:
+            chap = self._chapters[chapter] = OrderedDict()
+        chap[verse] = self._intern(text)
+    
+    def warn(self, locs: T.Union[Verse.Loc, T.Iterable[Verse.Loc]], text: str,
+            type: str = ""):
+        self._bible.warn(locs, text, type)
+    
+    @staticmethod
+    def _compress_book(chapters: T.Dict[int, T.Dict[int, str]]):
+        for chap_num, chap in chapters.items():
+            if not isinstance(chap, CompressedChapter):
+                chapters[chap_num] = CompressedChapter(chap.items())
+    
+    def warning(self, warning: BibleWarning):
+        self.warnings.add(warning)
+    
+    def finish(self) -> Bible:
+        """Return the Bible. Books that didn't get any verses are left out."""
+        bible = self._bible
+        if self._compressed:
+            self._compress_book(self._chapters)
+        for book, tests in self._tests.items():
+            if len(self._books[book]) == 0:
+                del self._books[book]
+                continue
+            if len(tests) > 1:
+                raise BibleInconsistentError(f"{book}: a book cannot be in both testaments")
+            if tests[0] == Testament.unknown:
+                raise BibleInconsistentError(f"{book}: a book has to be in one of the testaments")
+            bible.testaments[tests[0].value].append(book)
+        bible.verses = self._books
+        bible.invalidate()
+        return bible
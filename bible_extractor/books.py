@@ -0,0 +1,287 @@
+"""
+Provides the canonical names of the books of the Bible and the registries
+that resolve the names used by the different sources to them.
+
+Numbered books are named <name> <roman numeral> (e.g. Kings I). The same
+book can be written as 1 Kings, I Kings, Kings 1, etc. Some names depend on
+the source: in the Vulgate and the Septuagint 1 Kings is 1 Samuel and
+3 Kings is 1 Kings, so every source resolves names with its own registry.
+"""
+import re
+import threading
+import typing as T
+
+import logging
+log = logging.getLogger(__name__)
+
+import roman
+to_roman = roman.toRoman
+from_roman = roman.fromRoman
+
+OLD_TESTAMENT: T.List[str] = [
+    "Genesis", "Exodus", "Leviticus", "Numbers", "Deuteronomy", "Joshua",
+    "Judges", "Ruth", "Samuel I", "Samuel II", "Kings I", "Kings II",
+    "Chronicles I", "Chronicles II", "Ezra", "Nehemiah", "Esther", "Job",
+    "Psalms", "Proverbs", "Ecclesiastes", "Songs", "Isaiah", "Jeremiah",
+    "Lamentations", "Ezekiel", "Daniel", "Hosea", "Joel", "Amos", "Obadiah",
+    "Jonah", "Micah", "Nahum", "Habakkuk", "Zephaniah", "Haggai", "Zechariah",
+    "Malachi",
+    # deuterocanonical books
+    "Tobit", "Judith", "Wisdom", "Sirach", "Baruch", "Epistle of Jeremy",
+    "Prayer of Azarias", "Susanna", "Bel and the Dragon", "Maccabees I",
+    "Maccabees II", "Maccabees III", "Maccabees IV", "Esdras I",
+    "Prayer of Manasses",
+]
+
+NEW_TESTAMENT: T.List[str] = [
+    "Matthew", "Mark", "Luke", "John", "Acts", "Romans", "Corinthians I",
+    "Corinthians II", "Galatians", "Ephesians", "Philippians", "Colossians",
+    "Thessalonians I", "Thessalonians II", "Timothy I", "Timothy II", "Titus",
+    "Philemon", "Hebrews", "James", "Peter I", "Peter II", "John I", "John II",
+    "John III", "Jude", "Revelation",
+]
+
+CANONICAL_NAMES: T.List[str] = OLD_TESTAMENT + NEW_TESTAMENT
+
+# other names (Greek, Latin, misspellings, abbreviations) of unnumbered books.
+# These mean the same book in every source
+ALIASES: T.Dict[str, str] = {
+    "josue": "Joshua",
+    "tobias": "Tobit",
+    "song of songs": "Songs",
+    "song of solomon": "Songs",
+    "canticles": "Songs",
+    "solomon": "Songs",
+    "isaias": "Isaiah",
+    "esias": "Isaiah",
+    "jeremias": "Jeremiah",
+    "ezechiel": "Ezekiel",
+    "ezeckiel": "Ezekiel",
+    "jezekiel": "Ezekiel",
+    "osee": "Hosea",
+    "abdias": "Obadiah",
+    "obdias": "Obadiah",
+    "jonas": "Jonah",
+    "micheas": "Micah",
+    "michaeas": "Micah",
+    "naum": "Nahum",
+    "habacuc": "Habakkuk",
+    "ambacum": "Habakkuk",
+    "sophonias": "Zephaniah",
+    "aggeus": "Haggai",
+    "aggaeus": "Haggai",
+    "zacharias": "Zechariah",
+    "zachariah": "Zechariah",
+    "malachias": "Malachi",
+    "ecclesiasticus": "Sirach",
+    "acts of apostles": "Acts",
+    "acts of the apostles": "Acts",
+    "apocalypse": "Revelation",
+    "apocalypse / revelation": "Revelation",
+}
+
+# other names of numbered books (without the number)
+NUMBERED_ALIASES: T.Dict[str, str] = {
+    "paralipomenon": "Chronicles",
+    "machabees": "Maccabees",
+    "thessalon.": "Thessalonians",
+}
+
+# numbered books whose names depend on the source
+VULGATE_NAMES: T.Dict[T.Tuple[str, int], str] = {
+    ("kings", 1): "Samuel I",
+    ("kings", 2): "Samuel II",
+    ("kings", 3): "Kings I",
+    ("kings", 4): "Kings II",
+    ("esdras", 1): "Ezra",
+    ("esdras", 2): "Nehemiah",
+}
+SEPTUAGINT_NAMES: T.Dict[T.Tuple[str, int], str] = {
+    ("kings", 1): "Samuel I",
+    ("kings", 2): "Samuel II",
+    ("kings", 3): "Kings I",
+    ("kings", 4): "Kings II",
+}
+
+def _split_number(name: str) -> T.Tuple[str, T.Optional[int]]:
+    """
+    Split a name into its base name and number: <number> <name>,
+    <roman> <name>, <name> <number> or <name> <roman>.
+    """
+    parts = name.split(" ")
+    if len(parts) >= 2:
+        for num_str, base in ((parts[0], " ".join(parts[1:])),
+                (parts[-1], " ".join(parts[:-1]))):
+            try:
+                return base, int(num_str)
+            except ValueError:
+                pass
+            try:
+                return base, from_roman(num_str.upper())
+            except (ValueError, roman.InvalidRomanNumeralError):
+                pass
+    return name, None
+
+def _number_forms(base: str, num: int) -> T.List[str]:
+    """All the (lower case) ways to write book num of base."""
+    rom = to_roman(num).lower()
+    return [ f"{num} {base}", f"{rom} {base}", f"{base} {num}", f"{base} {rom}" ]
+
+class BookRegistry:
+    """
+    Resolves book names to their canonical names.
+
+    All the known forms of every name are precomputed, so resolving is a
+    single dictionary lookup. Unknown names are logged once and converted to
+    <name> <roman numeral>.
+    """
+
+    def __init__(self, name: str,
+            numbered_names: T.Dict[T.Tuple[str, int], str] = {}) -> None:
+        self.name = name
+        self._table: T.Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+        for canonical in CANONICAL_NAMES:
+            key = canonical.lower()
+            base, num = _split_number(key)
+            keys = [key] if num is None else _number_forms(base, num)
+            for k in keys:
+                self._table[k] = canonical
+        for alias, canonical in ALIASES.items():
+            self._table[alias] = canonical
+        for alias, base_name in NUMBERED_ALIASES.items():
+            for num in range(1, 5):
+                canonical = f"{base_name} {to_roman(num)}"
+                if canonical in CANONICAL_NAMES:
+                    for k in _number_forms(alias, num):
+                        self._table[k] = canonical
+        for (base, num), canonical in numbered_names.items():
+            for k in _number_forms(base, num):
+                self._table[k] = canonical
+
+    def resolve(self, name: str) -> str:
+        """
+        Return the canonical name of a book.
+
+        >>> VULGATE.resolve("3 Kings")
+        'Kings I'
+        >>> DEFAULT.resolve("1 thessalon.")
+        'Thessalonians I'
+        """
+        key = " ".join(str(name).lower().split())
+        try:
+            return self._table[key]
+        except KeyError:
+            pass
+        with self._lock:
+            # fall back to <name> <roman> and remember the result
+            name = " ".join(str(name).split())
+            base, num = _split_number(name)
+            res = f"{base} {to_roman(num)}" if num is not None else name
+            log.warning(f"Unknown book name '{name}' ({self.name}). Using '{res}'")
+            self._table[key] = res
+            return res
+
+    def __contains__(self, name: str) -> bool:
+        return " ".join(str(name).lower().split()) in self._table
+
+    def __getstate__(self) -> T.Dict[str, T.Any]:
+        # locks can't be pickled (registries are sent to worker processes)
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: T.Dict[str, T.Any]):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"<BookRegistry {self.name}>"
+
+DEFAULT = BookRegistry("default")
+VULGATE = BookRegistry("vulgate", VULGATE_NAMES)
+SEPTUAGINT = BookRegistry("septuagint", SEPTUAGINT_NAMES)
+
+def current_name(name: str) -> str:
+    """
+    The canonical name of a book read from an extracted Bible. Files written
+    before the registries use older names for some books (Solomon, Ezeckiel,
+    Zachariah, Machabees I, Ecclesiasticus, Acts of Apostles, Apocalypse /
+    Revelation, Esias, ...). Unknown names are kept as they are.
+
+    >>> current_name("Machabees II")
+    'Maccabees II'
+    >>> current_name("Kings I")
+    'Kings I'
+    """
+    return DEFAULT.resolve(name) if name in DEFAULT else name
+
+class Reference(T.NamedTuple):
+    """
+    A reference to a chapter or to a range of verses in a chapter.
+    first is None for the whole chapter and last is None for "until the end
+    of the chapter".
+    """
+    book: str
+    chapter: int
+    first: T.Optional[int] = None
+    last: T.Optional[int] = None
+
+    def __str__(self) -> str:
+        if self.first is None:
+            return f"{self.book} {self.chapter}"
+        if self.first == self.last:
+            return f"{self.book} {self.chapter}:{self.first}"
+        return f"{self.book} {self.chapter}:{self.first}-{self.last or ''}"
+
+_REFERENCE_RE = re.compile(
+        r"^(?P<book>.+?)\s+(?P<chapter>\d+)"
+        r"(?::(?P<first>\d+)(?:(?P<dash>-)(?P<last>\d+)?)?)?$")
+
+def parse_reference(ref: str) -> Reference:
+    """
+    Parse <book> <chapter>[:<verse>[-[<verse>]]]. The book name isn't resolved.
+
+    >>> parse_reference("Daniel 3:23-")
+    Reference(book='Daniel', chapter=3, first=23, last=None)
+    >>> parse_reference("1 Kings 2:4")
+    Reference(book='1 Kings', chapter=2, first=4, last=4)
+    """
+    match = _REFERENCE_RE.match(" ".join(str(ref).split()))
+    if match is None:
+        raise ValueError(f"Invalid reference '{ref}'")
+    chapter = int(match.group("chapter"))
+    if match.group("first") is None:
+        return Reference(match.group("book"), chapter)
+    first = int(match.group("first"))
+    if match.group("dash") is None:
+        return Reference(match.group("book"), chapter, first, first)
+    last = match.group("last")
+    return Reference(match.group("book"), chapter, first,
+            int(last) if last is not None else None)
+
+# the number of chapters in every book (King James versification for the
+# books it has). Used as the reference when validating Bibles
+CHAPTER_COUNTS: T.Dict[str, int] = {
+    "Genesis": 50, "Exodus": 40, "Leviticus": 27, "Numbers": 36,
+    "Deuteronomy": 34, "Joshua": 24, "Judges": 21, "Ruth": 4, "Samuel I": 31,
+    "Samuel II": 24, "Kings I": 22, "Kings II": 25, "Chronicles I": 29,
+    "Chronicles II": 36, "Ezra": 10, "Nehemiah": 13, "Esther": 10, "Job": 42,
+    "Psalms": 150, "Proverbs": 31, "Ecclesiastes": 12, "Songs": 8,
+    "Isaiah": 66, "Jeremiah": 52, "Lamentations": 5, "Ezekiel": 48,
+    "Daniel": 12, "Hosea": 14, "Joel": 3, "Amos": 9, "Obadiah": 1, "Jonah": 4,
+    "Micah": 7, "Nahum": 3, "Habakkuk": 3, "Zephaniah": 3, "Haggai": 2,
+    "Zechariah": 14, "Malachi": 4,
+    "Tobit": 14, "Judith": 16, "Wisdom": 19, "Sirach": 51, "Baruch": 5,
+    "Epistle of Jeremy": 1, "Prayer of Azarias": 1, "Susanna": 1,
+    "Bel and the Dragon": 1, "Maccabees I": 16, "Maccabees II": 15,
+    "Maccabees III": 7, "Maccabees IV": 18, "Esdras I": 9,
+    "Prayer of Manasses": 1,
+    "Matthew": 28, "Mark": 16, "Luke": 24, "John": 21, "Acts": 28,
+    "Romans": 16, "Corinthians I": 16, "Corinthians II": 13, "Galatians": 6,
+    "Ephesians": 6, "Philippians": 4, "Colossians": 4, "Thessalonians I": 5,
+    "Thessalonians II": 3, "Timothy I": 6, "Timothy II": 4, "Titus": 3,
+    "Philemon": 1, "Hebrews": 13, "James": 5, "Peter I": 5, "Peter II": 3,
+    "John I": 5, "John II": 1, "John III": 1, "Jude": 1, "Revelation": 22,
+}
@@ -0,0 +1,51 @@
+"""
+Provides a small persistent cache for data that doesn't change between runs
+(e.g. the number of chapters in each book of a source).
+"""
+from os import path
+import json
+import os
+import typing as T
+
+import logging
+log = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get("BIBLE_EXTRACTOR_CACHE",
+        path.join(os.environ.get("XDG_CACHE_HOME", path.expanduser("~/.cache")),
+            "bible_extractor"))
+
+class JsonCache:
+    """
+    A dictionary that is loaded from and saved to {CACHE_DIR}/{name}.json.
+    Keys must be strings and values must be JSON serializable.
+    """
+
+    def __init__(self, name: str, cache_dir: str = CACHE_DIR) -> None:
+        self.path = path.join(cache_dir, f"{name}.json")
+        try:
+            with open(self.path, "r") as cache_file:
+                self.data: T.Dict[str, T.Any] = json.load(cache_file)
+        except (OSError, ValueError):
+            self.data = {}
+
+    def get(self, key: str, default: T.Any = None) -> T.Any:
+        return self.data.get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.data
+
+    def __getitem__(self, key: str) -> T.Any:
+        return self.data[key]
+
+    def __setitem__(self, key: str, value: T.Any):
+        self.data[key] = value
+
+    def save(self):
+        try:
+            os.makedirs(path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as cache_file:
+                json.dump(self.data, cache_file, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.warning(f"Unable to save cache '{self.path}': {e}")
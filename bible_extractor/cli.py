@@ -1,25 +1,33 @@
 from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import OrderedDict
 from os import path
+import os
 import sys
 import json
 import pickle
 import re
+import time
 
 import logging
 logging.basicConfig(level=logging.INFO)
 
 import typing as T
 
-from .extract import DEFAULT_EXTRACTOR, extract
+from .extract import DEFAULT_EXTRACTOR, extract, Selection
+from . import fetch
 from . import extractors
-from .bible import Bible, Verse
-from .stats import get_bible_stats
-from .merge import merge
+from .bible import Bible, Verse, TEXT_POOL, CHAPTER_CACHE
+from .stats import get_bible_stats, get_text_stats
+from .merge import merge_into, update, changed_verses
+from . import export
+from . import shards
+from . import sinks
 from . import functions
 
 def check(bible: Bible) -> Bible:
     """Run all checks on the bible."""
-    return functions.check_lengths(bible)
+    return functions.validate(bible)
 
 FUNCTIONS = list(functions.__all__) + [ check ]
 del check
@@ -30,17 +38,61 @@ ARG_PARSER.add_argument("source", nargs="+",
 """The source to extract from. Use list for a list of sources. If multiple sources are specified, merge them (giving priority to the first source).
 Each source has the following format: <filename or index>[:function ...]. 
 Use list to get a list of functions.
+Use serve <filename ...> to serve extracted Bibles over HTTP (see --host and --port).
+Use daemon to keep a warm process that runs the commands of later calls (see --socket and daemon.py).
+Use lookup <filename> to print the verses of the references (e.g. Genesis 1:1-3) read from stdin (one per line, see -f json).
 """)
 ARG_PARSER.add_argument("-o", "--output", help="The output file",
         metavar="FILE", default="output.json")
 ARG_PARSER.add_argument("-f", "--format", 
-        help="The format, one of json or sql. "
+        help="The format, one of json, sql, sqlite, csv, tsv, columnar (a binary file with one array per column, see export.py) "
+        "or sharded (a directory with a manifest and one file per book, see shards.py). "
         "The default is sql or the extensions of the output file. If ALL is specificed, one of each format is created with the following filename scheme {output_file_name}.{format}",
-        metavar="FORMAT", default="NONE", choices=("SQL", "JSON", "ALL"))
+        metavar="FORMAT", default="NONE", choices=("SQL", "JSON", "SQLITE", "CSV", "TSV", "COLUMNAR", "SHARDED", "ALL"))
+ARG_PARSER.add_argument("--books", metavar="BOOK,...",
+        type=lambda books: [ b.strip() for b in books.split(",") if b.strip() != "" ],
+        help="Only extract these books (and only load them from sharded sources). "
+        "Writing a sharded output then only rewrites these books")
+ARG_PARSER.add_argument("--chapters", metavar="RANGES", type=Selection.parse_chapters,
+        help="Only extract these chapters (e.g. 1,3-14) of every book")
+ARG_PARSER.add_argument("--update", action="store_true",
+        help="Replace the chapters of the existing output (json or sharded) with "
+        "the extracted ones instead of overwriting it (e.g. after extracting some books with --books)")
+ARG_PARSER.add_argument("--incremental", action="store_true",
+        help="Only extract the chapters whose pages changed since the previous --incremental "
+        "run and patch the existing output (json or sharded) and stats with them "
+        "(check and validate run on the patched books). "
+        "The page digests and the verses that changed are kept in {output_file_name}.pages.json. "
+        "Takes a single source (a URL)")
+ARG_PARSER.add_argument("--versions", action="store_true",
+        help="Export every source as a separate version instead of merging them (csv, tsv, sqlite and columnar formats)")
+ARG_PARSER.add_argument("--stream", action="store_true",
+        help="Extract a single source straight to the output (json, sqlite or columnar) "
+        "one book at a time instead of building the whole Bible in memory. "
+        "The only functions allowed are check and validate")
+ARG_PARSER.add_argument("-j", "--jobs", type=int, metavar="N",
+        help="Load (and apply the functions of) up to N sources at the same time. "
+        "The default is one per source, up to 8. The merge doesn't depend on N")
 ARG_PARSER.add_argument("-s", "--stats", metavar="FILE", help="Output the statistics of the bible in FILE")
+ARG_PARSER.add_argument("--text-stats", action="store_true",
+        help="Add word statistics (word and bigram counts, vocabularies, see stats.TextStats) "
+        "to the statistics. They're computed in a process per CPU")
+ARG_PARSER.add_argument("-p", "--profile", metavar="FILE", 
+        help="Output profiling information (timing and request scheduler metrics) in FILE")
 ARG_PARSER.add_argument("-v", "--verbose", help="Increase verbosity level",
         action="count")
 ARG_PARSER.add_argument("--force", action="store_true", help="Don't give override warnings.")
+ARG_PARSER.add_argument("--dry-run", action="store_true",
+        help="Only print the pages that would be downloaded (for sources that support it).")
+ARG_PARSER.add_argument("--host", default="127.0.0.1", help="The address serve listens on")
+ARG_PARSER.add_argument("--port", type=int, default=8377, help="The port serve listens on")
+ARG_PARSER.add_argument("--socket", metavar="PATH",
+        help="The Unix socket daemon listens on (the default is in the temporary directory)")
+ARG_PARSER.add_argument("--cache-size", type=int, default=256, metavar="N",
+        help="The number of decoded chapters serve (and --compressed) keeps in memory")
+ARG_PARSER.add_argument("--compressed", action="store_true",
+        help="Keep the chapters of the loaded Bibles (JSON files and sharded directories) "
+        "compressed and decode them on access (less memory, slower access)")
 
 def _print_list():
     print("Sources")
@@ -59,6 +111,12 @@ def _print_list():
         print(f"{func.__name__:20} {' ' * 8} {desc}\n")
         
 
+_FORMAT_EXTENSIONS = { ".json": "JSON", ".csv": "CSV", ".tsv": "TSV",
+        ".col": "COLUMNAR", ".sqlite": "SQLITE", ".db": "SQLITE" }
+
+_STREAM_SINKS = { "JSON": sinks.JsonSink, "SQLITE": sinks.SQLiteSink,
+        "COLUMNAR": sinks.ColumnarSink }
+
 _SOURCE_REGEX = re.compile(r"([^:]+)((:[^:]*)*)")
 BibleFunc = T.Callable[[Bible], Bible]
 class SourceParseError(Exception): pass
@@ -91,6 +149,16 @@ def parse_source(source: str) -> T.Optional[
     
     return (is_idx, src, funcs)
 
+# functions that only add warnings (for the whole Bible, e.g. missing chapters)
+_CHECKS = ("check", "validate")
+
+def _split_checks(funcs: T.Iterable[BibleFunc]
+        ) -> T.Tuple[T.List[BibleFunc], T.List[BibleFunc]]:
+    """Split funcs into (the functions that change the Bible, the checks)."""
+    funcs = list(funcs)
+    return ([ f for f in funcs if f.__name__ not in _CHECKS ],
+            [ f for f in funcs if f.__name__ in _CHECKS ])
+
 def _apply_funcs(log, funcs: T.Iterable[BibleFunc], bible: Bible) -> Bible:
     for func in funcs:
         log.info(f"Applying '{func.__name__}' to '{bible.name}'")
@@ -99,17 +167,274 @@ def _apply_funcs(log, funcs: T.Iterable[BibleFunc], bible: Bible) -> Bible:
         except Exception as e:
             log.error(f"'{func.__name__}': {e}")
     return bible
+
+def _update(log, bible: Bible, other: Bible, checks: T.Iterable[BibleFunc]) -> Bible:
+    """
+    update(bible, other) and apply checks to the updated books (whole, so
+    that the book level warnings are right).
+    """
+    bible = update(bible, other)
+    checks = list(checks)
+    if not checks:
+        return bible
+    updated = Bible(bible.name)
+    updated.testaments = [ [ b for b in bible.testaments[i] if b in other.testaments[i] ]
+            for i in range(2) ]
+    updated.verses = OrderedDict((b, bible.verses[b])
+            for test in updated.testaments for b in test)
+    bible.warnings.update(_apply_funcs(log, checks, updated).warnings)
+    return bible
+
+# set by the daemon to reuse the Bibles of JSON files between commands
+BIBLE_CACHE = None
+
+def _load_file(source: str, compressed: bool = False) -> Bible:
+    if shards.is_sharded(source):
+        return shards.read_sharded(source, compressed=compressed)
+    if BIBLE_CACHE is not None:
+        return BIBLE_CACHE.load(source, compressed)
+    with open(source, "r") as json_file:
+        return Bible.from_dict(json.load(json_file), compressed)
+
+def _lookup(log, args, file_paths: T.List[str], batch_size: int = 50000):
+    """Print the verses of the references on stdin (JSON lines with -f JSON)."""
+    if len(file_paths) != 1:
+        log.error("lookup takes one file")
+        sys.exit(1)
+    bible = _load_file(file_paths[0], args.compressed)
+    lines = ( line.strip() for line in sys.stdin )
+    refs = [ line for line in lines if line != "" ]
+    num_missing = 0
+    for start in range(0, len(refs), batch_size):
+        batch = refs[start:start + batch_size]
+        result = bible.get_many(batch)
+        reasons = dict(result.missing)
+        for i, (ref, verses) in enumerate(zip(batch, result.verses)):
+            if args.format == "JSON":
+                answer: T.Dict[str, T.Any] = { "ref": ref, "verses": [
+                    { "book": str(v.loc.book), "chapter": v.loc.chapter,
+                        "verse": v.loc.verse, "text": v.content } for v in verses ] }
+                if i in reasons:
+                    answer["error"] = reasons[i]
+                print(json.dumps(answer))
+            else:
+                for v in verses:
+                    print(f"{v.loc.book} {v.loc.chapter}:{v.loc.verse}\t{v.content}")
+        for i, reason in result.missing:
+            log.warning(f"'{batch[i]}': {reason}")
+        num_missing += len(result.missing)
+    if num_missing > 0:
+        log.error(f"{num_missing} of {len(refs)} references are missing")
+        sys.exit(1)
+
+def _extract_options(log, args, source: str) -> T.Dict[str, T.Any]:
+    """The selection option of --books and --chapters (if source supports it)."""
+    if args.books is None and args.chapters is None:
+        return {}
+    if not DEFAULT_EXTRACTOR.supports(source, "selection"):
+        log.warning(f"Source '{source}' doesn't support --books and --chapters")
+        return {}
+    return { "selection": Selection(args.books, args.chapters) }
+
+def _get_stats(args, bible: Bible) -> T.Dict[str, T.Any]:
+    bible_stats = get_bible_stats(bible).to_dict()
+    if args.text_stats:
+        _add_text_stats([ bible_stats ], [ bible ])
+    return bible_stats
+
+def _add_text_stats(stats: T.List[T.Dict[str, T.Any]], bibles: T.List[Bible]):
+    """
+    Add the text stats of every bible to its stats (one process pool for
+    all of them). Not for the worker threads: the pool forks the process.
+    """
+    processes = os.cpu_count() or 1
+    executor = ProcessPoolExecutor(processes) if processes > 1 else None
+    try:
+        for bible_stats, bible in zip(stats, bibles):
+            bible_stats["text"] = get_text_stats(bible, executor=executor).to_dict()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+def _incremental(log, args, source: str, funcs: T.List[BibleFunc], fmt: str):
+    """
+    Extract the chapters of source whose pages changed since the previous
+    run and patch them into the output (see --incremental).
+    """
+    if fmt not in ("JSON", "SHARDED"):
+        log.error(f"The {fmt.lower()} format can't be updated incrementally")
+        sys.exit(1)
+    if not DEFAULT_EXTRACTOR.supports(source, "digests"):
+        log.error(f"Source '{source}' doesn't support --incremental")
+        sys.exit(1)
+    digests_file = args.output.rstrip("/" + os.sep) + ".pages.json"
+    exists = path.isfile(args.output) if fmt == "JSON" else shards.is_sharded(args.output)
+    if exists:
+        digests = fetch.PageDigests.load(digests_file)
+    else:
+        log.info(f"'{args.output}' doesn't exist. Extracting everything")
+        digests = fetch.PageDigests()
+    
+    start_time = time.monotonic()
+    partial = extract(source, digests=digests, **_extract_options(log, args, source))
+    # the checks run on the patched Bible (see _update)
+    funcs, checks = _split_checks(funcs)
+    partial = _apply_funcs(log, funcs, partial)
+    extract_time = time.monotonic() - start_time
+    log.info(f"Pages: {digests.summary()}")
+    if len(digests.missing()) > 0 and args.books is None and args.chapters is None:
+        log.warning(f"{len(digests.missing())} page(s) of the previous run weren't found. "
+                "Their chapters are kept")
+    
+    num_chapters = sum(len(partial.verses[b]) for test in partial.testaments for b in test)
+    if not exists:
+        bible = _apply_funcs(log, checks, partial)
+        changes = changed_verses(Bible(), partial)
+    elif num_chapters == 0 and len(partial.warnings) == 0:
+        # nothing to patch
+        bible = None
+        changes = changed_verses(Bible(), partial)
+    elif fmt == "JSON":
+        with open(args.output, "r") as json_file:
+            bible = Bible.from_dict(json.load(json_file))
+        changes = changed_verses(bible, partial)
+        bible = _update(log, bible, partial, checks)
+    else:
+        # only the books of partial are loaded and rewritten
+        out_books = [ str(b) for test in partial.testaments for b in test ]
+        bible = shards.read_sharded(args.output, out_books)
+        changes = changed_verses(bible, partial)
+        bible = _update(log, bible, partial, checks)
+    
+    if bible is None:
+        log.info(f"Nothing changed. '{args.output}' is left as it is")
+    elif fmt == "JSON":
+        with open(args.output, "w") as json_file:
+            json.dump(bible.to_dict(), json_file, indent=2)
+    else:
+        shards.write_sharded(bible, args.output, partial=exists)
+        bible = shards.read_sharded(args.output)
+    if args.stats is not None and (bible is not None or not path.isfile(args.stats)):
+        if bible is None:
+            bible = _load_file(args.output)
+        with open(args.stats, "w") as stats_file:
+            json.dump([ _get_stats(args, bible) ], stats_file, indent=4)
+    
+    for kind, locs in changes.items():
+        for loc in locs:
+            log.debug(f"{loc}: {kind}")
+    log.info(f"Re-extracted {num_chapters} chapter(s): "
+            + ", ".join(f"{len(locs)} verse(s) {kind}" for kind, locs in changes.items()))
+    pages = { "changed": len(digests.changed), "unchanged": len(digests.unchanged),
+            "missing": len(digests.missing()) }
+    digests.save(digests_file, last_run={
+        "source": source,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "pages": pages,
+        "verses": { kind: [ [ str(l.book), l.chapter, l.verse ] for l in locs ]
+            for kind, locs in changes.items() },
+        })
+    if args.profile is not None:
+        profile = { "sources": [ { "source": source, "time": extract_time,
+                "total": time.monotonic() - start_time, "pages": pages } ],
+                "scheduler": fetch.DEFAULT_SCHEDULER.metrics(),
+                "text_pool": TEXT_POOL.stats() }
+        with open(args.profile, "w") as profile_file:
+            json.dump(profile, profile_file, indent=4)
+
+def _load_source(log, args, is_url: bool, source: str, funcs: T.List[BibleFunc]
+        ) -> T.Tuple[Bible, T.Dict[str, T.Any], T.Dict[str, float]]:
+    """
+    Load source, apply funcs and get the stats (run in the worker pool, the
+    text stats are added after it).
+    """
+    timing: T.Dict[str, float] = {}
+    start_time = time.monotonic()
+    if is_url:
+        bible = extract(source, **_extract_options(log, args, source))
+    elif shards.is_sharded(source):
+        bible = shards.read_sharded(source, args.books, compressed=args.compressed)
+    else:
+        bible = _load_file(source, args.compressed)
+    timing["load"] = time.monotonic() - start_time
+    
+    step_time = time.monotonic()
+    bible = _apply_funcs(log, funcs, bible)
+    timing["functions"] = time.monotonic() - step_time
+    
+    step_time = time.monotonic()
+    bible_stats = get_bible_stats(bible).to_dict()
+    timing["stats"] = time.monotonic() - step_time
+    timing["time"] = time.monotonic() - start_time
+    return bible, bible_stats, timing
+
+def _stream(log, args, source: str, funcs: T.List[BibleFunc], fmt: str):
+    """Extract source into the sink of fmt (with validation and stats)."""
+    if fmt not in _STREAM_SINKS:
+        log.error(f"The {fmt.lower()} format can't be streamed")
+        sys.exit(1)
+    if not DEFAULT_EXTRACTOR.supports(source, "sink"):
+        log.error(f"Source '{source}' doesn't support --stream")
+        sys.exit(1)
+    sink = stats_sink = sinks.StatsSink(_STREAM_SINKS[fmt](args.output))
+    for func in funcs:
+        if func.__name__ not in _CHECKS:
+            log.error(f"'{func.__name__}' can't be applied with --stream")
+            sys.exit(1)
+        sink = sinks.ValidationSink(sink)
+    
+    start_time = time.monotonic()
+    extract(source, sink=sink, **_extract_options(log, args, source))
+    if args.stats is not None:
+        with open(args.stats, "w") as stats_file:
+            json.dump([ stats_sink.stats.to_dict() ], stats_file, indent=4)
+    if args.profile is not None:
+        profile = { "sources": [ { "source": source, "time": time.monotonic() - start_time } ],
+                "scheduler": fetch.DEFAULT_SCHEDULER.metrics(),
+                "text_pool": TEXT_POOL.stats() }
+        with open(args.profile, "w") as profile_file:
+            json.dump(profile, profile_file, indent=4)
         
 
 def main(args=None):
     log = logging.getLogger(__name__ + ".main")
     if args is None:
         args = ARG_PARSER.parse_args()
-        
     args.sources = [ s.lower() for s in args.source ]
+    if args.compressed:
+        CHAPTER_CACHE.size = args.cache_size
     if "list" in args.sources:
         _print_list()
         sys.exit(1)
+    if args.sources[0] == "serve":
+        from .server import serve
+        try:
+            serve(args.source[1:], args.host, args.port, args.cache_size)
+        except (OSError, ValueError) as e:
+            log.error(f"Unable to serve: {e}")
+            sys.exit(1)
+        return
+    if args.sources[0] == "lookup":
+        try:
+            _lookup(log, args, args.source[1:])
+        except (OSError, ValueError) as e:
+            log.error(f"Unable to look up: {e}")
+            sys.exit(1)
+        return
+    if args.sources[0] == "daemon":
+        from . import daemon
+        try:
+            daemon.run(args.socket)
+        except OSError as e:
+            log.error(f"Unable to start the daemon: {e}")
+            sys.exit(1)
+        return
+    # identical texts of the sources and the outputs share one string
+    with TEXT_POOL.scope():
+        _convert(log, args)
+
+def _convert(log, args):
+    """Extract (or load) the sources, apply their functions and write the outputs."""
     # convert the sources:
     sources = []
     src_is_url = []
@@ -132,7 +457,7 @@ def main(args=None):
                 log.error(f"Source {src} is out of range")
                 sys.exit(1)
             is_url = True
-        elif path.isfile(source):
+        elif path.isfile(source) or shards.is_sharded(source):
             is_url = False
             src = source
         else:
@@ -149,7 +474,18 @@ def main(args=None):
         src_is_url.append(is_url)
         src_funcs.append(funcs)
         
-    if path.exists(args.output) and args.output != "/dev/null" and not args.force:
+    if args.dry_run:
+        for is_url, source in zip(src_is_url, sources):
+            if not is_url:
+                continue
+            if not DEFAULT_EXTRACTOR.supports(source, "dry_run"):
+                log.error(f"Source '{source}' doesn't support --dry-run")
+                continue
+            extract(source, dry_run=True, **_extract_options(log, args, source))
+        return
+        
+    if path.exists(args.output) and args.output != "/dev/null" and not args.force \
+            and not args.update and not args.incremental:
         answer = input(f"The file '{args.output}' exists. "
                 "Do you want to override it? (y/n) ")
         answer = answer.lower()
@@ -159,34 +495,82 @@ def main(args=None):
     fmts: T.List[str] = []
     all_selected = False
     if args.format == "ALL":
-        fmts += ["JSON", "SQL"]
+        fmts += ["JSON", "SQL", "SQLITE", "CSV", "TSV", "COLUMNAR", "SHARDED"]
         all_selected = True
     elif args.format != "NONE":
         fmts.append(args.format)
     else:
         _, file_ext = path.splitext(args.output)
-        if file_ext == ".json":
-            fmts.append("JSON")
+        if shards.is_sharded(args.output):
+            fmts.append("SHARDED")
         else:
-            fmts.append("SQL")
+            fmts.append(_FORMAT_EXTENSIONS.get(file_ext.lower(), "SQL"))
+    
+    if args.stream:
+        if len(sources) != 1 or not src_is_url[0] or len(fmts) != 1:
+            log.error("--stream takes one source (a URL) and one output format")
+            sys.exit(1)
+        if args.update or args.incremental:
+            log.error("--update and --incremental can't be used with --stream")
+            sys.exit(1)
+        _stream(log, args, sources[0], src_funcs[0], fmts[0])
+        return
+    if args.incremental:
+        if len(sources) != 1 or not src_is_url[0] or len(fmts) != 1:
+            log.error("--incremental takes one source (a URL) and one output format")
+            sys.exit(1)
+        _incremental(log, args, sources[0], src_funcs[0], fmts[0])
+        return
         
+    checks: T.List[BibleFunc] = []
+    if args.update:
+        # the checks run on the updated Bible: a partial Bible would get
+        # book level warnings (e.g. missing chapters) that aren't true
+        for i, funcs in enumerate(src_funcs):
+            src_funcs[i], src_checks = _split_checks(funcs)
+            checks += [ f for f in src_checks if f not in checks ]
+    
     result = None
+    bibles = []
     stats = []
-    for is_url, source, funcs in zip(src_is_url, sources, src_funcs):
-        if is_url:
-            bible = extract(source)
-        else:
-            with open(source, "r") as json_file:
-                bible = Bible.from_dict(json.load(json_file))
-        bible = _apply_funcs(log, funcs, bible)
-        stats.append(get_bible_stats(bible).to_dict())
-        if result is not None:
-            result = merge(result, bible)
-        else:
-            result = bible
+    profile: T.Dict[str, T.Any] = { "sources": [] }
+    start_time = time.monotonic()
+    jobs = args.jobs if args.jobs is not None else min(len(sources), 8)
+    with ThreadPoolExecutor(max(jobs, 1)) as executor:
+        futures = [ executor.submit(_load_source, log, args, is_url, source, funcs)
+                for is_url, source, funcs in zip(src_is_url, sources, src_funcs) ]
+        # merge in priority order: a source only waits for the ones before it
+        for source, future in zip(sources, futures):
+            try:
+                bible, bible_stats, timing = future.result()
+            except Exception as e:
+                log.error(f"Unable to load '{source}': {e}")
+                # the executor waits for its futures: only the running ones are left
+                for pending in futures:
+                    pending.cancel()
+                raise
+            timing["ready"] = time.monotonic() - start_time
+            merge_start = time.monotonic()
+            stats.append(bible_stats)
+            bibles.append(bible)
+            if result is None:
+                # keep the first bible as it is for --versions and --text-stats
+                result = bible.copy() if (args.versions or args.text_stats) \
+                        and len(sources) > 1 else bible
+            else:
+                result = merge_into(result, bible)
+            timing["merge"] = time.monotonic() - merge_start
+            profile["sources"].append(dict(source=source, **timing))
+            log.info(f"'{source}': " + ", ".join(f"{key} {value:.2f}s"
+                for key, value in timing.items() if key != "time"))
     if len(sources) > 1:
         stats.append(get_bible_stats(result).to_dict())
+    if args.text_stats:
+        _add_text_stats(stats, bibles + [ result ])
         
+    # result with the checks of --update (for the outputs that aren't updated)
+    checked = None if checks else result
+    
     #?with open("test.pkl", "rb") as test_file:
         #?result = pickle.load(test_file)
     #?print(result.check())
@@ -196,9 +580,37 @@ def main(args=None):
             out_file = f"{args.output}.{fmt.lower()}"
         else:
             out_file = args.output
+        updating = args.update and (path.isfile(out_file) if fmt == "JSON"
+                else fmt == "SHARDED" and shards.is_sharded(out_file))
+        if checked is None and not updating:
+            # result is kept as it is for the outputs that are updated
+            checked = _apply_funcs(log, checks, result.copy())
+            if args.versions:
+                bibles = [ _apply_funcs(log, checks, bible.copy()) for bible in bibles ]
         if fmt == "JSON":
+            out_bible = checked
+            if updating:
+                with open(out_file, "r") as json_file:
+                    out_bible = _update(log, Bible.from_dict(json.load(json_file)),
+                            result, checks)
             with open(out_file, "w") as json_file:
-                json.dump(result.to_dict(), json_file, indent=2)
+                json.dump(out_bible.to_dict(), json_file, indent=2)
+        elif fmt in ("CSV", "TSV"):
+            export.write_delimited(bibles if args.versions else [checked], out_file,
+                    "," if fmt == "CSV" else "\t")
+        elif fmt == "COLUMNAR":
+            export.write_columnar(bibles if args.versions else [checked], out_file)
+        elif fmt == "SQLITE":
+            for i, bible in enumerate(bibles if args.versions else [checked]):
+                sinks.feed(bible, sinks.SQLiteSink(out_file, replace=i == 0))
+        elif fmt == "SHARDED":
+            if updating:
+                # only the books of result are loaded and rewritten
+                out_books = [ str(b) for test in result.testaments for b in test ]
+                shards.write_sharded(_update(log, shards.read_sharded(out_file, out_books),
+                        result, checks), out_file, partial=True)
+            else:
+                shards.write_sharded(checked, out_file, partial=args.books is not None)
         else:
             with open(out_file, "w") as sql_file:
                 sql_text = "NOT IMPLEMENTED"
@@ -212,3 +624,11 @@ def main(args=None):
     if args.stats is not None:
         with open(args.stats, "w") as stats_file:
             json.dump(stats, stats_file, indent=4)
+    
+    if fetch.DEFAULT_SCHEDULER.hosts:
+        log.info(f"Requests: {fetch.DEFAULT_SCHEDULER.summary()}")
+    if args.profile is not None:
+        profile["scheduler"] = fetch.DEFAULT_SCHEDULER.metrics()
+        profile["text_pool"] = TEXT_POOL.stats()
+        with open(args.profile, "w") as profile_file:
+            json.dump(profile, profile_file, indent=4)
@@ -0,0 +1,69 @@
+"""
+Provides the client of the daemon (see daemon.py).
+
+If BIBLE_EXTRACTOR_DAEMON is set (to 1 for the default socket, or to the
+path of a socket), python -m bible_extractor sends its arguments to the
+daemon and prints what it answers instead of running the command itself.
+If the daemon isn't running, the command is run locally.
+
+This module only uses the standard library so that the client starts fast.
+"""
+from os import path
+import json
+import os
+import socket
+import sys
+import tempfile
+import typing as T
+
+ENV_VAR = "BIBLE_EXTRACTOR_DAEMON"
+# commands that always run locally
+LOCAL_COMMANDS = ("daemon", "serve")
+# commands that read stdin (it's sent with the command)
+STDIN_COMMANDS = ("lookup", )
+
+def default_socket() -> str:
+    return path.join(tempfile.gettempdir(), f"bible_extractor-{os.getuid()}.sock")
+
+def socket_path() -> T.Optional[str]:
+    """The socket of the daemon (from the environment) or None."""
+    value = os.environ.get(ENV_VAR, "").strip()
+    if value in ("", "0"):
+        return None
+    return default_socket() if value == "1" else value
+
+def run_client(argv: T.List[str], sock_path: T.Optional[str] = None) -> T.Optional[int]:
+    """
+    Run argv in the daemon and return its exit code (None if there's no
+    daemon to run it).
+    """
+    if sock_path is None:
+        sock_path = socket_path()
+    if sock_path is None or (argv and argv[0].lower() in LOCAL_COMMANDS):
+        return None
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(sock_path)
+    except OSError:
+        conn.close()
+        return None
+
+    with conn:
+        request = { "argv": argv, "cwd": os.getcwd() }
+        if argv and argv[0].lower() in STDIN_COMMANDS:
+            request["stdin"] = sys.stdin.read()
+        conn.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        # the answer is one JSON object per line: {"out": text}, {"err": text}
+        # and finally {"exit": code}
+        with conn.makefile("r", encoding="utf-8") as answer:
+            for line in answer:
+                msg = json.loads(line)
+                if "out" in msg:
+                    sys.stdout.write(msg["out"])
+                elif "err" in msg:
+                    sys.stderr.write(msg["err"])
+                elif "exit" in msg:
+                    sys.stdout.flush()
+                    return msg["exit"]
+    print("The daemon closed the connection", file=sys.stderr)
+    return 1
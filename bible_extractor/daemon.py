@@ -0,0 +1,186 @@
+"""
+Provides a daemon that runs CLI commands in a warm process.
+
+    python -m bible_extractor daemon [--socket PATH]
+
+listens on a Unix socket and runs the commands of the client (see
+client.py) one at a time, in the client's working directory. The modules
+stay imported, and Bibles loaded from JSON files are kept (BibleCache) and
+reused until their file changes.
+"""
+from collections import OrderedDict
+from contextlib import redirect_stdout, redirect_stderr
+from os import path
+import hashlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+import typing as T
+
+from .bible import Bible, TEXT_POOL
+from . import client
+
+import logging
+log = logging.getLogger(__name__)
+
+class _CacheEntry(T.NamedTuple):
+    mtime: int
+    size: int
+    sha256: str
+    bible: Bible
+
+class BibleCache:
+    """
+    Bibles loaded from JSON files (the size most recently used ones). A file
+    is reloaded when its mtime or size changed and its SHA-256 did too.
+    load() returns a copy, so callers can change it. Compressed and
+    uncompressed loads of a file are cached separately.
+    """
+
+    def __init__(self, size: int = 8) -> None:
+        self.size = size
+        self.hits = 0
+        self.loads = 0
+        self._entries: T.Dict[T.Tuple[str, bool], _CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, file_path: str, compressed: bool = False) -> Bible:
+        file_path = path.abspath(file_path)
+        key = (file_path, compressed)
+        stat = os.stat(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry.mtime, entry.size) == (stat.st_mtime_ns, stat.st_size):
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry.bible.copy()
+
+        with open(file_path, "rb") as json_file:
+            data = json_file.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if entry is not None and entry.sha256 == digest:
+            # touched but not changed
+            bible = entry.bible
+            self.hits += 1
+        else:
+            bible = Bible.from_dict(json.loads(data.decode("utf-8")), compressed)
+            self.loads += 1
+        with self._lock:
+            self._entries[key] = _CacheEntry(stat.st_mtime_ns, stat.st_size, digest, bible)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return bible.copy()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class _Stream(io.TextIOBase):
+    """Sends what's written to it to the client (as {key: text} lines)."""
+
+    def __init__(self, conn: socket.socket, key: str) -> None:
+        self.conn = conn
+        self.key = key
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if text:
+            self.conn.sendall(json.dumps({ self.key: text }).encode("utf-8") + b"\n")
+        return len(text)
+
+class Daemon:
+
+    def __init__(self, socket_path: str, cache_size: int = 8) -> None:
+        self.socket_path = socket_path
+        self.cache = BibleCache(cache_size)
+
+    def run_command(self, argv: T.List[str], cwd: str, out: T.TextIO, err: T.TextIO,
+            stdin: str = "") -> int:
+        """Run a CLI command (like python -m bible_extractor argv) and return its exit code."""
+        from . import cli
+        root = logging.getLogger()
+        handlers = root.handlers[:]
+        handler = logging.StreamHandler(err)
+        handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        root.handlers = [ handler ]
+        old_cwd = os.getcwd()
+        old_stdin = sys.stdin
+        # nobody can answer prompts (use --force)
+        sys.stdin = io.StringIO(stdin)
+        cli.BIBLE_CACHE = self.cache
+        try:
+            os.chdir(cwd)
+            # the texts of the command aren't pooled after it: the pool
+            # would keep them after BibleCache lets their Bible go
+            with redirect_stdout(out), redirect_stderr(err), TEXT_POOL.scope():
+                cli.main(cli.ARG_PARSER.parse_args(argv))
+            return 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                return e.code or 0
+            err.write(f"{e.code}\n")
+            return 1
+        except Exception:
+            err.write(traceback.format_exc())
+            return 1
+        finally:
+            cli.BIBLE_CACHE = None
+            sys.stdin = old_stdin
+            root.handlers = handlers
+            os.chdir(old_cwd)
+
+    def handle(self, conn: socket.socket):
+        with conn.makefile("r", encoding="utf-8") as request_file:
+            request = json.loads(request_file.readline())
+        start_time = time.monotonic()
+        code = self.run_command(request["argv"], request["cwd"],
+                _Stream(conn, "out"), _Stream(conn, "err"), request.get("stdin", ""))
+        conn.sendall(json.dumps({ "exit": code }).encode("utf-8") + b"\n")
+        log.info(f"{' '.join(request['argv'])}: exit {code} in "
+                f"{time.monotonic() - start_time:.2f}s (cache: {len(self.cache)} bibles, "
+                f"{self.cache.hits} hits, {self.cache.loads} loads)")
+
+    def serve_forever(self):
+        if path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                # left over from a daemon that didn't exit cleanly
+                os.remove(self.socket_path)
+            else:
+                raise OSError(f"A daemon is already listening on '{self.socket_path}'")
+            finally:
+                probe.close()
+
+        daemon = self
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                try:
+                    daemon.handle(self.request)
+                except (OSError, ValueError) as e:
+                    log.warning(f"Dropped a client: {e}")
+
+        # remove the socket when killed too
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        with socketserver.UnixStreamServer(self.socket_path, Handler) as server:
+            log.info(f"Listening on '{self.socket_path}' "
+                    f"(set {client.ENV_VAR}={self.socket_path} to use it)")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.remove(self.socket_path)
+
+def run(socket_path: T.Optional[str] = None, cache_size: int = 8):
+    Daemon(socket_path or client.default_socket(), cache_size).serve_forever()
@@ -0,0 +1,211 @@
+"""
+Provides flat exports of Bibles for bulk loading (e.g. into a warehouse).
+
+Every verse is a row of (version, book, testament, chapter, verse, text)
+where version and book are indexes into the version and book tables of the
+file. Several Bibles (versions) can be exported to one file.
+
+Formats:
+    CSV/TSV     a header and one line per verse (with the book name)
+    COLUMNAR    a typed binary file with one array per column:
+                    b"BIBLECOL", uint32 header length, JSON header (padded
+                    with spaces to a multiple of 8 bytes from the start of
+                    the file), the columns (each 8 byte aligned in the file)
+                The header has the version and book tables, the number of
+                rows and the type (e.g. "<u4", a little endian unsigned 32
+                bit integer), offset and length (in bytes, from the end of
+                the header) of every column. The texts are one UTF-8 blob
+                and text_offset has rows + 1 entries (verse i is
+                blob[text_offset[i]:text_offset[i+1]]).
+"""
+from array import array
+import csv
+import json
+import shutil
+import struct
+import sys
+import tempfile
+import typing as T
+
+from .bible import Bible, Testament
+
+MAGIC = b"BIBLECOL"
+FORMAT_VERSION = 1
+
+# column name -> type (byte order, u for unsigned and the width in bytes)
+COLUMNS: T.List[T.Tuple[str, str]] = [
+        ("version", "<u2"),
+        ("book", "<u2"),
+        ("testament", "|u1"),
+        ("chapter", "<u2"),
+        ("verse", "<u2"),
+        ("text_offset", "<u4"),
+        ]
+
+def _array_code(type: str) -> str:
+    """
+    The array type code of a column type (the item sizes of array depend on
+    the platform).
+    
+    >>> array(_array_code("<u4")).itemsize
+    4
+    """
+    width = int(type[2:])
+    if type[1] == "u":
+        for code in "BHILQ":
+            if array(code).itemsize == width:
+                return code
+    raise ValueError(f"Unsupported column type '{type}'")
+
+class BookBatch(T.NamedTuple):
+    version: int
+    book: str
+    testament: Testament
+    chapters: array
+    verses: array
+    texts: T.List[str]
+
+def iter_batches(bibles: T.Sequence[Bible]) -> T.Iterator[BookBatch]:
+    """Stream the verses of bibles one book at a time as parallel arrays."""
+    for version, bible in enumerate(bibles):
+        for test in (Testament.old, Testament.new):
+            for book in bible.testaments[test.value]:
+                chapters = array("H")
+                verses = array("H")
+                texts: T.List[str] = []
+                for chap_num, chap in bible.verses[book].items():
+                    chapters.extend([chap_num] * len(chap))
+                    verses.extend(chap.keys())
+                    texts.extend(chap.values())
+                yield BookBatch(version, str(book), test, chapters, verses, texts)
+
+def write_delimited(bibles: T.Sequence[Bible], file_path: str, delimiter: str = ","):
+    """Write bibles as CSV (or TSV with delimiter="\\t")."""
+    book_ids: T.Dict[str, int] = {}
+    with open(file_path, "w", newline="", encoding="utf-8") as out_file:
+        writer = csv.writer(out_file, delimiter=delimiter)
+        writer.writerow(("version", "version_name", "book_id", "book", "testament",
+            "chapter", "verse", "text"))
+        for batch in iter_batches(bibles):
+            book_id = book_ids.setdefault(batch.book.lower(), len(book_ids))
+            name = bibles[batch.version].name
+            writer.writerows(
+                    (batch.version, name, book_id, batch.book, batch.testament.value,
+                        chap_num, verse_num, text)
+                    for chap_num, verse_num, text in zip(batch.chapters, batch.verses,
+                        batch.texts))
+
+class ColumnarWriter:
+    """
+    Writes the COLUMNAR format one book at a time. The texts are spooled to a
+    temporary file, so only the (small) numeric columns are kept in memory.
+    """
+    
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        self.versions: T.List[str] = []
+        self.books: T.List[str] = []
+        self._book_ids: T.Dict[str, int] = {}
+        self.columns = { name: array(_array_code(type)) for name, type in COLUMNS }
+        self.columns["text_offset"].append(0)
+        self._text = tempfile.TemporaryFile()
+        self._text_len = 0
+    
+    def version(self, name: str) -> int:
+        """Add a version and return its index."""
+        self.versions.append(name)
+        return len(self.versions) - 1
+    
+    def add(self, batch: BookBatch):
+        book_id = self._book_ids.get(batch.book.lower())
+        if book_id is None:
+            book_id = self._book_ids[batch.book.lower()] = len(self.books)
+            self.books.append(batch.book)
+        columns = self.columns
+        num_rows = len(batch.texts)
+        columns["version"].extend([batch.version] * num_rows)
+        columns["book"].extend([book_id] * num_rows)
+        columns["testament"].extend([batch.testament.value] * num_rows)
+        columns["chapter"].extend(batch.chapters)
+        columns["verse"].extend(batch.verses)
+        for text in batch.texts:
+            data = text.encode("utf-8")
+            self._text.write(data)
+            self._text_len += len(data)
+            columns["text_offset"].append(self._text_len)
+    
+    def close(self):
+        header: T.Dict[str, T.Any] = {
+                "format_version": FORMAT_VERSION,
+                "versions": self.versions,
+                "books": self.books,
+                "rows": len(self.columns["version"]),
+                "columns": [],
+                }
+        offset = 0
+        for name, type in COLUMNS + [("text", "|u1")]:
+            length = self._text_len if name == "text" \
+                    else len(self.columns[name]) * self.columns[name].itemsize
+            header["columns"].append({ "name": name, "type": type,
+                "offset": offset, "length": length })
+            offset += _align(length)
+
+        header_bytes = json.dumps(header).encode("utf-8")
+        # JSON allows trailing spaces
+        start = len(MAGIC) + 4
+        header_bytes += b" " * (_align(start + len(header_bytes)) - start - len(header_bytes))
+        with open(self.file_path, "wb") as out_file:
+            out_file.write(MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+            for name, _ in COLUMNS:
+                col = self.columns[name]
+                if sys.byteorder == "big":
+                    col.byteswap()
+                out_file.write(col.tobytes())
+                out_file.write(b"\0" * (_align(len(col) * col.itemsize) - len(col) * col.itemsize))
+            self._text.seek(0)
+            shutil.copyfileobj(self._text, out_file)
+        self._text.close()
+
+def write_columnar(bibles: T.Sequence[Bible], file_path: str):
+    """Write bibles in the COLUMNAR format."""
+    writer = ColumnarWriter(file_path)
+    for bible in bibles:
+        writer.version(bible.name)
+    for batch in iter_batches(bibles):
+        writer.add(batch)
+    writer.close()
+
+class Columns(T.NamedTuple):
+    versions: T.List[str]
+    books: T.List[str]
+    columns: T.Dict[str, array]
+    text: bytes
+
+    def verse_text(self, row: int) -> str:
+        offsets = self.columns["text_offset"]
+        return self.text[offsets[row]:offsets[row + 1]].decode("utf-8")
+
+def read_columnar(file_path: str) -> Columns:
+    """Read a file written by write_columnar."""
+    with open(file_path, "rb") as in_file:
+        data = in_file.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"'{file_path}' isn't a columnar Bible file")
+    header_len, = struct.unpack_from("<I", data, len(MAGIC))
+    start = len(MAGIC) + 4
+    header = json.loads(data[start:start + header_len].decode("utf-8"))
+    start += header_len
+    columns: T.Dict[str, array] = {}
+    text = b""
+    for col in header["columns"]:
+        raw = data[start + col["offset"]:start + col["offset"] + col["length"]]
+        if col["name"] == "text":
+            text = raw
+            continue
+        columns[col["name"]] = array(_array_code(col["type"]), raw)
+        if sys.byteorder == "big":
+            columns[col["name"]].byteswap()
+    return Columns(header["versions"], header["books"], columns, text)
+
+def _align(length: int) -> int:
+    return (length + 7) // 8 * 8
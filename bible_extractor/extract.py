@@ -2,7 +2,9 @@
 Provides functions to extract the data from websites.
 """
 from typing import NewType, Callable, no_type_check
+import typing as T
 from collections import OrderedDict
+import inspect
 from urllib.parse import urljoin
 import re
 
@@ -13,9 +15,14 @@ import requests as http
 from bs4 import BeautifulSoup
 
 from .bible import *
+from . import fetch
+from . import books
 
 Url = NewType("Url", str)
-ExtractorFunc = Callable[[Url], None]
+# called as func(url, **options). Options (e.g. dry_run, selection to only
+# extract some books and chapters, or sink to emit into a sink of sinks.py
+# instead of returning a Bible) are keyword arguments
+ExtractorFunc = Callable[..., Bible]
 
 class Extractor:
     """
@@ -41,21 +48,80 @@ class Extractor:
             return func
         return _extractor
 
-    def extract(self, url: Url) -> Bible:
+    def supports(self, url: Url, option: str) -> bool:
+        """
+        Returns `True` if the extractor for url accepts option.
+        """
+        params = inspect.signature(self.extractors[url]).parameters
+        return option in params or any(p.kind == p.VAR_KEYWORD
+                for p in params.values())
+
+    def extract(self, url: Url, **options) -> Bible:
         """
         Extract from a url.
         """
         if url not in self.extractors:
             raise KeyError(f"Unknown URL {url}")
         
-        return self.extractors[url](url)
-        
+        return self.extractors[url](url, **options)
+
+
+class Selection:
+    """
+    The books and chapters to extract (the selection option of extractors).
+    Book names are resolved with registry and None selects everything.
+    
+    >>> sel = Selection(["Daniel", "psalms"], Selection.parse_chapters("3-14"))
+    >>> sel.has_book("DANIEL"), sel.has_chapter(2)
+    (True, False)
+    """
+    
+    def __init__(self, books: T.Optional[T.Iterable[str]] = None,
+            chapters: T.Optional[T.Iterable[int]] = None,
+            registry: books.BookRegistry = books.DEFAULT) -> None:
+        self.registry = registry
+        self.books = None if books is None else { self._key(b) for b in books }
+        self.chapters = None if chapters is None else set(chapters)
+    
+    def _key(self, name: str) -> str:
+        if name in self.registry:
+            name = self.registry.resolve(name)
+        return " ".join(name.lower().split())
+    
+    def has_book(self, name: str) -> bool:
+        return self.books is None or self._key(name) in self.books
+    
+    def has_chapter(self, chapter: int) -> bool:
+        return self.chapters is None or chapter in self.chapters
+    
+    @staticmethod
+    def parse_chapters(chapters: str) -> T.Set[int]:
+        """Parse chapter numbers and ranges: "1,3-5" -> {1, 3, 4, 5}."""
+        res: T.Set[int] = set()
+        for part in chapters.split(","):
+            part = part.strip()
+            if part == "":
+                continue
+            first, _, last = part.partition("-")
+            res.update(range(int(first), int(last if last else first) + 1))
+        return res
+
+ALL = Selection()
+
+
+
+def parse_html(resp: http.Response) -> BeautifulSoup:
+    """
+    Parse a downloaded page. The raw bytes are given to the parser with the
+    page's encoding (see fetch.encoding) so they're only decoded once.
+    """
+    return BeautifulSoup(resp.content, "html5lib", from_encoding=fetch.encoding(resp))
 
 
 DEFAULT_EXTRACTOR: Extractor = Extractor()
 
-def extract(url: Url, extractor=DEFAULT_EXTRACTOR) -> Bible:
-    return DEFAULT_EXTRACTOR.extract(url)
+def extract(url: Url, extractor=DEFAULT_EXTRACTOR, **options) -> Bible:
+    return extractor.extract(url, **options)
 
 def extractor(*args, **kwargs):
     return DEFAULT_EXTRACTOR.extractor(*args, **kwargs)
@@ -2,19 +2,23 @@ import logging
 import re
 from urllib.parse import urljoin
 from collections import OrderedDict
+import typing as T
 
-import requests as http
-from bs4 import BeautifulSoup
-
-from ..extract import extractor, Url
-from ..bible import Bible, Verse, Testament
+from ..extract import extractor, Url, parse_html, Selection, ALL
+from .. import fetch
+from ..bible import Bible, BibleBuilder, Verse, Testament
 from ..progress import ProgressIndicator
-from ..util import fix_book_name
+from ..cache import JsonCache
+from .. import books
 from .. import warnings as warn
+from .. import normalize
+
+NAME = "King James 2000"
+BOOKS = books.DEFAULT
+NORMALIZER = normalize.register(NAME, normalize.Normalizer())
 
 # unfortunately, for this source, book names must be hard coded
 NEW_TEST_NAMES = set() # placeholder
-ABREVS = {} # placeholder
 
 class URLS:
     books = "http://biblehub.com/menus/versemenus/genesisbookmenu.htm"
@@ -28,70 +32,142 @@ class URLS:
     
 
 @extractor("http://biblehub.com/kj2000/")
-def biblehub(url: Url) -> Bible:
-    log = ProgressIndicator(logging.getLogger(__name__))
-    bible = Bible(name="King James 2000")
+def biblehub(url: Url, sink=None, selection: Selection = ALL,
+        digests: T.Optional[fetch.PageDigests] = None) -> Bible:
+    """
+    If digests is given (see fetch.PageDigests), only the chapters whose
+    page changed since the previous run are extracted.
+    """
+    log = ProgressIndicator(logging.getLogger(__name__), fetch.DEFAULT_SCHEDULER)
+    builder = BibleBuilder() if sink is None else sink
+    builder.start(NAME)
     
     # get the book names
-    book_names_page = BeautifulSoup(http.get(URLS.books).text, "html5lib")
-    book_names = [ ABBREVS.get(opt.text, opt.text) 
-            for opt in book_names_page.find_all("option") ]
+    book_names_page = parse_html(fetch.get(URLS.books))
+    book_names = [ _expand(opt.text) for opt in book_names_page.find_all("option") ]
     del book_names_page
+    # the canonical names (resolved once per book)
+    canonical_names = [ BOOKS.resolve(name) for name in book_names ]
+    selected = [ i for i, name in enumerate(canonical_names) if selection.has_book(name) ]
+    book_names = [ book_names[i] for i in selected ]
+    canonical_names = [ canonical_names[i] for i in selected ]
     
-    # find the chapters
-    chapters = { Testament.old : {}, Testament.new : {} }
-    total_num_chapters = 0
-    for book_name in book_names:
-        # get the chapters
-        chap_list_page = BeautifulSoup(http.get(URLS.chapters(book_name)).text,
-                "html5lib")
-        num_chapters = len(chap_list_page.select("select[name=select2] > option"))
-        if num_chapters <= 0:
-            bible.warn(Verse.Loc(fix_book_name(book_name), -1, -1, -1),
-                    f"Number of chapters is {num_chapters}")
-            
-        test = Testament.new if book_name in NEW_TEST_NAMES else Testament.old
-        chapters[test][book_name] = num_chapters
-        total_num_chapters += num_chapters
+    # Discovery (counting the chapters of each book) and download are
+    # pipelined: the chapters of a book are queued as soon as its chapter
+    # menu is parsed. Chapter counts never change so they're cached.
+    chapter_counts = JsonCache("biblehub-kj2000-chapters")
+    queue = fetch.FetchQueue()
+    # the (selected) chapter numbers of every book
+    chapter_nums: T.Dict[int, T.List[int]] = {}
     
-    log.num_chapters = total_num_chapters
+    def queue_chapters(book_idx: int, count: int):
+        chapter_nums[book_idx] = [ c for c in range(1, count+1) if selection.has_chapter(c) ]
+        book_name = book_names[book_idx]
+        for chap_num in chapter_nums[book_idx]:
+            chap_url = urljoin(url, 
+                    book_name.lower().replace(" ", "_") 
+                    + "/" + str(chap_num) + ".htm")
+            queue.put(chap_url, (book_idx, chap_num), _parse_chapter, digests)
+        if len(chapter_nums) == len(book_names):
+            log.num_chapters = sum(len(nums) for nums in chapter_nums.values())
+    
+    for book_idx, book_name in enumerate(book_names):
+        if book_name in chapter_counts:
+            queue_chapters(book_idx, chapter_counts[book_name])
+        else:
+            queue.put(URLS.chapters(book_name), (book_idx, None), _count_chapters)
+    
+    # chapters are parsed out of order. Keep them until they can be added
+    # to the bible in order
+    parsed: T.Dict[T.Tuple[int, int], T.Any] = {}
+    next_book_idx, next_chap_idx = 0, 0
     total_chap_idx = -1
+    for (book_idx, chap_num), result in queue:
+        book_name = book_names[book_idx]
+        if chap_num is None:
+            # a chapter menu
+            if result <= 0:
+                builder.warn(Verse.Loc(canonical_names[book_idx], -1, -1, -1),
+                        f"Number of chapters is {result}")
+            else:
+                chapter_counts[book_name] = result
+            queue_chapters(book_idx, result)
+        else:
+            parsed[(book_idx, chap_num)] = result
+        
+        # add all the chapters that are ready
+        while next_book_idx < len(book_names):
+            if next_book_idx not in chapter_nums:
+                break
+            if next_chap_idx >= len(chapter_nums[next_book_idx]):
+                next_book_idx, next_chap_idx = next_book_idx + 1, 0
+                continue
+            next_chap_num = chapter_nums[next_book_idx][next_chap_idx]
+            try:
+                chapter = parsed.pop((next_book_idx, next_chap_num))
+            except KeyError:
+                break
+            total_chap_idx += 1
+            next_chap_idx += 1
+            if chapter is None:
+                # didn't change since the previous run
+                continue
+            verses, warnings = chapter
+            book_name = book_names[next_book_idx]
+            canonical_name = canonical_names[next_book_idx]
+            log.finishing(total_chap_idx, f"Processing chapter {next_chap_num} in {book_name}")
+            test = Testament.new if book_name in NEW_TEST_NAMES else Testament.old
+            for text, type in warnings:
+                builder.warn(Verse.Loc(canonical_name, next_chap_num, -1, test),
+                        text, type)
+            builder.book(canonical_name, test)
+            builder.chapter(next_chap_num, verses)
     
-    for test in (Testament.old, Testament.new):
-        for book_name, num_chapters in chapters[test].items():
-            # download the chapter
-            for chap_num in range(1, num_chapters+1):
-                total_chap_idx += 1
-                log.starting(total_chap_idx, f"Processing chapter {chap_num} in {book_name}")
-                chap_url = urljoin(url, 
-                        book_name.lower().replace(" ", "_") 
-                        + "/" + str(chap_num) + ".htm")
-                chap_page = BeautifulSoup(http.get(chap_url).text, "html5lib")
-                for verse in chap_page.select("div.chap > p.regular"):
-                    try:
-                        verse_num_str = verse.find("span", class_="reftext").text
-                    except AttributeError:
-                        bible.warn(Verse.Loc(fix_book_name(book_name), chap_num, -1, test),
-                                f"Unable to find verse number", 
-                                warn.cannot_find_verse_num)
-                        continue
-                        
-                    try:
-                        verse_num = int(verse_num_str)
-                    except ValueError:
-                        bible.warn(Verse.Loc(fix_book_name(book_name), chap_num, -1, test),
-                                f"Unable to parse verse number '{verse_num_str}'",
-                                warn.unknown_verse_num)
-                        continue
-                    
-                    verse_spans = verse.find_all(lambda e:
-                            e.name == "span" 
-                            and "reftext" not in e.attrs.get("class", []))
-                    verse_text = "\n".join(e.text for e in verse_spans)
-                    
-                    bible += Verse(Verse.Loc(fix_book_name(book_name), chap_num, verse_num, test),
-                            verse_text)
-    return bible
+    chapter_counts.save()
+    return builder.finish()
+
+def _expand(name: str) -> str:
+    """
+    Expand the abbreviations of the book menu (books.NUMBERED_ALIASES), the
+    names are used in the URLs.
+    
+    >>> _expand("1 Thessalon.")
+    '1 Thessalonians'
+    """
+    return " ".join(books.NUMBERED_ALIASES.get(word.lower(), word) for word in name.split())
+
+def _count_chapters(resp) -> int:
+    chap_list_page = parse_html(resp)
+    return len(chap_list_page.select("select[name=select2] > option"))
+
+def _parse_chapter(resp) -> T.Tuple[T.List[T.Tuple[int, str]], T.List[T.Tuple[str, str]]]:
+    """
+    Parse a chapter page. Returns the verses as (verse number, text) and the
+    warnings as (text, type).
+    """
+    chap_page = parse_html(resp)
+    verses = []
+    warnings = []
+    for verse in chap_page.select("div.chap > p.regular"):
+        try:
+            verse_num_str = verse.find("span", class_="reftext").text
+        except AttributeError:
+            warnings.append((f"Unable to find verse number", 
+                    warn.cannot_find_verse_num))
+            continue
+            
+        try:
+            verse_num = int(verse_num_str)
+        except ValueError:
+            warnings.append((f"Unable to parse verse number '{verse_num_str}'",
+                    warn.unknown_verse_num))
+            continue
+        
+        verse_spans = verse.find_all(lambda e:
+                e.name == "span" 
+                and "reftext" not in e.attrs.get("class", []))
+        verses.append((verse_num, NORMALIZER(" ".join(e.text for e in verse_spans))))
+    return verses, warnings
     
     
     
@@ -126,8 +202,3 @@ James
 3 John
 Jude
 Revelation""".split("\n"))
-
-ABBREVS = {
-        "1 Thessalon.": "1 Thessalonians",
-        "2 Thessalon.": "2 Thessalonians",
-        }
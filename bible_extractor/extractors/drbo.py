@@ -2,85 +2,133 @@ import logging
 import re
 from urllib.parse import urljoin
 from collections import OrderedDict
+import typing as T
 
-import requests as http
-from bs4 import BeautifulSoup
-
-from ..extract import extractor, Url
-from ..bible import Bible, Verse, Testament
+from ..extract import extractor, Url, parse_html, Selection, ALL
+from .. import fetch
+from ..bible import Bible, BibleBuilder, Verse, Testament
 from ..progress import ProgressIndicator
 from .. import warnings as warn
-from ..util import fix_book_name
+from .. import books
+from .. import normalize
+
+NAME = "Douay-Rheims Bible"
+BOOKS = books.VULGATE
+NORMALIZER = normalize.register(NAME, normalize.Normalizer())
 
 _VERSE_REGEX = re.compile("\s*\[\s*(\d+)\s*\]\s*")
 
 
+# 1 Kings -> 1 Samuel but 3 Kings -> 1 Kings, so the names of these books
+# can't be fixed from the links' text. Override them by (canonical) URL instead.
+_NAME_OVERRIDES = {
+    "http://www.drbo.org/chapter/09001.htm": "Samuel I",
+    "http://www.drbo.org/chapter/10001.htm": "Samuel II",
+    "http://www.drbo.org/chapter/11001.htm": "Kings I",
+    "http://www.drbo.org/chapter/12001.htm": "Kings II",
+}
+
 @extractor("http://www.drbo.org/")
-def drbo(url: Url) -> Bible:
-    log = ProgressIndicator(logging.getLogger(__name__))
-    bible = Bible(name="Douay-Rheims Bible")
+def drbo(url: Url, dry_run: bool = False, sink=None,
+        selection: Selection = ALL,
+        digests: T.Optional[fetch.PageDigests] = None) -> Bible:
+    """
+    If dry_run is True, only the main page and the first chapter of every
+    book are downloaded and the rest of the pages are reported.
+    The Bible is emitted into sink (see sinks.py), a BibleBuilder by default.
+    Only the books and chapters in selection are extracted (the first page
+    of a book is always downloaded because it has the chapter links).
+    If digests is given (see fetch.PageDigests), only the chapters whose
+    page changed since the previous run are extracted.
+    """
+    log = ProgressIndicator(logging.getLogger(__name__), fetch.DEFAULT_SCHEDULER)
+    builder = BibleBuilder() if sink is None else sink
+    builder.start(NAME)
+    run = fetch.FetchRun(dry_run=dry_run)
     
     # get the names and links of the old and new testaments
     ot_links: T.Dict[str, str] = {}
     nt_links: T.Dict[str, str] = {}
     
-    main_page = BeautifulSoup(http.get(url).text, "html5lib")
+    main_page = parse_html(run.get(url))
     ot_a_elems = main_page.select("td.OT1 a.b, td.OT2 a.b")
     nt_a_elems = main_page.select("td.NT a.b")
-    # note: fix_book_name is applied to OT because the website
-    # lists both Greek and normal names so we want to make sure duplicates
-    # are removed by converting Greek to normal
-    ot_links = OrderedDict(
-            ( fix_book_name(next(s for s in elem.contents if isinstance(s, str)))
-            , elem["href"])
-            for elem in ot_a_elems )
-    # note. 1 Kings -> 1 Samuel but 3 Kings -> 1 Kings.
-    # easiest way to fix this is manual override
-    ot_links["Samuel I"] = "chapter/09001.htm"
-    ot_links["Samuel II"] = "chapter/10001.htm"
-    ot_links["Kings I"] = "chapter/11001.htm"
-    ot_links["Kings II"] = "chapter/12001.htm"
-    nt_links = OrderedDict( 
-            ( next(s for s in elem.contents if isinstance(s, str)).strip() 
-            , elem["href"])
-            for elem in nt_a_elems )
+    # note: the website lists both Greek and normal names for the same book,
+    # so links are de-duplicated by URL (and names are resolved to convert
+    # Greek to normal names)
+    book_urls: T.Set[str] = set()
+    def _links(a_elems):
+        links: T.Dict[str, str] = OrderedDict()
+        for elem in a_elems:
+            book_url = fetch.canonical_url(elem["href"], url)
+            if book_url in book_urls:
+                continue
+            book_urls.add(book_url)
+            name = next(s for s in elem.contents if isinstance(s, str)).strip()
+            links[_NAME_OVERRIDES.get(book_url) or BOOKS.resolve(name)] = book_url
+        return links
+    ot_links = _links(ot_a_elems)
+    nt_links = _links(nt_a_elems)
+    for book_links in (ot_links, nt_links):
+        for name in [ n for n in book_links if not selection.has_book(n) ]:
+            del book_links[name]
+    del main_page
     links = ( ot_links, nt_links )
     
     log.num_chapters = len(ot_links) + len(nt_links)
     book_idx = -1
     for testament in (Testament.old, Testament.new):
-        for name, chap_path in links[testament.value].items():
+        for name, chap_url in links[testament.value].items():
             book_idx += 1
             log.starting(book_idx, f"Extracting book {name}")
             
-            chap_url = urljoin(url, chap_path)
-            chapter_links = { 1 : chap_url }
-            chap_page = BeautifulSoup(http.get(chap_url).text,
-                    "html5lib")
+            chap_resp = run.get(chap_url)
+            if chap_resp is None:
+                continue
+            # chapter 1 is parsed once: for the chapter links and for its verses
+            chap_page = parse_html(chap_resp)
+            chapter_links = { 1 : chap_url } if selection.has_chapter(1) else {}
+            if digests is not None and not digests.check(chap_url, chap_resp):
+                # only parsed for the links
+                chapter_links = {}
             
             # we're in chapter 1, first get the rest of the chapters
             for a_tag in chap_page.select("table.chapnumtable a"):
-                next_chap_url = a_tag["href"]
                 try:
                     num = int(a_tag.string.strip(), base=10)
                 except ValueError:
-                    bible.warn(Verse.Loc(fix_book_name(name), -1, -1, testament), 
-                            f"Unknown verse number {a.string.strip()}",
+                    builder.warn(Verse.Loc(name, -1, -1, testament), 
+                            f"Unknown verse number {a_tag.string.strip()}",
                             warn.unknown_verse_num)
                     continue
+                if not selection.has_chapter(num):
+                    continue
                 
+                # relative links (chapter/...) are resolved against the page
+                next_chap_url = run.plan(a_tag["href"], chap_url)
+                if next_chap_url is None:
+                    # already requested (e.g. the link to chapter 1)
+                    continue
                 if num in chapter_links:
-                    bible.warn(Verse.Loc(fix_book_name(name), num, -1, testament),
+                    builder.warn(Verse.Loc(name, num, -1, testament),
                             f"Found chapter {num} twice",
                             warn.multiple_chapters)
                     continue
-                chapter_links[num] = urljoin(urljoin(url, "chapter/"), next_chap_url)
+                chapter_links[num] = next_chap_url
+            
+            if dry_run:
+                continue
+            builder.book(name, testament)
                 
-            for chap_num, chap_path in chapter_links.items():
+            for chap_num, chap_url in chapter_links.items():
                 log.info(f"Extracting chapter {chap_num}/{len(chapter_links)}")
-                if chap_num != 1:
-                    chap_page = BeautifulSoup(http.get(urljoin(url, chap_path)).text,
-                            "html5lib")
+                if chap_num != 1 and digests is None:
+                    chap_page = parse_html(fetch.get(chap_url))
+                elif chap_num != 1:
+                    chap_resp = digests.get(chap_url)
+                    if chap_resp is None:
+                        continue # didn't change
+                    chap_page = parse_html(chap_resp)
                 
                 for para in chap_page.select("table.texttable td.textarea p"):
                     if (len({"desc", "note"}.intersection(set(para.attrs.get("class", []))))
@@ -89,7 +137,7 @@ def drbo(url: Url) -> Bible:
                     try:
                         a_tag = para.select("a")[0]
                     except IndexError:
-                        bible.warn(Verse.Loc(fix_book_name(name), chap_num, -1, testament),
+                        builder.warn(Verse.Loc(name, chap_num, -1, testament),
                                 "Empty paragraph",
                                 warn.empty_verse)
                         continue
@@ -99,18 +147,19 @@ def drbo(url: Url) -> Bible:
                             verse_num = int(_VERSE_REGEX.match(a_tag.string).group(1),
                                     base=10)
                         except (AttributeError, ValueError):
-                            import pdb; pdb.set_trace()
-                            bible.warn(Verse.Loc(fix_book_name(name), chap_num, -1, testament),
-                                    f"Unable to get verse number from '{a_tag.string}'")
+                            builder.warn(Verse.Loc(name, chap_num, -1, testament),
+                                    f"Unable to get verse number from '{a_tag.string}'",
+                                    warn.unknown_verse_num)
                             a_tag = a_tag.next_sibling.next_sibling
                             continue
                         text = []
                         a_tag = a_tag.next_sibling
                         while a_tag is not None and a_tag.name != "a":
-                            text.append(a_tag.string.strip())
+                            # .string is None for tags with more than one child
+                            text.append(str(a_tag) if a_tag.name is None else a_tag.get_text())
                             a_tag = a_tag.next_sibling
-                        text = " ".join(text)
-                        bible += Verse(Verse.Loc(
-                            fix_book_name(name), chap_num, verse_num, testament), text)
-    return bible
+                        text = NORMALIZER(" ".join(text))
+                        builder.verse(chap_num, verse_num, text)
+    run.report(log.logger)
+    return builder.finish()
 
@@ -3,18 +3,18 @@ import re
 from collections import OrderedDict
 import typing as T
 
-import requests as http
-from bs4 import BeautifulSoup
-
-from ..extract import extractor, Url
-from ..bible import Bible, Verse, Testament
-from ..util import fix_book_name
+from ..extract import extractor, Url, parse_html, Selection, ALL
+from .. import fetch
+from ..bible import Bible, BibleBuilder, Verse, Testament
+from .. import books
 from .. import warnings as warn
+from .. import normalize
+
+NAME = "Septuagint in American English"
+BOOKS = books.SEPTUAGINT
 
-# a blacklist of strings to replace
+# a blacklist of characters to replace
 STR_BLACKLIST: T.Dict[str, str] = {}
-# helper used for substituting regex matches (for STR_BLACKLIST)
-def _string_fixer(m): return STR_BLACKLIST.get(m.group(0), m.group(0))
 
 
 _VERSE_CLS_REGEX = re.compile("v-(\d+)(-\d+)?")
@@ -40,16 +40,18 @@ def _to_str(tag_or_str):
     
 
 @extractor("http://ebible.org/eng-lxx2012/")
-def ebible_extractor(url: Url) -> Bible:
-    
-    # compile regex for fixing the text (STR_BLACKLIST)
-    blacklist_regex = re.compile("|".join(f"({re.escape(k)})" 
-        for k in STR_BLACKLIST.keys()))
+def ebible_extractor(url: Url, sink=None, selection: Selection = ALL,
+        digests: T.Optional[fetch.PageDigests] = None) -> Bible:
+    """
+    If digests is given (see fetch.PageDigests), only the chapters whose
+    page changed since the previous run are extracted.
+    """
     
     log = logging.getLogger(__name__)
-    bible = Bible(name="Septuagint in American English")
+    builder = BibleBuilder() if sink is None else sink
+    builder.start(NAME)
     
-    info = http.get("http://ebible.org/study/content/texts/ENGLXX/info.json").json()
+    info = fetch.get("http://ebible.org/study/content/texts/ENGLXX/info.json").json()
     sections = OrderedDict([ (
         (division, info["divisions"][i]),
         [ sec for sec in info["sections"] if sec.startswith(info["divisions"][i]) ]
@@ -65,10 +67,15 @@ def ebible_extractor(url: Url) -> Bible:
     EXTRACT_NUM_REGEX = re.compile(r"^[^\d]*(\d+)$")
     chap_count = -1
     for (book, div), chapters in sections.items():
+        book_name = BOOKS.resolve(book)
+        if not selection.has_book(book_name):
+            chap_count += len(chapters)
+            continue
+        builder.book(book_name, Testament.old)
         for chap_code in chapters:
             chap_count += 1
             log.info(f"({chap_count*100 // num_chapters:3}%) Extracting chapter "
-                    f"{chap_code} in {book} (corrected: {fix_book_name(book)})")
+                    f"{chap_code} in {book} (corrected: {book_name})")
             # get the chapter number
             try:
                 # the chapter name sometimes ends with a numbers (e.g. Kings 1)
@@ -76,13 +83,20 @@ def ebible_extractor(url: Url) -> Bible:
                 actual_chap_code = chap_code[len(div):]
                 chap_num = int(EXTRACT_NUM_REGEX.match(actual_chap_code).group(1))
             except (AttributeError, ValueError):
-                book.warn(Verse.Loc(book, -1, -1), 
+                builder.warn(Verse.Loc(book_name, -1, -1), 
                         f"Unknown chapter number. Chapter code is {chap_code}",
                         warn.unknown_chap_num)
                 continue
+            if not selection.has_chapter(chap_num):
+                continue
             
-            chap_page = BeautifulSoup(
-                    http.get(SECTION_URL.format(chap_code)).text, "html5lib")
+            if digests is None:
+                chap_page = parse_html(fetch.get(SECTION_URL.format(chap_code)))
+            else:
+                chap_resp = digests.get(SECTION_URL.format(chap_code))
+                if chap_resp is None:
+                    continue # didn't change
+                chap_page = parse_html(chap_resp)
             
             for verse_html in chap_page.find_all(class_="v-num"):
                 verse_matches = (_VERSE_CLS_REGEX.fullmatch(cls) 
@@ -90,37 +104,37 @@ def ebible_extractor(url: Url) -> Bible:
                 try:
                     verse_match = next(vm for vm in verse_matches if vm) # first match
                 except StopIteration:
-                    bible.warn(Verse.Loc(fix_book_name(book), chap_num, -1), "Cannot find verses",
+                    builder.warn(Verse.Loc(book_name, chap_num, -1), "Cannot find verses",
                             warn.cannot_find_verse)
                     continue
                 try:
                     verse_num = int(verse_match.group(1))
                 except (AttributeError, ValueError):
-                    bible.warn(Verse.Loc(fix_book_name(book), chap_num, -1), "Cannot find verse number",
+                    builder.warn(Verse.Loc(book_name, chap_num, -1), "Cannot find verse number",
                             warn.cannot_find_verse_num)
                     continue
                 
                 parent = verse_html.parent
-                verse = "".join( _to_str(c) for c in parent if _is_text_tag(c) ).strip()
-                # remove multiple spaces
-                verse = " ".join(verse.split())
-                # filter stuff from STR_BLACKLIST from verse
-                verse = blacklist_regex.sub(_string_fixer, verse)
+                verse = NORMALIZER("".join( _to_str(c) for c in parent if _is_text_tag(c) ))
                 if verse_match.group(2):
                     # More than one verse
                     locs = [
-                            Verse.Loc(fix_book_name(book), chap_num, v)
+                            Verse.Loc(book_name, chap_num, v)
                             for v in range(verse_num, int(verse_match.group(2)[1:])+1)
                             ]
-                    bible.warn(locs, "Found bible range. Merging into the first verse.",
+                    builder.warn(locs, "Found bible range. Merging into the first verse.",
                             warn.verse_range)
                 
-                bible += Verse(Verse.Loc(fix_book_name(book), chap_num, verse_num, Testament.old), verse)
-    return bible
+                builder.verse(chap_num, verse_num, verse)
+    return builder.finish()
 
 
+# pages are decoded as UTF-8 (see fetch.HOST_ENCODINGS) so these are the
+# actual characters, not their mojibake
 STR_BLACKLIST = {
-        "\u00e2\u0080\u0094": " ",
-        "\u00e2\u008c\u0083": "",
-        "\u00e2\u0080\u0099": "'"
+        "\u2014": " ", # em dash
+        "\u2303": "", # up arrowhead
+        "\u2019": "'" # right single quotation mark
         }
+
+NORMALIZER = normalize.register(NAME, normalize.Normalizer(translate=STR_BLACKLIST))
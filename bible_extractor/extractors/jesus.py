@@ -1,24 +1,34 @@
+import codecs
 import logging
 import re
+from html.parser import HTMLParser
 from urllib.parse import urljoin
 from collections import OrderedDict
+import typing as T
 
-import requests as http
-from bs4 import BeautifulSoup
-
-from ..extract import extractor, Url
-from ..bible import Bible, Verse, Testament
+from ..extract import extractor, Url, parse_html, Selection, ALL
+from .. import fetch
+from ..bible import Bible, BibleBuilder, Verse, Testament
 from ..progress import ProgressIndicator
-from ..util import fix_book_name
+from .. import books
+from .. import normalize
+
+NORMALIZER = normalize.DEFAULT_NORMALIZER
+BOOKS = books.DEFAULT
 
 
 _CHAPTER_NAME_REGEX = re.compile(r"^\s*CHAPTER\s+\d+\s*$")
 _DIGIT_REGEX = re.compile(r"\d+")
 
 @extractor("http://www.jesus-is-lord.com/thebible.htm")
-def jesus_is_lord_extractor(url: Url) -> Bible:
-    log = ProgressIndicator(logging.getLogger(__name__))
-    main_page = BeautifulSoup(http.get(url).text, "html5lib")
+def jesus_is_lord_extractor(url: Url, sink=None, selection: Selection = ALL,
+        digests: T.Optional[fetch.PageDigests] = None) -> Bible:
+    """
+    If digests is given (see fetch.PageDigests), only the books whose page
+    changed since the previous run are extracted (a book is one page).
+    """
+    log = ProgressIndicator(logging.getLogger(__name__), fetch.DEFAULT_SCHEDULER)
+    main_page = parse_html(fetch.get(url))
     # the second table contains all the links
     table = main_page.find_all("table")[1]
     old_test = table.find(string="Old Testament").parent.parent.find_all("a")
@@ -35,50 +45,129 @@ def jesus_is_lord_extractor(url: Url) -> Bible:
     log.num_chapters = len(old_test_names) + len(new_test_names) # books instead of chapters
     i = -1
     
-    bible = Bible()
+    builder = BibleBuilder() if sink is None else sink
     for book_name, book_url in bible_urls.items():
         i += 1
         log.starting(i, f"Extracting book {book_name} ('{book_url}')")
         book_url = urljoin(url, book_url) # full url
         
-        book_html = BeautifulSoup(http.get(book_url).text, "html5lib")
-        
-        # Chapters are in special paragraphs. Use them to split the flow
-        verse_texts = book_html.select(".MsoNormal")
-        # delete book_html because it's probably taking up a lot of memory
-        del book_html
-        
+        test = (Testament.old 
+                if book_name in old_test_names else Testament.new)
+        canonical_name = BOOKS.resolve(book_name)
+        if not selection.has_book(canonical_name):
+            continue
+        if digests is None:
+            book_resp = fetch.get(book_url, stream=True)
+        else:
+            # the whole page is downloaded to check its digest
+            book_resp = digests.get(book_url, stream=True)
+            if book_resp is None:
+                continue # didn't change
+        builder.book(canonical_name, test)
         
-        # split the verse_texts into chapters
-        chapter_indices = [ i for i, html in enumerate(verse_texts)
-                if _CHAPTER_NAME_REGEX.match(html.text) ]
-        # skip ch1
-        chapter_verses = []
-        prev_idx = -1
-        for ch_idx in chapter_indices + [len(verse_texts)]:
-            if prev_idx == -1:
-                prev_idx = ch_idx
-                continue # skip first one
-            chapter_verses.append(verse_texts[prev_idx+1:ch_idx])
-            prev_idx = ch_idx 
-        # chapters is a list of lists of verses
-        # Each list consists of the verses for chapter index + 1
+        # Chapters are in special paragraphs. Use them to split the flow.
+        # The page is parsed as it's downloaded and verses are added as soon
+        # as their paragraph ends, so the whole page is never in memory
+        chapter_num = 0 # paragraphs before the first chapter are skipped
+        verse_idx = 0
+        skip_paragraph = False
+        for text in _iter_paragraphs(book_resp):
+            if _CHAPTER_NAME_REGEX.match(text):
+                if chapter_num > 0:
+                    log.info(f"Processed chapter {chapter_num} with {verse_idx} verses")
+                chapter_num += 1
+                verse_idx = 0
+                # the first paragraph of a chapter is skipped
+                skip_paragraph = True
+                continue
+            if chapter_num == 0:
+                continue
+            if skip_paragraph:
+                skip_paragraph = False
+                continue
             
-            
-        chapters: Dict[int, List[BibleVerse]] = {}
-        #?import pdb; pdb.set_trace()
-        for chapter_idx, chap_verses in enumerate(chapter_verses):
-            log.info(f"Processing chapter {chapter_idx+1} with {len(chap_verses)-1} verses")
-            # each text has a number before the actual text except the first one
-            split_verses = ( verse.text.split(" ") for verse in chap_verses[1:] )
+            # each text has a number before the actual text.
             # Some numbers have weird chars appended to them.
             # just extract the first number using _DIGIT_REGEX
-            for verse_idx, split in enumerate(split 
-                    for split in split_verses if _DIGIT_REGEX.match(split[0])):
-                test = (Testament.old 
-                        if book_name in old_test_names else Testament.new)
-                bible += Verse(Verse.Loc(fix_bible_name(book_name), chapter_idx+1, verse_idx+1, test),
-                        " ".join(split[1:]))
-                        
+            split = text.split(" ")
+            if not _DIGIT_REGEX.match(split[0]):
+                continue
+            verse_idx += 1
+            if not selection.has_chapter(chapter_num):
+                # a book is one page, only the verses are skipped
+                continue
+            builder.verse(chapter_num, verse_idx, NORMALIZER(" ".join(split[1:])))
+        if chapter_num > 0:
+            log.info(f"Processed chapter {chapter_num} with {verse_idx} verses")
                 
-    return bible
+    return builder.finish()
+
+
+class _MsoNormalParser(HTMLParser):
+    """
+    An incremental parser that collects the text of every `.MsoNormal`
+    element. Completed paragraphs are taken out with pop().
+    """
+    
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.paragraphs: T.List[str] = []
+        self._text: T.Optional[T.List[str]] = None # None outside a paragraph
+        self._tag = ""
+        self._depth = 0
+    
+    def handle_starttag(self, tag, attrs):
+        if self._text is not None:
+            if tag == self._tag:
+                if tag == "p":
+                    # <p> can't be nested, a new one closes the current one
+                    self._end_paragraph()
+                else:
+                    self._depth += 1
+                    return
+            else:
+                return
+        classes = dict(attrs).get("class") or ""
+        if "MsoNormal" in classes.split():
+            self._text = []
+            self._tag = tag
+            self._depth = 1
+    
+    def handle_endtag(self, tag):
+        if self._text is not None and tag == self._tag:
+            self._depth -= 1
+            if self._depth == 0:
+                self._end_paragraph()
+    
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+    
+    def close(self):
+        super().close()
+        if self._text is not None:
+            self._end_paragraph()
+    
+    def _end_paragraph(self):
+        self.paragraphs.append("".join(self._text))
+        self._text = None
+    
+    def pop(self) -> T.List[str]:
+        paragraphs, self.paragraphs = self.paragraphs, []
+        return paragraphs
+
+def _iter_paragraphs(resp, chunk_size: int = 64 * 1024) -> T.Iterator[str]:
+    """
+    Yield the text of each `.MsoNormal` element in a (streamed) response.
+    """
+    parser = _MsoNormalParser()
+    decoder = codecs.getincrementaldecoder(fetch.encoding(resp))(errors="replace")
+    try:
+        for chunk in resp.iter_content(chunk_size=chunk_size):
+            parser.feed(decoder.decode(chunk))
+            yield from parser.pop()
+        parser.feed(decoder.decode(b"", final=True))
+        parser.close()
+        yield from parser.pop()
+    finally:
+        resp.close()
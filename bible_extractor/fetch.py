@@ -0,0 +1,531 @@
+"""
+Provides a polite request scheduler that all extractors download pages through.
+
+Every host gets its own token bucket (requests per second) and an adaptive
+concurrency limit. The limit grows additively while the host answers quickly
+and is cut in half when it answers with 429 or 5xx (AIMD). Failed requests
+are retried with jittered exponential backoff.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, urljoin
+import hashlib
+import json
+import os
+import posixpath
+import queue
+import random
+import threading
+import time
+import typing as T
+
+import logging
+log = logging.getLogger(__name__)
+
+import requests as http
+
+from .cache import JsonCache
+
+_RETRY_STATUS = { 429, 500, 502, 503, 504 }
+
+class HostLimits(T.NamedTuple):
+    rate: float = 2.0             # initial requests per second
+    max_rate: float = 10.0
+    min_rate: float = 0.2
+    burst: int = 4                # token bucket capacity
+    concurrency: float = 2.0      # initial number of requests in flight
+    max_concurrency: int = 8
+    latency_target: float = 2.0   # seconds. Slower responses count as congestion
+    max_retries: int = 5
+    backoff: float = 1.0          # base backoff in seconds
+    max_backoff: float = 60.0
+    timeout: float = 30.0
+
+# limits for the sites we crawl. Unknown hosts use HostLimits()
+HOST_LIMITS: T.Dict[str, HostLimits] = {
+    "www.drbo.org": HostLimits(rate=2.0, max_rate=6.0, max_concurrency=4),
+    "biblehub.com": HostLimits(rate=4.0, max_rate=15.0, max_concurrency=8),
+    "ebible.org": HostLimits(rate=4.0, max_rate=10.0, max_concurrency=6),
+    "www.jesus-is-lord.com": HostLimits(rate=1.0, max_rate=3.0, max_concurrency=2),
+}
+
+# encodings of the sites we crawl. Pages are decoded with these instead of
+# letting requests guess. Other hosts are detected once (see encoding)
+HOST_ENCODINGS: T.Dict[str, str] = {
+    "ebible.org": "utf-8",
+    "biblehub.com": "utf-8",
+    "www.jesus-is-lord.com": "windows-1252",
+}
+
+class TokenBucket:
+    """A thread safe token bucket. acquire blocks until a token is available."""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class HostScheduler:
+    """Rate and concurrency control for a single host."""
+
+    def __init__(self, host: str, limits: HostLimits) -> None:
+        self.host = host
+        self.limits = limits
+        self.bucket = TokenBucket(limits.rate, limits.burst)
+        self.concurrency = float(limits.concurrency)
+        self.in_flight = 0
+        self.latency: T.Optional[float] = None # exponential moving average
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+        self.num_requests = 0
+        self.num_retries = 0
+        self.num_throttled = 0 # 429
+        self.num_server_errors = 0 # 5xx
+        self.num_failures = 0 # gave up
+        self.total_time = 0.0
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.concurrency):
+                self._cond.wait()
+            self.in_flight += 1
+        self.bucket.acquire()
+
+    def release(self, latency: T.Optional[float], status: T.Optional[int]):
+        """
+        Release a request slot and adapt the limits.
+
+        latency and status are None if the request failed without a response.
+        """
+        congested = status is None or status in _RETRY_STATUS
+        with self._cond:
+            self.in_flight -= 1
+            self.num_requests += 1
+            if status == 429:
+                self.num_throttled += 1
+            elif status is not None and status >= 500:
+                self.num_server_errors += 1
+            if latency is not None:
+                self.total_time += latency
+                self.latency = (latency if self.latency is None
+                        else 0.8 * self.latency + 0.2 * latency)
+
+            lim = self.limits
+            now = time.monotonic()
+            if congested or (self.latency or 0) > lim.latency_target:
+                # multiplicative decrease, at most once per window so a burst
+                # of errors from requests already in flight counts once
+                if now - self._last_decrease > max(self.latency or 0, 1.0):
+                    self._last_decrease = now
+                    factor = 0.5 if congested else 0.9
+                    self.concurrency = max(1.0, self.concurrency * factor)
+                    self.bucket.rate = max(lim.min_rate, self.bucket.rate * factor)
+            else:
+                # additive increase: about +1 per window of successful requests
+                self.concurrency = min(lim.max_concurrency,
+                        self.concurrency + 1 / self.concurrency)
+                self.bucket.rate = min(lim.max_rate,
+                        self.bucket.rate + 1 / max(self.bucket.rate, 1.0))
+            self._cond.notify_all()
+
+    def count(self, counter: str):
+        with self._cond:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def metrics(self) -> T.Dict[str, T.Any]:
+        with self._cond:
+            return {
+                    "requests": self.num_requests,
+                    "retries": self.num_retries,
+                    "throttled": self.num_throttled,
+                    "server_errors": self.num_server_errors,
+                    "failures": self.num_failures,
+                    "in_flight": self.in_flight,
+                    "concurrency": round(self.concurrency, 2),
+                    "rate": round(self.bucket.rate, 2),
+                    "avg_latency": (round(self.total_time / self.num_requests, 3)
+                        if self.num_requests > 0 else None),
+                    }
+
+class Scheduler:
+    """
+    Schedules requests over many hosts, each with its own HostScheduler.
+    """
+
+    def __init__(self, limits: T.Dict[str, HostLimits] = HOST_LIMITS,
+            session: T.Optional[http.Session] = None) -> None:
+        self.limits = dict(limits)
+        self.session = session if session is not None else http.Session()
+        self.hosts: T.Dict[str, HostScheduler] = {}
+        self._lock = threading.Lock()
+
+    def host(self, url: str) -> HostScheduler:
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            try:
+                return self.hosts[host]
+            except KeyError:
+                sched = HostScheduler(host, self.limits.get(host, HostLimits()))
+                self.hosts[host] = sched
+                return sched
+
+    def get(self, url: str, **kwargs) -> http.Response:
+        """
+        GET url, respecting the host limits and retrying on 429, 5xx and
+        connection errors.
+        """
+        host = self.host(url)
+        lim = host.limits
+        kwargs.setdefault("timeout", lim.timeout)
+        attempt = 0
+        while True:
+            host.acquire()
+            start = time.monotonic()
+            try:
+                resp = self.session.get(url, **kwargs)
+            except (http.ConnectionError, http.Timeout) as e:
+                host.release(None, None)
+                error: T.Union[Exception, http.Response] = e
+                retry_after = None
+            except Exception:
+                host.release(None, None)
+                raise
+            else:
+                host.release(time.monotonic() - start, resp.status_code)
+                if resp.status_code not in _RETRY_STATUS:
+                    return resp
+                error = resp
+                retry_after = _retry_after(resp)
+
+            attempt += 1
+            if attempt > lim.max_retries:
+                host.count("num_failures")
+                log.error(f"Giving up on '{url}' after {attempt} attempts")
+                if isinstance(error, http.Response):
+                    error.raise_for_status()
+                raise error
+            host.count("num_retries")
+            # full jitter backoff
+            delay = random.uniform(0, min(lim.max_backoff, lim.backoff * 2 ** attempt))
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            log.warning(f"Retrying '{url}' in {delay:.1f}s ({error})")
+            time.sleep(delay)
+
+    def get_many(self, urls: T.Iterable[str], **kwargs) -> T.Iterator[http.Response]:
+        """
+        GET many urls concurrently. The responses are yielded in order.
+        """
+        urls = list(urls)
+        workers = max([ self.host(u).limits.max_concurrency for u in urls ] + [1])
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(lambda u: self.get(u, **kwargs), urls)
+
+    def metrics(self) -> T.Dict[str, T.Dict[str, T.Any]]:
+        with self._lock:
+            hosts = dict(self.hosts)
+        return { name: host.metrics() for name, host in hosts.items() }
+
+    def summary(self) -> str:
+        """A short, one line summary of the metrics (used for progress)."""
+        return ", ".join(
+                f"{name}: {m['requests']} req, {m['rate']}/s, "
+                f"{m['in_flight']}/{int(m['concurrency'])} in flight"
+                + (f", {m['throttled']} throttled" if m["throttled"] else "")
+                for name, m in self.metrics().items())
+
+class FetchQueue:
+    """
+    A streaming queue of downloads.
+
+    Pages are downloaded (and optionally parsed) concurrently. Iterating over
+    the queue yields (key, result) pairs as soon as they are ready, and new
+    pages can be put in the queue while iterating, so discovery and download
+    can be pipelined:
+    
+        q = FetchQueue()
+        q.put(menu_url, "menu", parse_menu)
+        for key, result in q:
+            if key == "menu":
+                for url in result:
+                    q.put(url, ("page", url), parse_page)
+    """
+
+    def __init__(self, scheduler: T.Optional[Scheduler] = None,
+            max_workers: int = 16) -> None:
+        self.scheduler = scheduler if scheduler is not None else DEFAULT_SCHEDULER
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._done: "queue.Queue[T.Tuple[T.Any, T.Any, T.Optional[BaseException]]]" \
+                = queue.Queue()
+        self._pending = 0
+        self._futures: T.List[T.Any] = []
+
+    def put(self, url: str, key: T.Any,
+            parse: T.Optional[T.Callable[[http.Response], T.Any]] = None,
+            digests: T.Optional["PageDigests"] = None):
+        """
+        Queue a download of url. parse runs in a worker thread on the response
+        and its result is yielded with key (the response is yielded if parse is
+        None). If digests is given, the page is downloaded conditionally and
+        None is yielded (without parsing) if it didn't change.
+        """
+        def _work():
+            try:
+                if digests is None:
+                    resp = self.scheduler.get(url)
+                else:
+                    resp = digests.get(url, self.scheduler)
+                if resp is None or parse is None:
+                    self._done.put((key, resp, None))
+                else:
+                    self._done.put((key, parse(resp), None))
+            except BaseException as e:
+                self._done.put((key, None, e))
+        self._pending += 1
+        self._futures.append(self._pool.submit(_work))
+
+    def __iter__(self) -> T.Iterator[T.Tuple[T.Any, T.Any]]:
+        try:
+            while self._pending > 0:
+                key, result, error = self._done.get()
+                self._pending -= 1
+                if error is not None:
+                    raise error
+                yield key, result
+        finally:
+            # don't download the rest of the queue if the consumer stopped
+            for future in self._futures:
+                future.cancel()
+            self._pool.shutdown(wait=False)
+
+_detected_encodings: T.Optional[JsonCache] = None
+_detected_lock = threading.Lock()
+
+def encoding(resp: http.Response) -> str:
+    """
+    Return the encoding of a response without decoding it: the host's
+    declared encoding (HOST_ENCODINGS), the charset in the Content-Type
+    header or, as a last resort, the encoding detected from the content.
+    Detection happens at most once per host and is cached across runs.
+    """
+    global _detected_encodings
+    host = urlsplit(resp.url).netloc.lower()
+    try:
+        return HOST_ENCODINGS[host]
+    except KeyError:
+        pass
+    if "charset" in resp.headers.get("Content-Type", "").lower():
+        return resp.encoding
+    with _detected_lock:
+        if _detected_encodings is None:
+            _detected_encodings = JsonCache("encodings")
+        try:
+            return _detected_encodings[host]
+        except KeyError:
+            enc = resp.apparent_encoding or "utf-8"
+            log.info(f"Detected encoding '{enc}' for '{host}'")
+            _detected_encodings[host] = enc
+            _detected_encodings.save()
+            return enc
+
+def canonical_url(url: str, base: T.Optional[str] = None) -> str:
+    """
+    Return the canonical form of url (relative to base if given): lower case
+    scheme and host, no default port, no fragment and a normalized path.
+
+    >>> canonical_url("chapter/../chapter/09002.htm#x", "HTTP://www.drbo.org:80/")
+    'http://www.drbo.org/chapter/09002.htm'
+    """
+    if base is not None:
+        url = urljoin(base, url)
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = parts.netloc.lower()
+    if (scheme, host.rpartition(":")[2]) in (("http", "80"), ("https", "443")):
+        host = host.rpartition(":")[0]
+    url_path = parts.path or "/"
+    trailing = "/" if url_path.endswith("/") and url_path != "/" else ""
+    url_path = posixpath.normpath(url_path) + trailing
+    return urlunsplit((scheme, host, url_path, parts.query, ""))
+
+class FetchRun:
+    """
+    Tracks the pages requested during one extraction run so that no page is
+    downloaded twice.
+
+    In dry run mode, pages queued with plan are only recorded. report() logs
+    the plan (or what was fetched) and the duplicates that were skipped.
+    """
+
+    def __init__(self, scheduler: T.Optional[Scheduler] = None,
+            dry_run: bool = False) -> None:
+        self.scheduler = scheduler if scheduler is not None else DEFAULT_SCHEDULER
+        self.dry_run = dry_run
+        self.seen: T.Set[str] = set()
+        self.fetched: T.List[str] = []
+        self.planned: T.List[str] = []
+        self.duplicates: T.List[str] = []
+
+    def claim(self, url: str, base: T.Optional[str] = None) -> T.Optional[str]:
+        """
+        Return the canonical url if it wasn't seen in this run yet, None otherwise.
+        """
+        url = canonical_url(url, base)
+        if url in self.seen:
+            self.duplicates.append(url)
+            return None
+        self.seen.add(url)
+        return url
+
+    def get(self, url: str, base: T.Optional[str] = None) -> T.Optional[http.Response]:
+        """
+        Download a page needed to discover other pages (it's downloaded even in
+        dry run mode). Returns None if the page was already requested.
+        """
+        url = self.claim(url, base)
+        if url is None:
+            return None
+        self.fetched.append(url)
+        return self.scheduler.get(url)
+
+    def plan(self, url: str, base: T.Optional[str] = None) -> T.Optional[str]:
+        """
+        Add a page to the plan. Returns the canonical url if it should be
+        downloaded (new and not a dry run).
+        """
+        url = self.claim(url, base)
+        if url is None:
+            return None
+        self.planned.append(url)
+        return None if self.dry_run else url
+
+    def report(self, logger: logging.Logger = log):
+        if self.dry_run:
+            for url in self.planned:
+                print(url)
+            logger.info(f"Fetch plan: {len(self.planned)} page(s) to download, "
+                    f"{len(self.fetched)} page(s) downloaded for discovery, "
+                    f"{len(self.duplicates)} duplicate(s) skipped")
+        else:
+            logger.info(f"Fetched {len(self.fetched) + len(self.planned)} page(s), "
+                    f"skipped {len(self.duplicates)} duplicate(s)")
+        for url in self.duplicates:
+            logger.debug(f"Skipped duplicate '{url}'")
+
+class PageDigests:
+    """
+    The digests (SHA-256) and validators (ETag and Last-Modified) of the pages
+    downloaded by the previous run, for incremental extraction.
+
+    get downloads a page conditionally and returns None if it didn't change:
+    the server answered 304 Not Modified or the page has the same digest as
+    before. Pages that are needed anyway (e.g. for their links) are
+    downloaded as usual and checked with check.
+    """
+
+    def __init__(self, pages: T.Optional[T.Dict[str, T.Dict[str, T.Any]]] = None) -> None:
+        self.previous: T.Dict[str, T.Dict[str, T.Any]] = dict(pages or {})
+        self.pages: T.Dict[str, T.Dict[str, T.Any]] = {}
+        self.changed: T.List[str] = []
+        self.unchanged: T.List[str] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, file_path: str) -> "PageDigests":
+        """The digests saved in file_path (none if it can't be read)."""
+        try:
+            with open(file_path, "r") as digests_file:
+                return cls(json.load(digests_file).get("pages", {}))
+        except (OSError, ValueError) as e:
+            log.info(f"No page digests in '{file_path}' ({e})")
+            return cls()
+
+    def save(self, file_path: str, **info):
+        """
+        Save the digests of this run (and of the pages of the previous run that
+        weren't requested) and info in file_path.
+        """
+        data = dict(info, pages={ **self.previous, **self.pages })
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, "w") as digests_file:
+            json.dump(data, digests_file, indent=2)
+        os.replace(tmp_path, file_path)
+
+    def headers(self, url: str) -> T.Dict[str, str]:
+        """The conditional request headers of url."""
+        prev = self.previous.get(canonical_url(url), {})
+        headers = {}
+        if prev.get("etag"):
+            headers["If-None-Match"] = prev["etag"]
+        if prev.get("last_modified"):
+            headers["If-Modified-Since"] = prev["last_modified"]
+        return headers
+
+    def check(self, url: str, resp: http.Response) -> bool:
+        """Record the digest of a downloaded page and return True if it changed."""
+        url = canonical_url(url)
+        entry = { "sha256": hashlib.sha256(resp.content).hexdigest() }
+        for key, header in (("etag", "ETag"), ("last_modified", "Last-Modified")):
+            if resp.headers.get(header):
+                entry[key] = resp.headers[header]
+        with self._lock:
+            self.pages[url] = entry
+            changed = self.previous.get(url, {}).get("sha256") != entry["sha256"]
+            (self.changed if changed else self.unchanged).append(url)
+        return changed
+
+    def get(self, url: str, scheduler: T.Optional[Scheduler] = None,
+            **kwargs) -> T.Optional[http.Response]:
+        """GET url conditionally. Returns None if it didn't change since the previous run."""
+        scheduler = scheduler if scheduler is not None else DEFAULT_SCHEDULER
+        headers = dict(kwargs.pop("headers", None) or {})
+        headers.update(self.headers(url))
+        resp = scheduler.get(url, headers=headers, **kwargs)
+        if resp.status_code == 304:
+            url = canonical_url(url)
+            with self._lock:
+                self.pages[url] = self.previous.get(url, {})
+                self.unchanged.append(url)
+            resp.close()
+            return None
+        return resp if self.check(url, resp) else None
+
+    def missing(self) -> T.List[str]:
+        """The pages of the previous run that weren't requested in this one."""
+        return [ url for url in self.previous if url not in self.pages ]
+
+    def summary(self) -> str:
+        return (f"{len(self.changed)} changed and {len(self.unchanged)} unchanged page(s), "
+                f"{len(self.missing())} page(s) of the previous run not requested")
+
+def _retry_after(resp: http.Response) -> T.Optional[float]:
+    try:
+        return float(resp.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+DEFAULT_SCHEDULER: Scheduler = Scheduler()
+
+def get(url: str, **kwargs) -> http.Response:
+    return DEFAULT_SCHEDULER.get(url, **kwargs)
+
+def get_many(urls: T.Iterable[str], **kwargs) -> T.Iterator[http.Response]:
+    return DEFAULT_SCHEDULER.get_many(urls, **kwargs)
@@ -2,5 +2,8 @@ from .check_lengths import check_lengths
 from .remove_ranges import remove_ranges
 from .remove import remove_old, remove_new
 from .fixdaniel import fix_daniel
+from .normalize import normalize
+from .validate import validate
 
-__all__ = (check_lengths, remove_ranges, remove_old, remove_new, fix_daniel)
+__all__ = (check_lengths, remove_ranges, remove_old, remove_new, fix_daniel, normalize,
+        validate)
@@ -1,16 +1,13 @@
-import sys
-
 from ..bible import *
+from ..validate import Validator, LengthRule, validate
+
+_VALIDATOR = Validator([ LengthRule(10) ])
 
 def check_lengths(bible: Bible):
     """
-    Print a warning (to stderr) for 
+    Add a warning for 
 every verse that's less than 10 characters long.
     """
     
-    for verse in bible:
-        if len(verse.content) < 10:
-            book, chap, verse_num, _ = verse.loc
-            print(f"WARNING:check_lengths:{book} {chap}:{verse_num} is small",
-                file=sys.stderr)
+    validate(bible, _VALIDATOR)
     return bible
@@ -0,0 +1,9 @@
+from ..bible import *
+from ..normalize import normalize_bible
+
+def normalize(bible: Bible) -> Bible:
+    """
+Normalize the text of every verse (Unicode, characters and
+whitespace) the way the Bible's source normalizes it.
+    """
+    return normalize_bible(bible)
@@ -1,14 +1,18 @@
-import copy
-
 from ..bible import *
 
 
 def _remove(bible: Bible, test: Testament) -> Bible:
-    b = Bible(bible.name)
-    for verse in (v for v in bible if v.loc.test != test):
-        b += verse
+    builder = BibleBuilder(bible.name, compressed=bible.compressed)
+    for t in (Testament.old, Testament.new):
+        if t == test:
+            continue
+        for book in bible.testaments[t.value]:
+            builder.book(book, t)
+            for chap_num, chap in bible.verses[book].items():
+                builder.chapter(chap_num, chap.items())
     
-    b.warnings = copy.deepcopy(bible.warnings)
+    b = builder.finish()
+    b.warnings = bible.warnings.copy()
     return b
 
 def remove_old(bible: Bible) -> Bible:
@@ -1,5 +1,5 @@
-import copy
 import logging
+import typing as T
 
 from ..bible import *
 from .. import warnings as warn
@@ -12,16 +12,30 @@ Remove all verses that were merged using
     
     log = logging.getLogger(__name__)
     blacklist_locs = set()
-    for warning in (w for w in bible.warnings if w.type == warn.verse_range):
+    for warning in bible.warnings.of_type(warn.verse_range):
         for loc in warning.locs:
             log.info(f"Skipping location {loc}")
             blacklist_locs.add(loc)
     
-    # copy the bible...
-    new_bible = Bible(bible.name)
-    for verse in (v for v in bible if v.loc.remove_test() not in blacklist_locs):
-        new_bible += verse
+    # blacklisted verses by book and chapter
+    blacklist: T.Dict[T.Tuple[str, int], T.Set[int]] = {}
+    for loc in blacklist_locs:
+        blacklist.setdefault((loc.book.lower(), loc.chapter), set()).add(loc.verse)
     
-    new_bible.warnings = copy.deepcopy(new_bible.warnings)
+    # copy the bible without the blacklisted verses
+    builder = BibleBuilder(bible.name, compressed=bible.compressed)
+    for test in (Testament.old, Testament.new):
+        for book in bible.testaments[test.value]:
+            builder.book(book, test)
+            for chap_num, chap in bible.verses[book].items():
+                skipped = blacklist.get((book.lower(), chap_num))
+                if skipped is None:
+                    builder.chapter(chap_num, chap.items())
+                elif len(set(chap.keys()) - skipped) > 0:
+                    builder.chapter(chap_num, 
+                            ((v, t) for v, t in chap.items() if v not in skipped))
+    
+    new_bible = builder.finish()
+    new_bible.warnings = bible.warnings.copy()
     
     return new_bible
@@ -0,0 +1,10 @@
+from ..bible import *
+from .. import validate as _validate
+
+def validate(bible: Bible) -> Bible:
+    """
+Add warnings for short, empty, duplicate and missing verses,
+unexpected characters and unexpected chapter counts.
+    """
+    _validate.validate(bible)
+    return bible
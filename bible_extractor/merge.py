@@ -1,4 +1,4 @@
-import copy
+from collections import OrderedDict
 import typing as T
 import logging
 
@@ -8,34 +8,96 @@ _log = logging.getLogger(__name__)
 
 def merge(*bibles: T.List[Bible]) -> Bible:
     try:
-        result = copy.deepcopy(bibles[0])
+        result = bibles[0].copy()
     except IndexError:
         raise ValueError("Merge needs at least one bible") from None
     
     for bible in bibles[1:]:
-        result = _merge_two(result, bible)
+        result = merge_into(result, bible)
     
     return result
 
+def merge_into(b1: Bible, b2: Bible) -> Bible:
+    """
+    Merge b2 into b1 (in place, without copying b1) giving priority to b1.
+    Merging a list of Bibles one by one in the same order always gives the
+    same result.
+    """
+    return _merge_two(b1, b2)
+
 def _merge_two(b1: Bible, b2: Bible) -> Bible:
     b1.name = f"{b1.name} and {b2.name}"
     
     # go through b2 and see if there's anything not in b1
-    locs_added: Set[Verse.Loc] = set()
     for verse in b2:
         if verse.loc not in b1:
-            locs_added.add(verse.loc)
             b1 += verse
             _log.info(f"Taking {verse.loc} from '{b2.name}' into '{b1.name}'")
     
-    # get all the warnings in b2 that have one of locs_added and put them in b1
-    for warning in b2.warnings:
-        if len(set(warning.locs).intersection(locs_added)) >= 0:
-            warning_copy = copy.deepcopy(warning)
-            warning_copy = BibleWarning(
-                    copy.deepcopy(warning.locs),
-                    f"{b2.name}: {warning.text}",
-                    warning.type)
-            b1.warnings.add(warning_copy)
+    # take all the warnings in b2 and put them in b1.
+    # Warnings (and their locations) are immutable so they don't need copying
+    b1.warnings.update(
+            BibleWarning(warning.locs, f"{b2.name}: {warning.text}", warning.type)
+            for warning in b2.warnings)
             
     return b1
+
+def update(bible: Bible, other: Bible) -> Bible:
+    """
+    Replace the chapters of bible (in place) with the chapters of other, e.g.
+    to merge a partial extraction into a full one. Books that aren't in
+    bible are added at the end of their testament. The warnings of the
+    replaced chapters and the book level warnings (chapter 0 or less) of
+    the updated books are replaced by the warnings of other.
+    """
+    replaced: T.Set[T.Tuple[str, int]] = set()
+    books: T.Set[str] = set()
+    for test in (Testament.old, Testament.new):
+        for book in other.testaments[test.value]:
+            if book in bible.testaments[(test.value + 1) % 2]:
+                raise BibleInconsistentError(f"{book}: a book cannot be in both testaments")
+            if book not in bible.testaments[test.value]:
+                bible.testaments[test.value].append(book)
+                bible.verses[book] = OrderedDict()
+            books.add(book.lower())
+            chapters = bible.verses[book]
+            added = False
+            for chap_num, chap in other.verses[book].items():
+                added = added or chap_num not in chapters
+                chapters[chap_num] = OrderedDict(chap)
+                replaced.add((book.lower(), chap_num))
+                bible.invalidate(book, chap_num)
+            if added:
+                bible.verses[book] = OrderedDict(sorted(chapters.items()))
+    
+    for warning in list(bible.warnings):
+        if any((str(loc.book).lower(), loc.chapter) in replaced
+                or (loc.chapter <= 0 and str(loc.book).lower() in books)
+                for loc in warning.locs):
+            bible.warnings.discard(warning)
+    bible.warnings.update(other.warnings)
+    _log.info(f"Replaced {len(replaced)} chapters of '{bible.name}' with '{other.name}'")
+    return bible
+
+def changed_verses(bible: Bible, other: Bible) -> T.Dict[str, T.List[Verse.Loc]]:
+    """
+    The verses that update(bible, other) changes: the verses of the chapters
+    of other that aren't in bible ("added") or have another text
+    ("changed"), and the verses of these chapters that other doesn't have
+    ("removed").
+    """
+    res: T.Dict[str, T.List[Verse.Loc]] = { "added": [], "changed": [], "removed": [] }
+    for test in (Testament.old, Testament.new):
+        for book in other.testaments[test.value]:
+            chapters = bible.verses.get(book, {})
+            for chap_num, chap in other.verses[book].items():
+                old = chapters.get(chap_num, {})
+                for verse_num, text in chap.items():
+                    if verse_num not in old:
+                        res["added"].append(Verse.Loc(book, chap_num, verse_num, test))
+                    elif old[verse_num] != text:
+                        res["changed"].append(Verse.Loc(book, chap_num, verse_num, test))
+                for verse_num in old:
+                    if verse_num not in chap:
+                        res["removed"].append(Verse.Loc(book, chap_num, verse_num, test))
+    return res
@@ -0,0 +1,73 @@
+"""
+Provides verse text normalization.
+
+Every source has its own Normalizer (registered by the name of the Bible it
+produces) so that saved Bibles can be re-normalized without re-extracting them.
+"""
+import unicodedata
+import typing as T
+
+from .bible import Bible, CompressedChapter, TEXT_POOL
+
+class Normalizer:
+    """
+    Normalizes verse text in one pass: Unicode normalization, then character
+    mapping (a precompiled str.translate table), then whitespace collapsing.
+    """
+
+    def __init__(self, translate: T.Optional[T.Dict[str, T.Optional[str]]] = None,
+            unicode_form: T.Optional[str] = "NFC",
+            collapse_whitespace: bool = True) -> None:
+        self.translate = dict(translate or {})
+        self.table = str.maketrans(self.translate) if self.translate else None
+        self.unicode_form = unicode_form
+        self.collapse_whitespace = collapse_whitespace
+
+    def __call__(self, text: str) -> str:
+        if self.unicode_form is not None:
+            text = unicodedata.normalize(self.unicode_form, text)
+        if self.table is not None:
+            text = text.translate(self.table)
+        if self.collapse_whitespace:
+            text = " ".join(text.split())
+        return text
+
+    def __repr__(self) -> str:
+        return (f"Normalizer(translate={self.translate!r}, "
+                f"unicode_form={self.unicode_form!r}, "
+                f"collapse_whitespace={self.collapse_whitespace!r})")
+
+DEFAULT_NORMALIZER = Normalizer()
+
+# normalizers for each source, by Bible name
+SOURCES: T.Dict[str, Normalizer] = {}
+
+def register(bible_name: str, normalizer: Normalizer) -> Normalizer:
+    """Register the normalizer of the source that produces bible_name."""
+    SOURCES[bible_name] = normalizer
+    return normalizer
+
+def for_bible(bible_name: str) -> Normalizer:
+    """
+    Return the normalizer of the source that produced bible_name
+    (DEFAULT_NORMALIZER if the source isn't known).
+    """
+    return SOURCES.get(bible_name, DEFAULT_NORMALIZER)
+
+def normalize_bible(bible: Bible,
+        normalizer: T.Optional[Normalizer] = None) -> Bible:
+    """
+    Normalize every verse of bible in place (with the normalizer of its
+    source if normalizer is None).
+    """
+    if normalizer is None:
+        normalizer = for_bible(bible.name)
+    for chapters in bible.verses.values():
+        for chap in chapters.values():
+            # one update recompresses a CompressedChapter once (its texts
+            # are stored in the compressed block, not in TEXT_POOL)
+            intern = str if isinstance(chap, CompressedChapter) else TEXT_POOL.intern
+            chap.update([ (verse_num, intern(normalizer(text)))
+                for verse_num, text in chap.items() ])
+    bible.invalidate()
+    return bible
@@ -2,9 +2,11 @@ import logging
 import typing as T
 
 class ProgressIndicator:
-    def __init__(self, logger: logging.Logger) -> None:
+    def __init__(self, logger: logging.Logger, scheduler=None) -> None:
         self.logger = logger
         self.num_chapters: T.Optional[int] = None
+        # a fetch.Scheduler. If set, its metrics are added to the progress
+        self.scheduler = scheduler
     
     def report_progress(self, done: bool,
             chap_num: int,
@@ -12,7 +14,9 @@ class ProgressIndicator:
         prog_percent = (f"[{chap_num*100 // self.num_chapters:3}%] " 
                 if self.num_chapters is not None else "")
         progress_msg = "[done] " if done else "[starting] "
-        self.logger.info(f"{prog_percent}{progress_msg} {msg}")
+        sched_msg = (f" ({self.scheduler.summary()})" 
+                if self.scheduler is not None else "")
+        self.logger.info(f"{prog_percent}{progress_msg} {msg}{sched_msg}")
             
         
     def starting(self, chap_num: int, msg: str = ""):
@@ -0,0 +1,304 @@
+"""
+Provides a small HTTP server that answers verse lookups from extracted Bibles
+(JSON files) so that other processes can share one copy in memory.
+
+Endpoints (GET, all answers are JSON):
+    /bibles                          the loaded Bibles
+    /verse?ref=Genesis 1:1           one verse
+    /range?ref=Genesis 1:1-5         a chapter (Genesis 1) or a verse range
+    /range?from=Genesis 1:30&to=Genesis 2:3
+    /search?q=light&limit=50         case insensitive text search
+    /batch?ref=...&ref=...           many references (POST a JSON list of up to 1 MiB works too)
+    /metrics                         cache and request counters
+Every lookup takes an optional bible=<name or index> (the first Bible by
+default).
+"""
+from os import path
+import asyncio
+import json
+import time
+import urllib.parse
+import typing as T
+
+import logging
+log = logging.getLogger(__name__)
+
+from . import books
+from .bible import Bible, CaseInsensitiveStr, Verse, CHAPTER_CACHE
+from .books import Reference, parse_reference
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+_REASONS = { 200: "OK", 400: "Bad Request", 404: "Not Found",
+        405: "Method Not Allowed", 413: "Payload Too Large",
+        500: "Internal Server Error" }
+# the largest request body (a /batch of references) that is read
+MAX_BODY = 1 << 20
+
+class BibleFile:
+    """
+    A Bible loaded from a JSON file. The chapters are kept compressed and
+    decoded into CHAPTER_CACHE (the LRU of the server) when they are used.
+    """
+
+    def __init__(self, file_path: str) -> None:
+        with open(file_path, "r") as json_file:
+            data = json.load(json_file)
+        self.path = file_path
+        self.bible = Bible.from_dict(data, compressed=True)
+        self.name = self.bible.name or path.splitext(path.basename(file_path))[0]
+
+    def book(self, name: str) -> str:
+        """Return the name of a book in this Bible (raises HTTPError if there isn't one)."""
+        key = CaseInsensitiveStr(" ".join(name.split()))
+        if key not in self.bible.verses and name in books.DEFAULT:
+            key = CaseInsensitiveStr(books.DEFAULT.resolve(name))
+        for test in self.bible.testaments:
+            for book in test:
+                if book == key:
+                    return str(book)
+        raise HTTPError(404, f"'{self.name}' has no book '{name}'")
+
+    def chapters(self, book: str) -> T.List[int]:
+        return sorted(self.bible.verses[CaseInsensitiveStr(book)].keys())
+
+    def search(self, query: str, limit: int) -> T.Iterator[T.Tuple[str, int, int, str]]:
+        query = query.lower()
+        found = 0
+        for book, chapters in self.bible.verses.items():
+            for chap_num, chap in chapters.items():
+                for verse_num, text in chap.items():
+                    if query in text.lower():
+                        yield str(book), chap_num, verse_num, text
+                        found += 1
+                        if found >= limit:
+                            return
+
+def _verse(book: str, chapter: int, verse: int, text: str) -> T.Dict[str, T.Any]:
+    return { "book": book, "chapter": chapter, "verse": verse, "text": text }
+
+def _verses(verses: T.Iterable[Verse]) -> T.List[T.Dict[str, T.Any]]:
+    return [ _verse(str(v.loc.book), v.loc.chapter, v.loc.verse, v.content) for v in verses ]
+
+class VerseServer:
+
+    def __init__(self, file_paths: T.Iterable[str], cache_size: int = 256) -> None:
+        # the chapters of every Bible are decoded into CHAPTER_CACHE
+        self.cache = CHAPTER_CACHE
+        self.cache.size = cache_size
+        self.bibles: T.List[BibleFile] = []
+        self.start_time = time.monotonic()
+        self.requests: T.Dict[str, int] = {}
+        self.errors = 0
+        for file_path in file_paths:
+            log.info(f"Loading '{file_path}'")
+            self.bibles.append(BibleFile(file_path))
+        if len(self.bibles) == 0:
+            raise ValueError("serve needs at least one Bible file")
+        self.routes: T.Dict[str, T.Callable[..., T.Any]] = {
+                "/bibles": self.list_bibles,
+                "/verse": self.verse,
+                "/range": self.range,
+                "/search": self.search,
+                "/batch": self.batch,
+                "/metrics": self.metrics,
+                }
+
+    def bible(self, query: T.Dict[str, T.List[str]]) -> BibleFile:
+        name = query.get("bible", ["0"])[0]
+        for i, bible in enumerate(self.bibles):
+            if name == str(i) or name.lower() in (bible.name.lower(),
+                    path.basename(bible.path).lower()):
+                return bible
+        raise HTTPError(404, f"Unknown bible '{name}'")
+
+    def lookup(self, bible: BibleFile, ref: Reference,
+            end: T.Optional[Reference] = None) -> T.List[T.Dict[str, T.Any]]:
+        """Return the verses of ref (up to end if it's given)."""
+        book = bible.book(ref.book)
+        if end is None:
+            refs = [ ref ]
+        else:
+            if bible.book(end.book) != book:
+                raise HTTPError(400, "A range has to be in one book")
+            # one reference per chapter, first and last only apply to the
+            # start and end chapters (that the Bible doesn't always have)
+            refs = [ Reference(book, c, ref.first if c == ref.chapter else None,
+                    end.last if c == end.chapter else None)
+                    for c in bible.chapters(book) if ref.chapter <= c <= end.chapter ]
+        res = [ v for verses in bible.bible.get_many(refs).verses for v in _verses(verses) ]
+        if len(res) == 0:
+            raise HTTPError(404, f"'{bible.name}' has no {ref}")
+        return res
+
+    def list_bibles(self, query, body) -> T.Any:
+        return [ { "index": i, "name": b.name, "file": b.path }
+                for i, b in enumerate(self.bibles) ]
+
+    def verse(self, query, body) -> T.Any:
+        ref = _parse_ref(_param(query, "ref"))
+        if ref.first is None or ref.first != ref.last:
+            raise HTTPError(400, f"'{ref}' isn't a single verse (use /range)")
+        bible = self.bible(query)
+        return { "bible": bible.name, "ref": str(ref), "verses": self.lookup(bible, ref) }
+
+    def range(self, query, body) -> T.Any:
+        bible = self.bible(query)
+        if "ref" in query:
+            ref = _parse_ref(_param(query, "ref"))
+            return { "bible": bible.name, "ref": str(ref), "verses": self.lookup(bible, ref) }
+        start = _parse_ref(_param(query, "from"))
+        end = _parse_ref(_param(query, "to"))
+        return { "bible": bible.name, "ref": f"{start}-{end}",
+                "verses": self.lookup(bible, start, end) }
+
+    def search(self, query, body) -> T.Any:
+        bible = self.bible(query)
+        text = _param(query, "q")
+        try:
+            limit = int(query.get("limit", ["50"])[0])
+        except ValueError:
+            raise HTTPError(400, "limit has to be a number") from None
+        return { "bible": bible.name, "query": text,
+                "verses": [ _verse(*v) for v in bible.search(text, limit) ] }
+
+    def batch(self, query, body) -> T.Any:
+        bible = self.bible(query)
+        refs = query.get("ref", [])
+        if body:
+            try:
+                refs = refs + list(json.loads(body.decode("utf-8")))
+            except (ValueError, TypeError):
+                raise HTTPError(400, "The body has to be a JSON list of references") from None
+        refs = [ str(ref) for ref in refs ]
+        lookup = bible.bible.get_many(refs)
+        errors = dict(lookup.missing)
+        results = []
+        for i, (ref, verses) in enumerate(zip(refs, lookup.verses)):
+            if i in errors:
+                results.append({ "ref": ref, "error": errors[i] })
+            else:
+                results.append({ "ref": str(parse_reference(ref)), "verses": _verses(verses) })
+        return { "bible": bible.name, "results": results }
+
+    def metrics(self, query, body) -> T.Any:
+        return {
+                "opens": len(self.bibles),
+                "reads": self.cache.reads,
+                "hits": self.cache.hits,
+                "cached_chapters": len(self.cache),
+                "cache_size": self.cache.size,
+                "requests": dict(self.requests),
+                "errors": self.errors,
+                "uptime": time.monotonic() - self.start_time,
+                }
+
+    def handle(self, method: str, target: str, body: bytes) -> T.Tuple[int, T.Any]:
+        url = urllib.parse.urlsplit(target)
+        query = urllib.parse.parse_qs(url.query)
+        endpoint = url.path.rstrip("/") or "/bibles"
+        # unknown paths share a counter (they're chosen by the clients)
+        counter = endpoint if endpoint in self.routes else "other"
+        self.requests[counter] = self.requests.get(counter, 0) + 1
+        try:
+            if method not in ("GET", "POST"):
+                raise HTTPError(405, f"Method {method} not allowed")
+            try:
+                route = self.routes[endpoint]
+            except KeyError:
+                raise HTTPError(404, f"Unknown endpoint '{url.path}'") from None
+            return 200, route(query, body)
+        except HTTPError as e:
+            self.errors += 1
+            return e.status, { "error": str(e) }
+        except Exception as e:
+            self.errors += 1
+            log.exception(f"{method} {target}")
+            return 500, { "error": str(e) }
+
+    async def _serve_connection(self, reader: asyncio.StreamReader,
+            writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers: T.Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", "0") or "0")
+                keep_alive = (version == "HTTP/1.1"
+                        and headers.get("connection", "").lower() != "close")
+                if length > MAX_BODY:
+                    # the body isn't read, so the connection can't be reused
+                    self.errors += 1
+                    status, obj = 413, { "error": f"The body is larger than {MAX_BODY} bytes" }
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length > 0 else b""
+                    status, obj = self.handle(method, target, body)
+                payload = json.dumps(obj).encode("utf-8")
+                writer.write((f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                    "Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                    "\r\n").encode("latin-1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve(self, host: str, port: int):
+        server = await asyncio.start_server(self._serve_connection, host, port)
+        log.info(f"Serving {', '.join(b.name for b in self.bibles)} on http://{host}:{port}")
+        try:
+            # until cancelled (or interrupted)
+            await asyncio.get_event_loop().create_future()
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    def serve_forever(self, host: str = "127.0.0.1", port: int = 8377):
+        try:
+            if hasattr(asyncio, "run"):
+                asyncio.run(self._serve(host, port))
+            else:
+                # python 3.6
+                loop = asyncio.new_event_loop()
+                try:
+                    loop.run_until_complete(self._serve(host, port))
+                finally:
+                    loop.close()
+        except KeyboardInterrupt:
+            pass
+
+def _param(query: T.Dict[str, T.List[str]], name: str) -> str:
+    try:
+        return query[name][0]
+    except (KeyError, IndexError):
+        raise HTTPError(400, f"Missing parameter '{name}'") from None
+
+def _parse_ref(ref: str) -> Reference:
+    try:
+        return parse_reference(ref)
+    except ValueError as e:
+        raise HTTPError(400, str(e)) from None
+
+def serve(file_paths: T.Iterable[str], host: str = "127.0.0.1", port: int = 8377,
+        cache_size: int = 256):
+    """Serve the Bibles in file_paths until interrupted."""
+    VerseServer(file_paths, cache_size).serve_forever(host, port)
@@ -0,0 +1,187 @@
+"""
+Provides a sharded layout for extracted Bibles: a directory with a manifest
+and one JSON file per book.
+
+manifest.json has the name, the order of the books, the warnings and, for
+every book, its file, testament and SHA-256 checksum. A book file has the
+same format as a book in Bible.to_dict(). Shards are written and read in
+parallel, unchanged shards aren't rewritten and a subset of the books can be
+loaded (and written back) on its own.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from os import path
+import hashlib
+import json
+import os
+import re
+import typing as T
+
+from .bible import *
+from .bible import _chapters_dict
+from . import books as _books
+
+import logging
+log = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+def is_sharded(dir_path: str) -> bool:
+    return path.isfile(path.join(dir_path, MANIFEST))
+
+def shard_file(book: str) -> str:
+    """The file name of a book: Samuel I -> samuel_i.json."""
+    return re.sub(r"[^a-z0-9]+", "_", book.lower()).strip("_") + ".json"
+
+def read_manifest(dir_path: str) -> T.Dict[str, T.Any]:
+    with open(path.join(dir_path, MANIFEST), "r") as manifest_file:
+        return json.load(manifest_file)
+
+def _write_atomic(file_path: str, data: bytes):
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "wb") as out_file:
+        out_file.write(data)
+    os.replace(tmp_path, file_path)
+
+def _warning_books(warning: T.Dict[str, T.Any]) -> T.Set[str]:
+    return { str(l[0]).lower() for l in warning["locs"] }
+
+def select_books(manifest: T.Dict[str, T.Any],
+        names: T.Optional[T.Iterable[str]]) -> T.List[str]:
+    """
+    Return the books of the manifest (in order) that are in names (all of them
+    if names is None). Names are matched case insensitively and then with
+    the default book registry.
+    """
+    all_books = manifest["order"]["old"] + manifest["order"]["new"]
+    if names is None:
+        return all_books
+    by_name = { b.lower(): b for b in all_books }
+    by_canonical = { _books.DEFAULT.resolve(b).lower(): b
+            for b in all_books if b in _books.DEFAULT }
+    selected = set()
+    for name in names:
+        key = " ".join(name.lower().split())
+        if key in by_name:
+            selected.add(by_name[key])
+        elif name in _books.DEFAULT and _books.DEFAULT.resolve(name).lower() in by_canonical:
+            selected.add(by_canonical[_books.DEFAULT.resolve(name).lower()])
+        else:
+            log.warning(f"There is no book '{name}' in '{manifest.get('name', '')}'")
+    return [ b for b in all_books if b in selected ]
+
+def read_sharded(dir_path: str, books: T.Optional[T.Iterable[str]] = None,
+        verify: bool = True, workers: int = 8, compressed: bool = False) -> Bible:
+    """
+    Load a sharded Bible (only the books in books if it isn't None). Raises
+    ValueError if a shard doesn't match its checksum (and verify is True).
+    If compressed is True, the chapters are CompressedChapters.
+    """
+    manifest = read_manifest(dir_path)
+    selected = select_books(manifest, books)
+
+    def read_one(book: str) -> T.Dict[str, T.Dict[str, str]]:
+        entry = manifest["shards"][book]
+        with open(path.join(dir_path, entry["file"]), "rb") as shard:
+            data = shard.read()
+        if verify and hashlib.sha256(data).hexdigest() != entry["sha256"]:
+            raise ValueError(f"Shard '{entry['file']}' doesn't match its checksum")
+        return json.loads(data.decode("utf-8"))
+
+    with ThreadPoolExecutor(workers) as executor:
+        loaded = list(executor.map(read_one, selected))
+
+    bible = Bible(name=manifest.get("name", ""))
+    for book, chapters in zip(selected, loaded):
+        test = Testament[manifest["shards"][book]["testament"]]
+        bible.testaments[test.value].append(CaseInsensitiveStr(book))
+        make_chapter = CompressedChapter if compressed else OrderedDict
+        intern = str if compressed else TEXT_POOL.intern
+        bible.verses[CaseInsensitiveStr(book)] = OrderedDict(
+                (int(chap_num), make_chapter(
+                    (int(verse_num), intern(text))
+                    for verse_num, text in chap.items()))
+                for chap_num, chap in chapters.items())
+
+    lower_selected = { b.lower() for b in selected }
+    for warning in manifest.get("warnings", []):
+        if books is not None and not (_warning_books(warning) & lower_selected):
+            continue
+        locs = tuple(Verse.Loc(l[0], l[1], l[2], Testament(l[3])) for l in warning["locs"])
+        bible.warnings.add(BibleWarning(locs, warning["text"], warning.get("type", "")))
+    log.info(f"Loaded {len(selected)} of {len(manifest['shards'])} books from '{dir_path}'")
+    return bible
+
+def write_sharded(bible: Bible, dir_path: str, partial: bool = False,
+        workers: int = 8) -> int:
+    """
+    Write bible to dir_path and return the number of shards that were
+    (re)written. Shards whose checksum didn't change are left alone.
+    If partial is True, bible only has some of the books of dir_path and the
+    other books (and their warnings) are kept. Otherwise the shards of
+    books that aren't in bible are deleted.
+    """
+    os.makedirs(dir_path, exist_ok=True)
+    try:
+        old = read_manifest(dir_path)
+    except (OSError, ValueError):
+        old = { "order": { "old": [], "new": [] }, "shards": {}, "warnings": [] }
+
+    def write_one(book: CaseInsensitiveStr, test: Testament) -> T.Tuple[T.Dict[str, T.Any], bool]:
+        data = json.dumps(_chapters_dict(bible.verses[book]), indent=2).encode("utf-8")
+        entry = { "file": shard_file(book), "testament": test.name,
+                "sha256": hashlib.sha256(data).hexdigest() }
+        prev = old["shards"].get(str(book))
+        file_path = path.join(dir_path, entry["file"])
+        if prev == entry and path.isfile(file_path):
+            return entry, False
+        _write_atomic(file_path, data)
+        return entry, True
+
+    jobs = [ (book, test) for test in (Testament.old, Testament.new)
+            for book in bible.testaments[test.value] ]
+    with ThreadPoolExecutor(workers) as executor:
+        results = list(executor.map(lambda job: write_one(*job), jobs))
+
+    shards = OrderedDict((str(book), entry) for (book, _), (entry, _) in zip(jobs, results))
+    order = { test.name: [ str(b) for b in bible.testaments[test.value] ]
+            for test in (Testament.old, Testament.new) }
+    warnings = [ w.to_dict() for w in bible.warnings ]
+    written = sum(1 for _, changed in results if changed)
+
+    written_lower = { b.lower() for b in shards.keys() }
+    if partial:
+        # keep the other books where they were
+        for test_name in ("old", "new"):
+            merged_order = []
+            for book in old["order"][test_name]:
+                if book.lower() not in written_lower:
+                    merged_order.append(book)
+                    shards[book] = old["shards"][book]
+                elif book in order[test_name]:
+                    merged_order.append(book)
+            merged_order += [ b for b in order[test_name] if b not in merged_order ]
+            order[test_name] = merged_order
+        warnings += [ w for w in old.get("warnings", [])
+                if not (_warning_books(w) & written_lower) ]
+    else:
+        files = { entry["file"] for entry in shards.values() }
+        for entry in old["shards"].values():
+            if entry["file"] not in files:
+                try:
+                    os.remove(path.join(dir_path, entry["file"]))
+                except OSError:
+                    pass
+
+    manifest = {
+            "format_version": FORMAT_VERSION,
+            "name": bible.name,
+            "order": order,
+            "shards": shards,
+            "warnings": warnings,
+            }
+    _write_atomic(path.join(dir_path, MANIFEST),
+            json.dumps(manifest, indent=2).encode("utf-8"))
+    log.info(f"Wrote {written} of {len(jobs)} shards to '{dir_path}'")
+    return written
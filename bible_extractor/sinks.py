@@ -0,0 +1,365 @@
+"""
+Provides sinks: what extractors emit a Bible into.
+
+An extractor calls, in order:
+
+    sink.start(name)
+    sink.book(name, testament)          then the chapters (or verses) of the book
+    sink.chapter(num, [ (verse, text), ... ])
+    sink.verse(chapter, verse, text)
+    sink.warn(locs, text, type)         or sink.warning(BibleWarning)
+    sink.finish()                       returns the result of the sink
+
+bible.BibleBuilder is the in memory sink (and the default of every
+extractor). The sinks here write to disk (JsonSink, SQLiteSink and
+ColumnarSink) or look at everything and pass it on to the next sink
+(StatsSink and ValidationSink), so they can be chained:
+
+    sink = StatsSink(ValidationSink(JsonSink("output.json")))
+    extract(url, sink=sink)
+
+A sink only keeps the current book: it's written (or checked) when the next
+book starts. So a book has to be emitted in one go and, for JsonSink, the old
+testament has to come before the new testament.
+"""
+from array import array
+from collections import OrderedDict
+import json
+import os
+import sqlite3
+import typing as T
+
+from .bible import *
+from .stats import BibleStats
+from . import export
+from . import validate
+
+import logging
+log = logging.getLogger(__name__)
+
+_TEST_NAMES = ("old", "new")
+
+class Sink:
+    """
+    The base class of sinks. Everything is passed on to next (if it isn't
+    None) and subclasses get every book once it's complete (write_book),
+    every warning (add_warning) and the end of the Bible (end).
+    """
+
+    def __init__(self, next: T.Optional[T.Any] = None) -> None:
+        self.next = next
+        self.name = ""
+        self._book: T.Optional[str] = None
+        self._test = Testament.unknown
+        self._chapters: T.Dict[int, T.Dict[int, str]] = OrderedDict()
+        self._done: T.Set[str] = set()
+
+    def start(self, name: str):
+        self.name = name
+        if self.next is not None:
+            self.next.start(name)
+
+    def book(self, name: str, test: Testament):
+        if self._book is None or name.lower() != self._book.lower():
+            self._end_book()
+            if name.lower() in self._done:
+                raise BibleInconsistentError(f"{name}: a book has to be emitted in one go")
+            self._book = name
+            self._test = test
+        elif test != self._test:
+            raise BibleInconsistentError(f"{name}: a book cannot be in both testaments")
+        if self.next is not None:
+            self.next.book(name, test)
+
+    def chapter(self, num: int, verses: T.Iterable[T.Tuple[int, str]]):
+        verses = list(verses)
+        chap = self._chapters.get(num)
+        if chap is None:
+            chap = self._chapters[num] = OrderedDict()
+        chap.update(verses)
+        if self.next is not None:
+            self.next.chapter(num, verses)
+
+    def verse(self, chapter: int, verse: int, text: str):
+        chap = self._chapters.get(chapter)
+        if chap is None:
+            chap = self._chapters[chapter] = OrderedDict()
+        chap[verse] = text
+        if self.next is not None:
+            self.next.verse(chapter, verse, text)
+
+    def warn(self, locs: T.Union[Verse.Loc, T.Iterable[Verse.Loc]], text: str,
+            type: str = ""):
+        if isinstance(locs, Verse.Loc):
+            locs = (locs, )
+        locs = tuple(Verse.Loc(str(l[0]), int(l[1]), int(l[2]), Testament(l[3]))
+                for l in locs)
+        log.warning(f"{str(locs[0])}: {text}")
+        self.warning(BibleWarning(locs, text, type))
+
+    def warning(self, warning: BibleWarning):
+        self.add_warning(warning)
+        if self.next is not None:
+            self.next.warning(warning)
+
+    def finish(self) -> T.Any:
+        """End the Bible and return the result of the last sink of the chain."""
+        self._end_book()
+        result = self.end()
+        if self.next is not None:
+            return self.next.finish()
+        return result
+
+    def _end_book(self):
+        if self._book is None:
+            return
+        # like BibleBuilder, books without verses are left out
+        if len(self._chapters) > 0:
+            if self._test == Testament.unknown:
+                raise BibleInconsistentError(f"{self._book}: a book has to be in one of the testaments")
+            self.write_book(self._book, self._test, self._chapters)
+        self._done.add(self._book.lower())
+        self._book = None
+        self._chapters = OrderedDict()
+
+    def write_book(self, name: str, test: Testament,
+            chapters: T.Dict[int, T.Dict[int, str]]):
+        pass
+
+    def add_warning(self, warning: BibleWarning):
+        pass
+
+    def end(self) -> T.Any:
+        return None
+
+def feed(bible: Bible, sink: T.Any) -> T.Any:
+    """Emit bible into sink and return sink.finish()."""
+    sink.start(bible.name)
+    for test in (Testament.old, Testament.new):
+        for book in bible.testaments[test.value]:
+            sink.book(str(book), test)
+            for chap_num, chap in bible.verses[book].items():
+                sink.chapter(chap_num, chap.items())
+    for warning in bible.warnings:
+        sink.warning(warning)
+    return sink.finish()
+
+class JsonSink(Sink):
+    """
+    Writes the JSON output (the format of Bible.to_dict()) one book at a time.
+    The file is written next to file_path and moved there by finish().
+    """
+
+    def __init__(self, file_path: str, next: T.Optional[T.Any] = None) -> None:
+        super().__init__(next)
+        self.file_path = file_path
+        self._file: T.Optional[T.TextIO] = None
+        self._open_test = -1
+        self._has_books = False
+        self._order: T.List[T.List[str]] = [[], []]
+        self._fingerprints: T.Dict[str, T.Any] = OrderedDict()
+        self._warnings = WarningStore()
+
+    def _begin(self):
+        if self._file is None:
+            self._file = open(self.file_path + ".tmp", "w", encoding="utf-8")
+            self._file.write('{\n  "name": ' + json.dumps(self.name) + ',\n  "testaments": {')
+
+    def _close_testament(self):
+        self._file.write("\n    }" if self._has_books else "}")
+
+    def _next_testament(self):
+        if self._open_test >= 0:
+            self._close_testament()
+            self._file.write(",")
+        self._open_test += 1
+        self._file.write(f'\n    "{_TEST_NAMES[self._open_test]}": {{')
+        self._has_books = False
+
+    def write_book(self, name, test, chapters):
+        if test.value < self._open_test:
+            raise BibleInconsistentError(
+                    f"{name}: the old testament has to come before the new testament")
+        self._begin()
+        while self._open_test < test.value:
+            self._next_testament()
+        self._file.write(("," if self._has_books else "") + "\n      " + json.dumps(name)
+                + ": " + json.dumps(chapters, indent=2).replace("\n", "\n      "))
+        self._has_books = True
+
+        chap_hashes = OrderedDict((c, chapter_hash(chap)) for c, chap in chapters.items())
+        self._fingerprints[name] = {
+                "hash": book_hash(chap_hashes),
+                "chapters": { str(c): h for c, h in chap_hashes.items() },
+                }
+        self._order[test.value].append(name)
+
+    def add_warning(self, warning):
+        self._warnings.add(warning)
+
+    def end(self):
+        self._begin()
+        while self._open_test < Testament.new.value:
+            self._next_testament()
+        self._close_testament()
+        self._file.write("\n  },\n")
+        tail = [
+                ("order", { name: self._order[i] for i, name in enumerate(_TEST_NAMES) }),
+                ("warnings", [ w.to_dict() for w in self._warnings ]),
+                ("fingerprints", {
+                    "root": root_hash(
+                        [ (b, self._fingerprints[b]["hash"]) for b in books ]
+                        for books in self._order),
+                    "books": self._fingerprints,
+                    }),
+                ]
+        for i, (key, value) in enumerate(tail):
+            self._file.write(f'  "{key}": ' + json.dumps(value, indent=2).replace("\n", "\n  ")
+                    + (",\n" if i < len(tail) - 1 else "\n"))
+        self._file.write("}")
+        self._file.close()
+        os.replace(self.file_path + ".tmp", self.file_path)
+        log.info(f"Wrote '{self.name}' to '{self.file_path}'")
+
+class SQLiteSink(Sink):
+    """
+    Writes to an SQLite database (replacing it if replace is True) with the
+    tables versions, books, verses and warnings. Every book is committed when
+    it's complete. Several Bibles can be written to one database (as
+    different versions).
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS versions (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS books (
+        version INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        testament INTEGER NOT NULL,
+        PRIMARY KEY (version, position));
+    CREATE TABLE IF NOT EXISTS verses (
+        version INTEGER NOT NULL,
+        book INTEGER NOT NULL,
+        chapter INTEGER NOT NULL,
+        verse INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        PRIMARY KEY (version, book, chapter, verse));
+    CREATE TABLE IF NOT EXISTS warnings (
+        version INTEGER NOT NULL,
+        locs TEXT NOT NULL,
+        text TEXT NOT NULL,
+        type TEXT NOT NULL);
+    """
+
+    def __init__(self, file_path: str, next: T.Optional[T.Any] = None,
+            replace: bool = True) -> None:
+        super().__init__(next)
+        self.file_path = file_path
+        if replace and os.path.exists(file_path):
+            os.remove(file_path)
+        self._db = sqlite3.connect(file_path)
+        self._db.executescript(self.SCHEMA)
+        self._version: T.Optional[int] = None
+        self._position = 0
+        self._warnings = WarningStore()
+
+    def _version_id(self) -> int:
+        if self._version is None:
+            self._version = self._db.execute("INSERT INTO versions (name) VALUES (?)",
+                    (self.name, )).lastrowid
+        return self._version
+
+    def write_book(self, name, test, chapters):
+        version = self._version_id()
+        position = self._position
+        self._position += 1
+        with self._db:
+            self._db.execute("INSERT INTO books VALUES (?, ?, ?, ?)",
+                    (version, position, name, test.value))
+            self._db.executemany("INSERT INTO verses VALUES (?, ?, ?, ?, ?)",
+                    ((version, position, chap_num, verse_num, text)
+                        for chap_num, chap in chapters.items()
+                        for verse_num, text in chap.items()))
+
+    def add_warning(self, warning):
+        self._warnings.add(warning)
+
+    def end(self):
+        version = self._version_id()
+        with self._db:
+            self._db.executemany("INSERT INTO warnings VALUES (?, ?, ?, ?)",
+                    ((version, json.dumps(w.to_dict()["locs"]), w.text, w.type)
+                        for w in self._warnings))
+        self._db.close()
+        log.info(f"Wrote '{self.name}' to '{self.file_path}'")
+
+class ColumnarSink(Sink):
+    """Writes the COLUMNAR format (see export.py). Warnings aren't written."""
+
+    def __init__(self, file_path: str, next: T.Optional[T.Any] = None) -> None:
+        super().__init__(next)
+        self._writer = export.ColumnarWriter(file_path)
+        self._version: T.Optional[int] = None
+
+    def write_book(self, name, test, chapters):
+        if self._version is None:
+            self._version = self._writer.version(self.name)
+        chap_col = array("H")
+        verse_col = array("H")
+        texts: T.List[str] = []
+        for chap_num, chap in chapters.items():
+            chap_col.extend([chap_num] * len(chap))
+            verse_col.extend(chap.keys())
+            texts.extend(chap.values())
+        self._writer.add(export.BookBatch(self._version, name, test,
+            chap_col, verse_col, texts))
+
+    def end(self):
+        if self._version is None:
+            self._writer.version(self.name)
+        self._writer.close()
+        log.info(f"Wrote '{self.name}' to '{self._writer.file_path}'")
+
+class StatsSink(Sink):
+    """Collects the statistics of stats.get_bible_stats() in stats."""
+
+    def __init__(self, next: T.Optional[T.Any] = None) -> None:
+        super().__init__(next)
+        self.stats = BibleStats()
+        self.stats.num_verses_per_chapter = { name: {} for name in _TEST_NAMES }
+        self._warnings = WarningStore()
+
+    def write_book(self, name, test, chapters):
+        self.stats.num_books[test.value] += 1
+        self.stats.num_verses_per_chapter[_TEST_NAMES[test.value]][name] = {
+                chap_num: len(chap) for chap_num, chap in chapters.items() }
+
+    def add_warning(self, warning):
+        self._warnings.add(warning)
+        self.stats.num_warnings = len(self._warnings)
+
+    def end(self):
+        return self.stats
+
+class ValidationSink(Sink):
+    """Validates every book (see validate.py) and passes the warnings on."""
+
+    def __init__(self, next: T.Optional[T.Any] = None,
+            validator: validate.Validator = validate.DEFAULT_VALIDATOR) -> None:
+        super().__init__(next)
+        self.validator = validator
+        self.found: T.List[BibleWarning] = []
+
+    def write_book(self, name, test, chapters):
+        rows = [ (chap_num, verse_num, text)
+                for chap_num, chap in chapters.items()
+                for verse_num, text in chap.items() ]
+        for warning in self.validator.validate_book(name, test, rows):
+            self.found.append(warning)
+            self.warning(warning)
+
+    def end(self):
+        log.info(f"'{self.name}': {len(self.found)} warnings from validation")
+        return self.found
@@ -1,7 +1,12 @@
-from collections import defaultdict
+from array import array
+from collections import Counter, defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor
+import bisect
+import heapq
+import re
 import typing as T
 
-from .bible import Bible, Verse, Testament
+from .bible import Bible, Verse, Testament, verse_id, _VERSE_ID_STRIDE
 
 class BibleStats:
     _ATTRIBUTES = set("num_books,num_verses_per_chapter,num_warnings"
@@ -29,9 +34,173 @@ def get_bible_stats(bible: Bible) -> BibleStats:
             stats.num_books[test.value] += 1
             
             for chap_num, chap in bible.verses[book].items():
-                stats.num_verses_per_chapter[test_name][book][chap_num] = 0
-                
-                for _ in chap.items():
-                    stats.num_verses_per_chapter[test_name][book][chap_num] += 1
+                # len doesn't decompress CompressedChapters
+                stats.num_verses_per_chapter[test_name][book][chap_num] = len(chap)
     stats.num_warnings = len(bible.warnings)
     return stats
+
+_WORD_REGEX = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)*")
+# the global verse IDs of TextStats: book index << _BOOK_SHIFT | verse_id
+_BOOK_SHIFT = 20
+
+def tokenize(text: str) -> T.List[str]:
+    """The (lower case) words of text."""
+    return _WORD_REGEX.findall(text.lower())
+
+_BookPart = T.Tuple[T.Dict[str, int], T.Dict[T.Tuple[str, str], int], T.Dict[str, T.List[int]]]
+
+def _book_text_stats(args: T.Tuple[int, T.List[T.Tuple[int, int, str]]]) -> _BookPart:
+    """The word counts, bigram counts and postings of one book."""
+    book_idx, rows = args
+    # Counter.update counts in C
+    counts: T.Dict[str, int] = Counter()
+    bigrams: T.Dict[T.Tuple[str, str], int] = Counter()
+    postings: T.Dict[str, T.List[int]] = defaultdict(list)
+    book_bits = book_idx << _BOOK_SHIFT
+    findall = _WORD_REGEX.findall
+    for chap_num, verse_num, text in rows:
+        words = findall(text.lower())
+        vid = book_bits | verse_id(chap_num, verse_num)
+        counts.update(words)
+        bigrams.update(zip(words, words[1:]))
+        for word in set(words):
+            postings[word].append(vid)
+    return dict(counts), dict(bigrams), dict(postings)
+
+class TextStats:
+    """
+    Word statistics of a Bible, stored in sorted arrays:
+        words           the vocabulary (sorted), a word is its index
+        counts          the number of times every word is used
+        offsets         the concordance: the (sorted) verse IDs of word i are
+        verse_ids           verse_ids[offsets[i]:offsets[i+1]]
+        bigram_keys     the sorted bigrams (i * len(words) + j)
+        bigram_counts   and their counts
+        book_words      the sorted words of every book
+        book_counts     and their counts in the book
+    Verse IDs are book index << 20 | verse_id(chapter, verse), see location().
+    """
+    
+    def __init__(self, books: T.List[str], parts: T.List[_BookPart]) -> None:
+        self.books = books
+        total: T.Dict[str, int] = defaultdict(int)
+        for counts, _, _ in parts:
+            for word, count in counts.items():
+                total[word] += count
+        self.words = sorted(total)
+        index = { word: i for i, word in enumerate(self.words) }
+        self.counts = array("I", (total[w] for w in self.words))
+        self.num_tokens = sum(self.counts)
+        
+        # parts are in book order, so the IDs of a word only need sorting per book
+        postings: T.Dict[str, T.List[int]] = defaultdict(list)
+        for _, _, book_postings in parts:
+            for word, ids in book_postings.items():
+                postings[word] += sorted(ids)
+        self.offsets = array("I", [0])
+        self.verse_ids = array("I")
+        for word in self.words:
+            self.verse_ids.extend(postings[word])
+            self.offsets.append(len(self.verse_ids))
+        
+        size = len(self.words)
+        bigrams: T.Dict[int, int] = defaultdict(int)
+        for _, book_bigrams, _ in parts:
+            for (w1, w2), count in book_bigrams.items():
+                bigrams[index[w1] * size + index[w2]] += count
+        keys = sorted(bigrams)
+        self.bigram_keys = array("Q", keys)
+        self.bigram_counts = array("I", (bigrams[k] for k in keys))
+        
+        self.book_words: T.List[array] = []
+        self.book_counts: T.List[array] = []
+        for counts, _, _ in parts:
+            ids = sorted(index[w] for w in counts)
+            self.book_words.append(array("I", ids))
+            self.book_counts.append(array("I", (counts[self.words[i]] for i in ids)))
+    
+    def index(self, word: str) -> T.Optional[int]:
+        word = word.lower()
+        i = bisect.bisect_left(self.words, word)
+        return i if i < len(self.words) and self.words[i] == word else None
+    
+    def count(self, word: str) -> int:
+        i = self.index(word)
+        return 0 if i is None else self.counts[i]
+    
+    def verses(self, word: str) -> array:
+        """The verse IDs of the verses that use word (see location())."""
+        i = self.index(word)
+        if i is None:
+            return array("I")
+        return self.verse_ids[self.offsets[i]:self.offsets[i + 1]]
+    
+    def location(self, vid: int) -> T.Tuple[str, int, int]:
+        """The (book, chapter, verse) of a verse ID."""
+        chapter, verse = divmod(vid & ((1 << _BOOK_SHIFT) - 1), _VERSE_ID_STRIDE)
+        return self.books[vid >> _BOOK_SHIFT], chapter, verse
+    
+    def concordance(self, word: str) -> T.List[T.Tuple[str, int, int]]:
+        return [ self.location(vid) for vid in self.verses(word) ]
+    
+    def bigram_count(self, first: str, second: str) -> int:
+        i, j = self.index(first), self.index(second)
+        if i is None or j is None:
+            return 0
+        key = i * len(self.words) + j
+        pos = bisect.bisect_left(self.bigram_keys, key)
+        if pos < len(self.bigram_keys) and self.bigram_keys[pos] == key:
+            return self.bigram_counts[pos]
+        return 0
+    
+    def vocabulary(self, book: str) -> T.Dict[str, int]:
+        """The words of book and their counts."""
+        b = next(i for i, name in enumerate(self.books) if name.lower() == book.lower())
+        return { self.words[i]: c for i, c in zip(self.book_words[b], self.book_counts[b]) }
+    
+    def most_common(self, n: int) -> T.List[T.Tuple[str, int]]:
+        top = heapq.nlargest(n, range(len(self.words)), key=self.counts.__getitem__)
+        return [ (self.words[i], self.counts[i]) for i in top ]
+    
+    def most_common_bigrams(self, n: int) -> T.List[T.Tuple[str, str, int]]:
+        size = len(self.words)
+        top = heapq.nlargest(n, range(len(self.bigram_keys)), key=self.bigram_counts.__getitem__)
+        return [ (self.words[self.bigram_keys[i] // size], self.words[self.bigram_keys[i] % size],
+            self.bigram_counts[i]) for i in top ]
+    
+    def to_dict(self, top: int = 100) -> T.Dict[str, T.Any]:
+        """A summary (the concordance is only available from the Python API)."""
+        return {
+                "tokens": self.num_tokens,
+                "vocabulary": len(self.words),
+                "bigrams": len(self.bigram_keys),
+                "top_words": self.most_common(top),
+                "top_bigrams": [ [f"{w1} {w2}", c] for w1, w2, c in self.most_common_bigrams(top) ],
+                "books": { book: { "tokens": sum(self.book_counts[i]),
+                    "vocabulary": len(self.book_words[i]) }
+                    for i, book in enumerate(self.books) },
+                }
+
+def get_text_stats(bible: Bible, processes: int = 1,
+        executor: T.Optional[Executor] = None) -> TextStats:
+    """
+    Tokenize bible (one book per job, in executor or in a process pool with
+    more than one process) and merge the counts into a TextStats.
+    """
+    books: T.List[str] = []
+    jobs = []
+    for test in (Testament.old, Testament.new):
+        for book in bible.testaments[test.value]:
+            rows = [ (chap_num, verse_num, text)
+                    for chap_num, chap in bible.verses[book].items()
+                    for verse_num, text in chap.items() ]
+            jobs.append((len(books), rows))
+            books.append(str(book))
+    if executor is not None and len(jobs) > 1:
+        parts = list(executor.map(_book_text_stats, jobs, chunksize=4))
+    elif processes > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(processes) as executor:
+            parts = list(executor.map(_book_text_stats, jobs, chunksize=4))
+    else:
+        parts = [ _book_text_stats(job) for job in jobs ]
+    return TextStats(books, parts)
@@ -0,0 +1,215 @@
+"""
+Provides Bible validation.
+
+A Validator runs a list of rules over every book in one pass. Each book is
+flattened to (chapter, verse, text) rows, and every rule sees the rows in
+order (start_book, verse for every row, end_book). Rules return warnings as
+(locations, text, type) with the types in warnings.py.
+
+Rules only see one book at a time, so books can be validated in separate
+processes.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import copy
+import re
+import typing as T
+
+from .bible import *
+from . import books
+from . import warnings as warn
+
+import logging
+log = logging.getLogger(__name__)
+
+Row = T.Tuple[int, int, str]
+Found = T.Tuple[T.Tuple[T.Tuple[int, int], ...], str, str]
+
+class Rule:
+    """The base class of validation rules."""
+
+    def start_book(self, book: str):
+        pass
+
+    def verse(self, chapter: int, verse: int, text: str) -> T.Iterable[Found]:
+        return ()
+
+    def end_book(self) -> T.Iterable[Found]:
+        return ()
+
+class LengthRule(Rule):
+    """Verses shorter than min_length (but not empty) or longer than max_length."""
+
+    def __init__(self, min_length: int = 10, max_length: T.Optional[int] = None) -> None:
+        self.min_length = min_length
+        self.max_length = max_length
+
+    def verse(self, chapter, verse, text):
+        if 0 < len(text) < self.min_length:
+            yield (((chapter, verse),), f"Verse is small ({len(text)} characters)",
+                    warn.short_verse)
+        elif self.max_length is not None and len(text) > self.max_length:
+            yield (((chapter, verse),), f"Verse is long ({len(text)} characters)",
+                    warn.long_verse)
+
+class EmptyRule(Rule):
+    """Verses with no text."""
+
+    def verse(self, chapter, verse, text):
+        if text.strip() == "":
+            yield (((chapter, verse),), "Verse is empty", warn.empty_verse)
+
+class GapRule(Rule):
+    """Missing verse numbers in a chapter and missing chapter numbers in a book."""
+
+    def start_book(self, book):
+        self.chapters: T.Dict[int, T.Set[int]] = {}
+
+    def verse(self, chapter, verse, text):
+        self.chapters.setdefault(chapter, set()).add(verse)
+        return ()
+
+    def end_book(self):
+        chap_nums = set(self.chapters.keys())
+        missing_chaps = sorted(set(range(1, max(chap_nums, default=0) + 1)) - chap_nums)
+        if missing_chaps:
+            yield (tuple((c, 0) for c in missing_chaps),
+                    f"Missing chapters {', '.join(map(str, missing_chaps))}",
+                    warn.chapter_gap)
+        for chap_num in sorted(chap_nums):
+            verses = self.chapters[chap_num]
+            missing = sorted(set(range(1, max(verses) + 1)) - verses)
+            if missing:
+                yield (tuple((chap_num, v) for v in missing),
+                        f"Missing verses {', '.join(map(str, missing))}",
+                        warn.verse_gap)
+
+class DuplicateRule(Rule):
+    """
+    Verses that have the same text (ignoring case and whitespace) as an
+    earlier verse of the same book. Verses shorter than min_length are ignored.
+    """
+
+    def __init__(self, min_length: int = 20) -> None:
+        self.min_length = min_length
+
+    def start_book(self, book):
+        self.seen: T.Dict[str, T.Tuple[int, int]] = {}
+
+    def verse(self, chapter, verse, text):
+        if len(text) < self.min_length:
+            return
+        key = " ".join(text.lower().split())
+        first = self.seen.setdefault(key, (chapter, verse))
+        if first != (chapter, verse):
+            yield ((first, (chapter, verse)),
+                    f"Same text as {first[0]}:{first[1]}", warn.duplicate_verse)
+
+class CharacterRule(Rule):
+    """
+    Verses with unexpected characters (by default control characters, the
+    Unicode replacement character and left over HTML).
+    """
+
+    DEFAULT_PATTERN = r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f\ufffd<>]|&#?\w+;"
+
+    def __init__(self, pattern: str = DEFAULT_PATTERN) -> None:
+        self.pattern = re.compile(pattern)
+
+    def verse(self, chapter, verse, text):
+        found = self.pattern.findall(text)
+        if found:
+            chars = ", ".join(repr(c) for c in sorted(set(found)))
+            yield (((chapter, verse),), f"Unexpected characters {chars}",
+                    warn.unexpected_character)
+
+class ChapterCountRule(Rule):
+    """
+    Books that don't have as many chapters as in the reference versification
+    (books.CHAPTER_COUNTS by default). Book names are resolved with registry
+    and books that aren't in the reference are skipped.
+    """
+
+    def __init__(self, reference: T.Optional[T.Dict[str, int]] = None,
+            registry: books.BookRegistry = books.DEFAULT) -> None:
+        self.reference = books.CHAPTER_COUNTS if reference is None else reference
+        self.registry = registry
+
+    def start_book(self, book):
+        self.expected = None
+        if book in self.registry:
+            self.expected = self.reference.get(self.registry.resolve(book))
+        self.chapters: T.Set[int] = set()
+
+    def verse(self, chapter, verse, text):
+        self.chapters.add(chapter)
+        return ()
+
+    def end_book(self):
+        if self.expected is not None and len(self.chapters) != self.expected:
+            yield (((0, 0),), f"Has {len(self.chapters)} chapters "
+                    f"(expected {self.expected})", warn.chapter_count)
+
+def default_rules() -> T.List[Rule]:
+    return [ LengthRule(), EmptyRule(), GapRule(), DuplicateRule(),
+            CharacterRule(), ChapterCountRule() ]
+
+def _validate_book(args: T.Tuple[T.List[Rule], str, int, T.List[Row]]) -> T.List[BibleWarning]:
+    rules, book, test_value, rows = args
+    # rules keep the state of a book: copies, so that threads (e.g. the
+    # sources of the CLI) can validate books at the same time
+    rules = [ copy.copy(rule) for rule in rules ]
+    test = Testament(test_value)
+    found: T.List[Found] = []
+    for rule in rules:
+        rule.start_book(book)
+    for chapter, verse, text in rows:
+        for rule in rules:
+            found.extend(rule.verse(chapter, verse, text))
+    for rule in rules:
+        found.extend(rule.end_book())
+    return [ BibleWarning(tuple(Verse.Loc(book, c, v, test) for c, v in locs), text, type)
+            for locs, text, type in found ]
+
+class Validator:
+
+    def __init__(self, rules: T.Optional[T.Iterable[Rule]] = None) -> None:
+        self.rules = default_rules() if rules is None else list(rules)
+
+    def validate_book(self, book: str, test: Testament, rows: T.Iterable[Row]
+            ) -> T.List[BibleWarning]:
+        """Return the warnings of every rule for one book ((chapter, verse, text) rows)."""
+        return _validate_book((self.rules, book, test.value, rows))
+
+    def validate(self, bible: Bible, processes: int = 1) -> T.List[BibleWarning]:
+        """
+        Return the warnings of every rule (in book order). With more than one
+        process, books are validated in a process pool.
+        """
+        jobs = []
+        for test in (Testament.old, Testament.new):
+            for book in bible.testaments[test.value]:
+                rows = [ (chap_num, verse_num, text)
+                        for chap_num, chap in bible.verses[book].items()
+                        for verse_num, text in chap.items() ]
+                jobs.append((self.rules, str(book), test.value, rows))
+
+        if processes > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(processes) as executor:
+                results = list(executor.map(_validate_book, jobs))
+        else:
+            results = [ _validate_book(job) for job in jobs ]
+        return [ w for book_warnings in results for w in book_warnings ]
+
+DEFAULT_VALIDATOR = Validator()
+
+def validate(bible: Bible, validator: Validator = DEFAULT_VALIDATOR,
+        processes: int = 1) -> T.List[BibleWarning]:
+    """Validate bible and add the warnings to bible.warnings."""
+    found = validator.validate(bible, processes)
+    bible.warnings.update(found)
+    counts: T.Dict[str, int] = {}
+    for warning in found:
+        counts[warning.type] = counts.get(warning.type, 0) + 1
+    log.info(f"'{bible.name}': {len(found)} warnings" + "".join(
+        f", {n} {type}" for type, n in sorted(counts.items())))
+    return found
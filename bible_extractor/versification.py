@@ -0,0 +1,241 @@
+"""
+Provides declarative versification mappings.
+
+A mapping is a list of rules loaded from a JSON file (see mappings/):
+
+    {
+        "description": "...",
+        "rules": [
+            { "move": "Susanna 1", "to": "Daniel 13" },
+            { "move": "Daniel 3:23-", "to": "Daniel 3:91" },
+            { "merge": "Prayer of Azarias 1:28-29", "to": "Daniel 3:52" },
+            { "split": "Esther 1:1", "at": "(?<=\\\\.) ", "to": "Esther 1:1" }
+        ]
+    }
+
+move: moves a verse range (or a whole chapter) so that its first verse
+      lands on the target. The gaps in the range are kept.
+merge: joins the verses of a range (with "separator", a space by default)
+       into the target verse.
+split: splits a verse on the regular expression "at" into consecutive
+       verses starting at the target.
+
+Every rule refers to the Bible as it was before the mapping was applied, so
+the order of the rules doesn't matter. Verses that no rule mentions are left
+alone. Chapters and books left empty are removed. A rule can set "test"
+("old" or "new") for target books that don't exist yet.
+"""
+from collections import OrderedDict
+from os import path
+import json
+import re
+import typing as T
+
+from .bible import *
+from .books import Reference, parse_reference
+
+import logging
+log = logging.getLogger(__name__)
+
+MAPPINGS_DIR = path.join(path.dirname(path.abspath(__file__)), "mappings")
+
+_Key = T.Tuple[CaseInsensitiveStr, int, int]
+
+class Rule(T.NamedTuple):
+    kind: str # "move", "merge" or "split"
+    source: Reference
+    target: Reference
+    test: Testament = Testament.unknown
+    separator: str = " "
+    pattern: str = ""
+
+    @classmethod
+    def from_dict(cls, data: T.Dict[str, str]) -> "Rule":
+        kinds = [ k for k in ("move", "merge", "split") if k in data ]
+        if len(kinds) != 1:
+            raise ValueError(f"A rule needs exactly one of move, merge or split: {data}")
+        kind = kinds[0]
+        source = parse_reference(data[kind])
+        target = parse_reference(data["to"])
+        if kind in ("merge", "split") and target.first is None:
+            raise ValueError(f"The target of a {kind} has to be a verse: {data}")
+        if kind == "split" and (source.first is None or source.first != source.last):
+            raise ValueError(f"Only one verse can be split: {data}")
+        if kind == "split" and "at" not in data:
+            raise ValueError(f"A split needs a pattern ('at'): {data}")
+        test = Testament[data["test"]] if "test" in data else Testament.unknown
+        return cls(kind, source, target, test,
+                data.get("separator", " "), data.get("at", ""))
+
+    def resolve(self, bible: Bible) -> T.List[T.Tuple[T.List[_Key], T.List[_Key], T.List[str]]]:
+        """
+        Return (sources, targets, texts) for every group of verses the rule
+        moves. Only the source chapter is read.
+        """
+        book = CaseInsensitiveStr(self.source.book)
+        try:
+            chap = bible.verses[book][self.source.chapter]
+        except KeyError:
+            log.warning(f"Cannot find {self.source}, skipping '{self.kind}' rule")
+            return []
+        first = self.source.first if self.source.first is not None else 1
+        if self.source.last is not None:
+            verses = [ v for v in range(first, self.source.last + 1) if v in chap ]
+        else:
+            verses = sorted(v for v in chap.keys() if v >= first)
+        if len(verses) == 0:
+            log.warning(f"Cannot find {self.source}, skipping '{self.kind}' rule")
+            return []
+
+        tgt_book = CaseInsensitiveStr(self.target.book)
+        tgt_chap = self.target.chapter
+        if self.kind == "move":
+            offset = 0 if self.target.first is None else self.target.first - first
+            return [ ([(book, self.source.chapter, v)],
+                [(tgt_book, tgt_chap, v + offset)],
+                [chap[v]]) for v in verses ]
+        elif self.kind == "merge":
+            return [ ([ (book, self.source.chapter, v) for v in verses ],
+                [(tgt_book, tgt_chap, self.target.first)],
+                [self.separator.join(chap[v] for v in verses)]) ]
+        else:
+            texts = [ t.strip() for t in re.split(self.pattern, chap[verses[0]]) ]
+            texts = [ t for t in texts if t != "" ]
+            return [ ([(book, self.source.chapter, verses[0])],
+                [ (tgt_book, tgt_chap, self.target.first + i) for i in range(len(texts)) ],
+                texts) ]
+
+class Mapping:
+    """A versification mapping (see the module documentation)."""
+
+    def __init__(self, rules: T.Iterable[Rule], name: str = "mapping",
+            description: str = "") -> None:
+        self.rules = list(rules)
+        self.name = name
+        self.description = description
+
+    @classmethod
+    def from_dict(cls, data: T.Dict[str, T.Any], name: str = "mapping") -> "Mapping":
+        return cls((Rule.from_dict(r) for r in data["rules"]),
+                data.get("name", name), data.get("description", ""))
+
+    def apply(self, bible: Bible) -> Bible:
+        """
+        Apply the mapping to bible in place (and return it). Only the moved
+        verses, and the order of the chapters they are moved to, are touched.
+        Raises BibleInconsistentError (before changing anything) if a verse
+        would be overwritten.
+        """
+        removed: T.Set[_Key] = set()
+        inserted: T.Dict[_Key, str] = OrderedDict()
+        loc_map: T.Dict[_Key, T.List[_Key]] = {}
+        new_books: T.Dict[CaseInsensitiveStr, Testament] = OrderedDict()
+        for rule in self.rules:
+            for sources, targets, texts in rule.resolve(bible):
+                for src in sources:
+                    removed.add(src)
+                    loc_map[src] = targets
+                for tgt, text in zip(targets, texts):
+                    if tgt in inserted:
+                        raise BibleInconsistentError(f"{self.name}: two rules move verses to {_loc_str(tgt)}")
+                    inserted[tgt] = text
+                    if tgt[0] not in bible.verses and tgt[0] not in new_books:
+                        test = rule.test
+                        if test == Testament.unknown:
+                            test = _testament(bible, sources[0][0])
+                        if test == Testament.unknown:
+                            raise BibleInconsistentError(f"{self.name}: unknown testament for {tgt[0]}")
+                        new_books[tgt[0]] = test
+        for tgt in inserted:
+            if tgt not in removed and tgt[0] in bible.verses \
+                    and tgt[2] in bible.verses[tgt[0]].get(tgt[1], {}):
+                raise BibleInconsistentError(f"{self.name}: {_loc_str(tgt)} already exists")
+
+        # find the warnings before their locations change
+        found = set()
+        for book, chap_num, verse_num in removed:
+            found.update(bible.warnings.in_range(book,
+                (chap_num, verse_num), (chap_num, verse_num)))
+        # in the order of the Bible's warnings (removed is a set)
+        warnings = [ w for w in bible.warnings if w in found ]
+
+        for book, chap_num in { k[:2] for k in removed } | { k[:2] for k in inserted }:
+            bible.invalidate(book, chap_num)
+        for book, test in new_books.items():
+            bible.testaments[test.value].append(book)
+            bible.verses[book] = OrderedDict()
+        # every chapter is rebuilt once (changing a verse of a
+        # CompressedChapter recompresses it)
+        chap_removed: T.Dict[T.Tuple[CaseInsensitiveStr, int], T.Set[int]] = {}
+        for book, chap_num, verse_num in removed:
+            chap_removed.setdefault((book, chap_num), set()).add(verse_num)
+        chap_inserted: T.Dict[T.Tuple[CaseInsensitiveStr, int], T.List[T.Tuple[int, str]]] = {}
+        for (book, chap_num, verse_num), text in inserted.items():
+            chap_inserted.setdefault((book, chap_num), []).append((verse_num, text))
+        compressed = bible.compressed
+        intern = str if compressed else TEXT_POOL.intern
+        for book, chap_num in list(chap_removed) + [ k for k in chap_inserted if k not in chap_removed ]:
+            chap = bible.verses[book].get(chap_num, {})
+            skipped = chap_removed.get((book, chap_num), set())
+            verses = [ (v, t) for v, t in chap.items() if v not in skipped ]
+            verses += [ (v, intern(t)) for v, t in chap_inserted.get((book, chap_num), ()) ]
+            if len(verses) == 0:
+                del bible.verses[book][chap_num]
+                continue
+            if [ v for v, _ in verses ] != sorted(v for v, _ in verses):
+                verses.sort()
+            bible.verses[book][chap_num] = CompressedChapter(verses) if compressed \
+                    else OrderedDict(verses)
+        for book in { k[0] for k in chap_inserted }:
+            chapters = bible.verses[book]
+            if list(chapters.keys()) != sorted(chapters.keys()):
+                bible.verses[book] = OrderedDict(sorted(chapters.items()))
+        for book in { k[0] for k in removed }:
+            if len(bible.verses[book]) == 0:
+                del bible.verses[book]
+                for test in bible.testaments:
+                    if book in test:
+                        test.remove(book)
+
+        for warning in warnings:
+            locs = []
+            for loc in warning.locs:
+                key = (CaseInsensitiveStr(loc.book), loc.chapter, loc.verse)
+                if key not in loc_map:
+                    locs.append(loc)
+                    continue
+                for book, chap_num, verse_num in loc_map[key]:
+                    locs.append(Verse.Loc(str(book), chap_num, verse_num,
+                        _testament(bible, book)))
+            bible.warnings.discard(warning)
+            bible.warnings.add(BibleWarning(tuple(locs), warning.text, warning.type))
+
+        return bible
+
+    def __repr__(self) -> str:
+        return f"<Mapping {self.name} ({len(self.rules)} rules)>"
+
+def _loc_str(key: _Key) -> str:
+    return f"{key[0]} {key[1]}:{key[2]}"
+
+def _testament(bible: Bible, book: str) -> Testament:
+    for test in (Testament.old, Testament.new):
+        if book in bible.testaments[test.value]:
+            return test
+    return Testament.unknown
+
+_loaded: T.Dict[str, Mapping] = {}
+
+def load(name: str) -> Mapping:
+    """
+    Load a mapping from a JSON file, or by name from MAPPINGS_DIR
+    (e.g. load("fix_daniel") loads mappings/fix_daniel.json).
+    """
+    if name in _loaded:
+        return _loaded[name]
+    file_path = name if path.isfile(name) else path.join(MAPPINGS_DIR, f"{name}.json")
+    with open(file_path, "r") as mapping_file:
+        mapping = Mapping.from_dict(json.load(mapping_file),
+                path.splitext(path.basename(file_path))[0])
+    _loaded[name] = mapping
+    return mapping
@@ -9,3 +9,11 @@ cannot_find_verse = "cannot find verse"
 cannot_find_verse_num = "cannot find verse num"
 empty_verse = "empty verse"
 verse_range = "found bible range"
+
+short_verse = "short verse"
+long_verse = "long verse"
+verse_gap = "gap in verse numbers"
+chapter_gap = "gap in chapter numbers"
+duplicate_verse = "duplicate verse"
+unexpected_character = "unexpected character"
+chapter_count = "chapter count mismatch"
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark building Bibles: the time per verse of Bible.__iadd__,
+BibleBuilder (verse by verse and chapter by chapter) and Bible.from_dict.
+Then compare the memory and access times of plain and compressed Bibles
+(Bible.from_dict(data, compressed=True)).
+"""
+
+import sys
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from os import path
+
+version = sys.version_info
+if version.major < 3 or version.minor < 6:
+    print("{} needs python 3.6 or higher to run".format(sys.argv[0]),
+            file=sys.stderr)
+    sys.exit(1)
+del version
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), ".."))
+from bible_extractor.bible import Bible, BibleBuilder, Verse, Testament, \
+        TEXT_POOL, CHAPTER_CACHE
+from bible_extractor.stats import get_bible_stats
+
+parser = argparse.ArgumentParser(description="Benchmark building bibles.")
+parser.add_argument("bible_fn", nargs="?",
+        default=path.normpath(path.join(path.dirname(path.abspath(__file__)), "..",
+            "extracted_data", "lxx_daniel_only.json")),
+        help="An extracted bible (JSON)")
+parser.add_argument("-n", "--repeat", type=int, default=5,
+        help="The number of times to run each benchmark (the best time is used)")
+parser.add_argument("--lookups", type=int, default=10000,
+        help="The number of random verses read by the access benchmarks")
+
+def _iadd(rows):
+    bible = Bible("benchmark")
+    for book, test, chap_num, verse_num, text in rows:
+        bible += Verse(Verse.Loc(book, chap_num, verse_num, test), text)
+    return bible
+
+def _builder_verses(rows):
+    builder = BibleBuilder("benchmark")
+    current = None
+    for book, test, chap_num, verse_num, text in rows:
+        if book != current:
+            builder.book(book, test)
+            current = book
+        builder.verse(chap_num, verse_num, text)
+    return builder.finish()
+
+def _builder_chapters(chapters):
+    builder = BibleBuilder("benchmark")
+    current = None
+    for book, test, chap_num, verses in chapters:
+        if book != current:
+            builder.book(book, test)
+            current = book
+        builder.chapter(chap_num, verses)
+    return builder.finish()
+
+def _best(func, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _memory(raw, compressed):
+    """The memory (bytes) a Bible loaded from raw (JSON text) keeps."""
+    CHAPTER_CACHE.clear()
+    gc.collect()
+    # like the CLI (the pool is cleared at the end of the scope)
+    with TEXT_POOL.scope():
+        tracemalloc.start()
+        data = json.loads(raw)
+        bible = Bible.from_dict(data, compressed)
+        del data
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del bible
+    return size
+
+def _load(args):
+    data, compressed = args
+    return Bible.from_dict(data, compressed)
+
+def _read(args):
+    bible, locs = args
+    for loc in locs:
+        bible[loc]
+
+def _read_cold(args):
+    CHAPTER_CACHE.clear()
+    _read(args)
+
+def _iterate(bible):
+    for _ in bible:
+        pass
+
+def storage(raw, repeat, lookups):
+    data = json.loads(raw)
+    plain = Bible.from_dict(data)
+    compressed = Bible.from_dict(data, compressed=True)
+    locs = [ v.loc for v in plain ]
+    rand = random.Random(0)
+    random_locs = [ rand.choice(locs) for _ in range(lookups) ]
+    # verses of a set of chapters that fits in the cache
+    chapters = sorted({ (str(l.book), l.chapter) for l in locs })
+    hot = set(rand.sample(chapters, min(len(chapters), CHAPTER_CACHE.size // 2)))
+    hot_locs = [ l for l in locs if (str(l.book), l.chapter) in hot ]
+    hot_locs = [ rand.choice(hot_locs) for _ in range(lookups) ]
+
+    print(f"\nStorage (CHAPTER_CACHE keeps {CHAPTER_CACHE.size} decoded chapters)\n")
+    print(f"{'':24} {'plain':>12} {'compressed':>12}")
+    sizes = [ _memory(raw, c) / 2 ** 20 for c in (False, True) ]
+    print(f"{'memory (MiB)':24} {sizes[0]:12.2f} {sizes[1]:12.2f}")
+    benchmarks = [
+            ("load (ms)", _load, (data, False), (data, True), 1e3),
+            ("random verse (us)", _read_cold, (plain, random_locs), (compressed, random_locs),
+                1e6 / lookups),
+            ("hot verse (us)", _read, (plain, hot_locs), (compressed, hot_locs), 1e6 / lookups),
+            ("iterate (ms)", _iterate, plain, compressed, 1e3),
+            ("stats (ms)", get_bible_stats, plain, compressed, 1e3),
+            ]
+    for name, func, plain_arg, compressed_arg, scale in benchmarks:
+        times = [ _best(func, arg, repeat) * scale for arg in (plain_arg, compressed_arg) ]
+        print(f"{name:24} {times[0]:12.2f} {times[1]:12.2f}")
+    print(f"\nchapter cache: {CHAPTER_CACHE.hits} hits, {CHAPTER_CACHE.reads} decodes")
+
+def main(bible_fn, repeat, lookups):
+    with open(bible_fn, "r") as bible_f:
+        raw = bible_f.read()
+    data = json.loads(raw)
+    bible = Bible.from_dict(data)
+
+    rows = [ (str(v.loc.book), v.loc.test, v.loc.chapter, v.loc.verse, v.content)
+            for v in bible ]
+    chapters = [ (str(book), test, chap_num, list(chap.items()))
+            for test in (Testament.old, Testament.new)
+            for book in bible.testaments[test.value]
+            for chap_num, chap in bible.verses[book].items() ]
+
+    benchmarks = [
+            ("Bible += Verse", _iadd, rows),
+            ("BibleBuilder.verse", _builder_verses, rows),
+            ("BibleBuilder.chapter", _builder_chapters, chapters),
+            ("Bible.from_dict", Bible.from_dict, data),
+            ]
+    print(f"{len(rows)} verses in {len(chapters)} chapters ({bible_fn})\n")
+    print(f"{'':24} {'total (ms)':>12} {'per verse (ns)':>16}")
+    for name, func, arg in benchmarks:
+        best = _best(func, arg, repeat)
+        print(f"{name:24} {best * 1e3:12.2f} {best * 1e9 / len(rows):16.0f}")
+    storage(raw, repeat, lookups)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    main(args.bible_fn, args.repeat, args.lookups)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Compare the versification (verses per chapter) of N Bibles at once.
+
+Every input is [NAME=]FILE[#INDEX][@REGISTRY]:
+    FILE      a stat file (-s of bible_extractor), an extracted Bible (JSON)
+              or a sharded Bible (directory)
+    #INDEX    the element of a stat file to use (every element by default,
+              e.g. the sources and the merge of merged-stat.json)
+    @REGISTRY the book registry of the source (default, vulgate or
+              septuagint) used to resolve the book names to canonical ones
+The verse counts are aligned over the union of the (canonical) books and
+chapters, then compared in one pass over the chapters.
+"""
+
+import sys
+import argparse
+import json
+from array import array
+from os import path
+
+version = sys.version_info
+if version.major < 3 or version.minor < 6:
+    print("{} needs python 3.6 or higher to run".format(sys.argv[0]),
+            file=sys.stderr)
+    sys.exit(1)
+del version
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), ".."))
+from bible_extractor import books, shards
+from bible_extractor.bible import Bible
+from bible_extractor.stats import get_bible_stats
+
+REGISTRIES = { "default": books.DEFAULT, "vulgate": books.VULGATE,
+        "septuagint": books.SEPTUAGINT }
+# a chapter that isn't in a Bible (that has the book)
+MISSING = -1
+# a book that isn't in a Bible
+NO_BOOK = -2
+
+parser = argparse.ArgumentParser(description="Compare N bible stat files (or bibles).")
+parser.add_argument("inputs", nargs="+", metavar="[NAME=]FILE[#INDEX][@REGISTRY]",
+        help="Stat files, extracted bibles (JSON) or sharded bibles")
+parser.add_argument("--json", metavar="FILE",
+        help="Also write the matrices and the disagreements in FILE (JSON)")
+parser.add_argument("--no-list", action="store_true",
+        help="Only print the matrices (not the chapters that don't match)")
+
+def parse_input(spec):
+    """Return (name, file, index or None, registry) of an input."""
+    name = None
+    if "=" in spec:
+        name, spec = spec.split("=", 1)
+    registry = "default"
+    if "@" in spec:
+        spec, registry = spec.rsplit("@", 1)
+        if registry.lower() not in REGISTRIES:
+            raise ValueError(f"Unknown registry '{registry}' (use one of {', '.join(REGISTRIES)})")
+    index = None
+    if "#" in spec:
+        spec, index = spec.rsplit("#", 1)
+        index = int(index)
+    if name is None:
+        name = path.splitext(path.basename(path.normpath(spec)))[0]
+        if name.endswith("-stat"):
+            name = name[:-len("-stat")]
+    return name, spec, index, REGISTRIES[registry.lower()]
+
+def load_counts(file_name, index):
+    """Return [(suffix, num_verses_per_chapter)] of a stat file or a Bible."""
+    if shards.is_sharded(file_name):
+        bible = shards.read_sharded(file_name)
+        return [ ("", get_bible_stats(bible).num_verses_per_chapter) ]
+    with open(file_name, "r") as in_f:
+        data = json.load(in_f)
+    if isinstance(data, dict):
+        # an extracted Bible
+        return [ ("", get_bible_stats(Bible.from_dict(data)).num_verses_per_chapter) ]
+    if index is not None:
+        return [ ("", data[index]["num_verses_per_chapter"]) ]
+    if len(data) == 1:
+        return [ ("", data[0]["num_verses_per_chapter"]) ]
+    return [ (f"#{i}", stat["num_verses_per_chapter"]) for i, stat in enumerate(data) ]
+
+def canonical(registry, book):
+    # unknown names are kept as they are (resolve would log a warning)
+    return registry.resolve(book) if book in registry else book
+
+def align(inputs):
+    """
+    Return the rows ((book, chapter) over the union of the inputs, in
+    canonical order) and a column (array of verse counts, MISSING or
+    NO_BOOK) per input.
+    """
+    per_input = []
+    all_chapters = {}
+    for registry, counts in inputs:
+        chapters = {}
+        for test in ("old", "new"):
+            for book, book_chapters in counts.get(test, {}).items():
+                book = canonical(registry, book)
+                chapters[book] = { int(c): n for c, n in book_chapters.items() }
+                all_chapters.setdefault(book, set()).update(chapters[book])
+        per_input.append(chapters)
+
+    order = { name: i for i, name in enumerate(books.CANONICAL_NAMES) }
+    book_order = sorted(all_chapters, key=lambda b: (order.get(b, len(order)), b))
+    rows = [ (book, chap) for book in book_order for chap in sorted(all_chapters[book]) ]
+    columns = []
+    for chapters in per_input:
+        column = array("l")
+        for book, chap in rows:
+            book_chapters = chapters.get(book)
+            if book_chapters is None:
+                column.append(NO_BOOK)
+            else:
+                column.append(book_chapters.get(chap, MISSING))
+        columns.append(column)
+    return rows, columns
+
+def compare(rows, columns):
+    """
+    Compare every pair of columns in one pass over the rows. Return the
+    matrices (chapters that differ, verses that differ, books that are
+    missing) and the rows that don't match as (row index, {count: [column
+    indexes]}).
+    """
+    n = len(columns)
+    chapters = [ [0] * n for _ in range(n) ]
+    verses = [ [0] * n for _ in range(n) ]
+    books_missing = [ [0] * n for _ in range(n) ]
+    disagreements = []
+    prev_book = None
+    for r, counts in enumerate(zip(*columns)):
+        book = rows[r][0]
+        new_book = book != prev_book
+        prev_book = book
+        first = counts[0]
+        if all(c == first for c in counts):
+            continue
+        groups = {}
+        for i, c in enumerate(counts):
+            groups.setdefault(c, []).append(i)
+        if new_book and NO_BOOK in groups:
+            for i in groups[NO_BOOK]:
+                for j in range(n):
+                    if counts[j] != NO_BOOK:
+                        books_missing[j][i] += 1
+        present = [ (c, cols) for c, cols in groups.items() if c != NO_BOOK ]
+        if len(present) < 2:
+            continue
+        disagreements.append((r, dict(present)))
+        # every pair of groups differs (once per pair of columns)
+        for gi, (c1, cols1) in enumerate(present):
+            for c2, cols2 in present[gi + 1:]:
+                diff = abs(max(c1, 0) - max(c2, 0))
+                for i in cols1:
+                    for j in cols2:
+                        chapters[i][j] += 1
+                        chapters[j][i] += 1
+                        verses[i][j] += diff
+                        verses[j][i] += diff
+    return chapters, verses, books_missing, disagreements
+
+def print_matrix(title, names, matrix):
+    width = max(8, max(len(n) for n in names) + 1)
+    print(title)
+    print(" " * width + "".join(f"{i:>{8}}" for i in range(len(names))))
+    for i, (name, row) in enumerate(zip(names, matrix)):
+        print(f"{name:>{width}}" + "".join(
+            f"{'-' if i == j else v:>{8}}" for j, v in enumerate(row)) + f"  ({i})")
+    print()
+
+def _count(c):
+    return "missing" if c == MISSING else str(c)
+
+def main(inputs, json_fn=None, no_list=False):
+    names = []
+    loaded = []
+    for spec in inputs:
+        name, file_name, index, registry = parse_input(spec)
+        for suffix, counts in load_counts(file_name, index):
+            names.append(name + suffix)
+            loaded.append((registry, counts))
+
+    rows, columns = align(loaded)
+    chapters, verses, books_missing, disagreements = compare(rows, columns)
+
+    print(f"{len(names)} bibles, {len(rows)} chapters in "
+            f"{len({ book for book, _ in rows })} books\n")
+    for i, (name, column) in enumerate(zip(names, columns)):
+        num_books = len({ rows[r][0] for r, c in enumerate(column) if c != NO_BOOK })
+        num_verses = sum(c for c in column if c > 0)
+        print(f"({i}) {name}: {num_books} books, "
+                f"{sum(1 for c in column if c >= 0)} chapters, {num_verses} verses")
+    print()
+    print_matrix("Chapters that differ (in the books both have):", names, chapters)
+    print_matrix("Verses that differ (missing chapters count as 0 verses):", names, verses)
+    print_matrix("Books of the row that the column doesn't have:", names, books_missing)
+
+    if not no_list:
+        print(f"{len(disagreements)} chapters don't match:")
+        for r, groups in disagreements:
+            book, chap = rows[r]
+            print(f"{book:>20} {chap:3}: " + ", ".join(
+                f"{_count(c)} ({', '.join(names[i] for i in cols)})"
+                for c, cols in sorted(groups.items(), key=lambda g: -len(g[1]))))
+
+    if json_fn is not None:
+        with open(json_fn, "w") as json_f:
+            json.dump({
+                "names": names,
+                "chapters": chapters,
+                "verses": verses,
+                "books_missing": books_missing,
+                "disagreements": [ { "book": rows[r][0], "chapter": rows[r][1],
+                    "counts": { names[i]: (c if c != MISSING else None)
+                        for c, cols in groups.items() for i in cols } }
+                    for r, groups in disagreements ],
+                }, json_f, indent=2)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    try:
+        main(args.inputs, args.json, args.no_list)
+    except (OSError, ValueError, IndexError) as e:
+        print(f"{sys.argv[0]}: {e}", file=sys.stderr)
+        sys.exit(1)